@@ -2,9 +2,11 @@
 # 20 Jun 2023 - @todbot / Tod Kurt
 # a port of "derpnote2" in https://github.com/todbot/mozzi_experiments
 #
-import board, time, audiopwmio, synthio, random
+import board, time, audiopwmio, synthio
 import ulab.numpy as np
 import audiobusio, audiomixer
+from noise import XorShift16, noise_wave  # from this repo's "lib" directory
+from noteparams import NoteParams  # from this repo's "lib" directory
 audio = audiobusio.I2SOut(bit_clock=board.GP11, word_select=board.GP12, data=board.GP10)
 #audio = audiopwmio.PWMAudioOut(board.GP10)
 #synth = synthio.Synthesizer(sample_rate=22050)
@@ -31,9 +33,12 @@ def read_waveform(filename, n=0, start=0):
         w.setpos(start)
         return memoryview(w.readframes(n)).cast('h')
 
+seed = 1234  # same seed, same deep note every time. change it for a different one
+rng = XorShift16(seed)
+
 SAMPLE_SIZE = 256
 wave_saw = np.linspace(32767, -32767, num=SAMPLE_SIZE, dtype=np.int16)
-wave_noise = np.array([random.randint(-32767, 32767) for i in range(SAMPLE_SIZE)], dtype=np.int16)
+wave_noise = noise_wave(SAMPLE_SIZE, seed ^ 0x5555)  # its own seed, so the noise isn't the note choices
 wave_rampdown = np.linspace(32767, -32767, num=3, dtype=np.int16)  # for pitch LFO
 wave_rampup = np.linspace(-32767, 32767, num=3, dtype=np.int16)  # for pitch LFO
 #wave_akwf_g0001 = read_waveform("AKWF_granular_0001.wav")
@@ -58,20 +63,23 @@ num_oscs = 6
 notes = [None] * num_oscs
 lfos = [None] * num_oscs
 
-notesS1 = [random.uniform(note_start, note_start+12) for _ in range(num_oscs)]
-notesS2 = [random.uniform(note_start+30, note_start) for _ in range(num_oscs)]
+notesS1 = [rng.uniform(note_start, note_start+12) for _ in range(num_oscs)]
+notesS2 = [rng.uniform(note_start+30, note_start) for _ in range(num_oscs)]
 notesS3 = notes_deepnote[0:num_oscs]
 
 amp_env = synthio.Envelope(attack_time=0.5, release_time=3, sustain_level=0.75, attack_level=0.75)
 for i in range(num_oscs):
     lfos[i] = synthio.LFO(rate=0.0001,
-                          scale=random.uniform(0.25,0.5),
-                          phase_offset=random.random(),
+                          scale=rng.uniform(0.25,0.5),
+                          phase_offset=rng.random(),
                           waveform=wave_noise)
     notes[i] = synthio.Note( synthio.midi_to_hz(notesS1[i]),
                              waveform=my_wave,
                              envelope=amp_env, bend=lfos[i])
 
+note_params = NoteParams(synth, size=num_oscs)  # only writes frequencies that changed
+note_params.set_notes(notes)
+
 # stage 1 is static random chaos (as set above with random LFOs)
 print("starting stage 1")
 synth.press(notes)
@@ -84,9 +92,10 @@ time.sleep(stage1_time)
 print("starting stage 2")
 for t in range(time_steps):
     for i in range(num_oscs):
-        notes[i].frequency = lerp( synthio.midi_to_hz(notesS1[i]),
-                                   synthio.midi_to_hz(notesS2[i]), t/time_steps)
+        note_params.frequency(i, lerp( synthio.midi_to_hz(notesS1[i]),
+                                       synthio.midi_to_hz(notesS2[i]), t/time_steps))
         lfos[i].scale = lfos[i].scale * 0.97
+    note_params.commit()  # all the oscs' new frequencies at once
     time.sleep(stage2_time/time_steps)
 
 # stage 3 is converge on big chord
@@ -94,12 +103,14 @@ print("starting stage 3")
 for t in range(time_steps):
     for i in range(num_oscs):
         lfos[i].scale = max(lfos[i].scale * 0.99,  0.001)
-        notes[i].frequency = lerp( synthio.midi_to_hz(notesS2[i]),
-                                   synthio.midi_to_hz(notesS3[i]), t/time_steps)
+        note_params.frequency(i, lerp( synthio.midi_to_hz(notesS2[i]),
+                                       synthio.midi_to_hz(notesS3[i]), t/time_steps))
+    note_params.commit()
     time.sleep(stage3_time/time_steps)
     #print(notes[i].frequency, lfos[i].scale, t/time_steps)
 
 print("starting stage 4")
+note_params.report()
 
 time.sleep(stage4_time)
 synth.release_all()
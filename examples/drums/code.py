@@ -0,0 +1,70 @@
+# drums_code.py -- a little drum machine and bassline, all in synthio
+# part of https://github.com/todbot/circuitpython-synthio-tricks
+#
+# Demonstrate drums.py: kick, snare, hat, and clap made from synthio.Notes,
+# playing a 16-step pattern of 16th notes at 140 BPM, with a bassline on top.
+# All the drum & bass Notes are made once at startup and re-triggered,
+# so nothing new is made on every step.
+#
+# External libraries needed:
+# - drums.py & noise.py - copy from this repo's "lib" directory to CIRCUITPY/lib
+#
+# Pins used on QTPY RP2040:
+# - board.MOSI - Audio PWM output (needs RC filter output)
+#
+
+import time
+import board, audiopwmio, audiomixer, synthio
+import ulab.numpy as np
+from drums import DrumKit, KICK, SNARE, HAT, CLAP
+
+bpm = 140
+steps_per_beat = 4  # 16th notes
+step_time = 60 / bpm / steps_per_beat
+
+# one string per drum, 'x' is a hit, '.' is a rest
+patterns = (
+    (KICK,  "x.....x...x....."),
+    (SNARE, "....x.......x..."),
+    (HAT,   "x.x.x.x.x.x.xxx."),
+    (CLAP,  "............x..x"),
+)
+# bassline, one midi note per step, 0 is a rest
+bassline = (36, 0, 36, 48,  0, 36, 0, 39,  36, 0, 36, 48,  0, 43, 0, 41)
+
+audio = audiopwmio.PWMAudioOut(board.MOSI)
+mixer = audiomixer.Mixer(channel_count=1, sample_rate=28000, buffer_size=2048)
+synth = synthio.Synthesizer(channel_count=1, sample_rate=28000)
+audio.play(mixer)
+mixer.voice[0].play(synth)
+mixer.voice[0].level = 0.75
+
+kit = DrumKit(synth)
+
+# turn patterns into a list of drums to hit on each step, so the loop just indexes
+step_hits = [ [drum for (drum,pat) in patterns if pat[i] == 'x'] for i in range(16) ]
+
+# our bass voice, made once and re-pressed on each note
+wave_saw = np.linspace(28000, -28000, num=512, dtype=np.int16)
+bass_env = synthio.Envelope(attack_time=0.005, decay_time=0.1, sustain_level=0.5, release_time=0.05)
+bass_lpf = synth.low_pass_filter(800, 1.5)
+bass = synthio.Note(frequency=65.4, waveform=wave_saw, envelope=bass_env, filter=bass_lpf)
+bass_hz = [synthio.midi_to_hz(n) for n in bassline]  # precompute frequencies too
+
+print("drums ready, %d bpm" % bpm)
+
+step = 0
+last_step_time = time.monotonic()
+while True:
+    kit.update()
+    now = time.monotonic()
+    if now - last_step_time >= step_time:
+        last_step_time += step_time  # don't drift
+        for drum in step_hits[step]:
+            kit.hit(drum)
+        if bassline[step]:
+            bass.frequency = bass_hz[step]
+            synth.release_then_press(bass, bass)  # retrigger its envelope
+        else:
+            synth.release(bass)
+        step = (step + 1) % 16
@@ -1,10 +1,16 @@
 import time
+from noise import XorShift16  # from this repo's "lib" directory
+
+CLOCK_PPQN = 24  # MIDI clock ticks per quarter note
+CLOCK_RELOCK = 4  # out-of-range tick intervals in a row, all alike, that mean the tempo really changed
 
 class Arpy:
-    def __init__(self):
+    def __init__(self, seed=1):
         self.enabled = False
-        self.root_note = 48
+        self._root_note = 48
         self.gate_percent = 0.30  # percentage
+        self.bpm = 0
+        self.steps_per_beat = 1
         self.set_bpm(bpm=100, steps_per_beat=2) # 100 bpm 8th notes
         self.arps = [
             ('major'        , (0, 4, 7, 12) ),    # 0
@@ -17,17 +23,50 @@ class Arpy:
             ('root'         , (0, 0, 0, 0) ),     # 7
         ]
         self.arp_id = 0  # which one of the arps we're currently using,
-        self.arp_user = None  # list of notes if user adds arp  # FIXME
-        self.arp_pos = 0
+        self.arp_user = None  # pattern set with play(), used instead of arps[arp_id]
+        self.held = []  # notes held down, sorted low to high, arpeggiated instead of the pattern
+        self.hold_order = 'up'  # one of HOLD_ORDERS
+        self.rng = XorShift16(seed)  # for the 'random' order, seeded so a replayed trace plays the same notes
+        self.steps = []  # every note of one full cycle, made by _compile()
+        self.step_pos = 0  # where we are in self.steps
+        self.dirty = True  # steps need recompiling
         self.note_on_handler = lambda note,: print("note on standin",note)
         self.note_off_handler = lambda note: print("note off standin", note)
         self.note_played = None  # the note that was played (for note off)
         self.last_beat_time = time.monotonic()
         self.trans_steps = 0
         self.trans_distance = 12
-        self.trans_pos = 0
+        # MIDI clock following, see clock_tick()
+        self.clock_running = False  # True while following MIDI clock
+        self.clock_smoothing = 0.05  # how fast tempo estimate follows tick intervals, 0-1
+        self.clock_phase_gain = 0.25  # how fast step times are pulled toward the clock, 0-1
+        self.tick_count = 0  # ticks since start
+        self.last_tick_time = 0
+        self.tick_interval = 60 / 120 / CLOCK_PPQN  # smoothed seconds per tick
+        self.outlier_interval = 0  # last tick interval too far from tick_interval to smooth in
+        self.outliers = 0  # how many alike in a row
+        self.boundary_time = 0  # smoothed time of the last step-boundary tick
+        self.next_step_time = 0  # when the next step plays, when following clock
+        self.steps_fired = 0  # steps played since start
+        self.boundaries = 0  # step-boundary ticks seen since start
+        self.last_step_time = 0
+        self.reset_clock_stats()
+
+    HOLD_ORDERS = ('up', 'down', 'updown', 'random')
+
+    @property
+    def root_note(self):
+        return self._root_note
+
+    @root_note.setter
+    def root_note(self, n):
+        if n != self._root_note:  # set every loop from a knob, so only recompile on change
+            self._root_note = n
+            self.dirty = True
 
     def set_bpm(self, bpm, steps_per_beat=None):
+        if bpm == self.bpm and steps_per_beat in (None, self.steps_per_beat):
+            return
         self.bpm = bpm
         if steps_per_beat:
             self.steps_per_beat = steps_per_beat
@@ -38,6 +77,7 @@ class Arpy:
     def set_transpose(self, distance=12, steps=0):
         self.trans_distance = distance
         self.trans_steps = steps
+        self.dirty = True
 
     def on(self):
         self.enabled = True
@@ -48,32 +88,246 @@ class Arpy:
             self.arp_id = [name for (name,arp) in self.arps].index(arp_id_or_str)
         else:
             self.arp_id = arp_id_or_str
+        self.dirty = True
 
     def arp_name(self):
         return self.arps[self.arp_id][0]
 
     def play(self, arp_notes):
-        self.arp_user = arp_notes  # FIXME
+        """Use arp_notes, offsets from root_note like the arps table, instead of the
+        current arp. play(None) goes back to the arps table"""
+        self.arp_user = tuple(arp_notes) if arp_notes else None
+        self.dirty = True
 
     def next_arp(self):
         self.arp_id = (self.arp_id + 1) % len(self.arps)
+        self.dirty = True
+
+    # --- held notes ---
+
+    def note_pressed(self, note):
+        """Add a held note, the arp plays the held notes while there are any"""
+        held = self.held
+        lo, hi = 0, len(held)
+        while lo < hi:  # binary search for where it goes
+            mid = (lo + hi) // 2
+            if held[mid] < note:
+                lo = mid + 1
+            else:
+                hi = mid
+        if lo < len(held) and held[lo] == note:
+            return
+        if not held:
+            self.step_pos = 0  # start from the top when the first note goes down
+        held.insert(lo, note)
+        self.dirty = True
+
+    def note_released(self, note):
+        if note in self.held:
+            self.held.remove(note)
+            self.dirty = True
+
+    def set_hold_order(self, order):
+        """How held notes are played, one of HOLD_ORDERS"""
+        self.hold_order = order
+        self.dirty = True
+
+    # --- step table ---
+    # Pattern, root note, transposition, and held notes are all flattened into
+    # one list of notes for a whole cycle, only when one of them changes,
+    # so playing a step is just reading the next entry.
+
+    def _compile(self):
+        if self.held:
+            notes = self.held
+            if self.hold_order == 'down':
+                notes = notes[::-1]
+            elif self.hold_order == 'updown':
+                notes = notes + notes[-2:0:-1]  # don't repeat the top & bottom notes
+        else:
+            pattern = self.arp_user or self.arps[self.arp_id][1]
+            notes = [self._root_note + n for n in pattern]
+        self.steps = [n + self.trans_distance * t for t in range(self.trans_steps + 1) for n in notes]
+        self.step_pos %= len(self.steps)
+        self.dirty = False
+        if self.held and self.hold_order == 'random':
+            self._shuffle()
+
+    def _shuffle(self):
+        steps = self.steps
+        for i in range(len(steps) - 1, 0, -1):
+            j = self.rng.randint(0, i)
+            steps[i], steps[j] = steps[j], steps[i]
+
+    # --- MIDI clock ---
+    # Ticks arrive with USB polling jitter, so steps aren't played right on the
+    # ticks.  Instead the tick interval is smoothed into a tempo estimate, and
+    # each step is scheduled one step period after the (smoothed) time of the
+    # previous step-boundary tick.  If a boundary tick arrives before its step
+    # was played, the step plays right away, so Arpy never falls behind the clock.
+
+    def clock_start(self):
+        """MIDI Start (0xFA): play from the top of the arp on the next tick"""
+        self.step_pos = 0
+        self.tick_count = 0
+        self.steps_fired = 0
+        self.boundaries = 0
+        self.clock_running = True
+        self.enabled = True
+        self.reset_clock_stats()  # a new run, maybe at a new tempo
+
+    def clock_continue(self):
+        """MIDI Continue (0xFB): pick up where Stop left off"""
+        self.clock_running = True
+        self.enabled = True
+
+    def clock_stop(self):
+        """MIDI Stop (0xFC)"""
+        self.clock_running = False
+        self.enabled = False
+        if self.note_played is not None:
+            self.note_off_handler( self.note_played )
+            self.note_played = None
+
+    def clock_tick(self, now=None):
+        """MIDI Timing Clock (0xF8), 24 per quarter note"""
+        now = time.monotonic() if now is None else now
+        dt = now - self.last_tick_time
+        self.last_tick_time = now
+        if self.tick_count == 1 and 0 < dt < 1:
+            # the first interval after Start sets the tempo, however far from the last one
+            self.tick_interval = dt
+            self.outliers = 0
+            self.bpm = 60 / (self.tick_interval * CLOCK_PPQN)
+        elif self.tick_count > 0 and 0.25 * self.tick_interval < dt < 4 * self.tick_interval:
+            self.tick_jitter += (abs(dt - self.tick_interval) - self.tick_jitter) * self.clock_smoothing
+            self.tick_interval += (dt - self.tick_interval) * self.clock_smoothing
+            self.outliers = 0
+            self.bpm = 60 / (self.tick_interval * CLOCK_PPQN)
+        elif self.tick_count > 0:
+            # ignore gaps & bursts, like after a Stop, unless several alike in a row say the tempo moved
+            alike = 0.8 * self.outlier_interval < dt < 1.25 * self.outlier_interval
+            self.outliers = self.outliers + 1 if alike else 1
+            self.outlier_interval = dt
+            if self.outliers >= CLOCK_RELOCK:
+                self.tick_interval = dt
+                self.outliers = 0
+                self.bpm = 60 / (self.tick_interval * CLOCK_PPQN)
+        if not self.clock_running:
+            return
+        ticks_per_step = CLOCK_PPQN // self.steps_per_beat
+        if self.tick_count % ticks_per_step == 0:  # a step boundary
+            step_period = self.tick_interval * ticks_per_step
+            if self.boundaries == 0:
+                self.boundary_time = now
+            else:  # like a PLL: move partway from where we predicted the boundary to where it was
+                predicted = self.boundary_time + step_period
+                self.boundary_time = predicted + (now - predicted) * self.clock_phase_gain
+            self.boundaries += 1
+            if self.steps_fired < self.boundaries:  # tick beat our schedule, play it now
+                self._step(now)
+            self.next_step_time = self.boundary_time + step_period
+            self.per_beat_time = step_period
+            self.note_duration = self.gate_percent * step_period
+        elif self.tick_count == 1 and self.boundaries:
+            # the first interval after Start just set the tempo, so reschedule from the first step
+            step_period = self.tick_interval * ticks_per_step
+            self.next_step_time = self.last_step_time + step_period
+            self.per_beat_time = step_period
+            self.note_duration = self.gate_percent * step_period
+        self.tick_count += 1
+
+    def reset_clock_stats(self):
+        self.tick_jitter = 0  # smoothed difference of tick intervals from the tempo, in secs
+        self.step_jitter = 0  # smoothed difference of step intervals from the step period
+        self.step_jitter_max = 0
+
+    def clock_stats(self):
+        """Return (bpm, tick jitter ms, step jitter ms, max step jitter ms)"""
+        return (60 / (self.tick_interval * CLOCK_PPQN), self.tick_jitter * 1000,
+                self.step_jitter * 1000, self.step_jitter_max * 1000)
+
+    # --- playing ---
+
+    def _step(self, now):
+        if self.dirty:
+            self._compile()
+        if self.step_pos == 0 and self.held and self.hold_order == 'random':
+            self._shuffle()  # new random order every cycle
+
+        if self.note_played is not None:  # clock may be faster than the gate
+            self.note_off_handler( self.note_played )
+        self.note_played = self.steps[self.step_pos]
+        self.note_on_handler( self.note_played )
+        self.step_pos += 1
+        if self.step_pos == len(self.steps):
+            self.step_pos = 0
+
+        if self.clock_running:
+            self.steps_fired += 1
+            if self.steps_fired > 1:
+                err = abs(now - self.last_step_time - self.per_beat_time)
+                self.step_jitter += (err - self.step_jitter) * self.clock_smoothing
+                self.step_jitter_max = max(self.step_jitter_max, err)
+            self.last_step_time = now
+        self.last_beat_time = now
 
     def update(self):
         if not self.enabled: return
         now = time.monotonic()
 
-        if now - self.last_beat_time >= self.per_beat_time:
-            self.last_beat_time = now
-            arp = self.arps[self.arp_id][1]
-
-            trans_amount = self.trans_distance * self.trans_pos
-            if self.arp_pos == 0:  # only make musical changes at top of arp
-                self.trans_pos = (self.trans_pos + 1) % (self.trans_steps+1)
-
-            self.note_played = self.root_note + arp[self.arp_pos] + trans_amount
-            self.note_on_handler( self.note_played )
-            self.arp_pos = (self.arp_pos+1) % len(arp)
+        if self.clock_running:
+            # play the next step on schedule, but no more than one step ahead of the clock
+            if self.steps_fired == self.boundaries and self.boundaries and now >= self.next_step_time:
+                self._step(now)
+        elif now - self.last_beat_time >= self.per_beat_time:
+            self._step(now)
 
-        if now - self.last_beat_time > self.note_duration and self.note_played:
+        if now - self.last_beat_time > self.note_duration and self.note_played is not None:
             self.note_off_handler( self.note_played )
             self.note_played = None
+
+
+class ArpMidiIn:
+    """ Feeds MIDI clock, start/stop/continue, and held notes from a port
+    (usb_midi.ports[0] or a UART) to an Arpy. Bytes are read into a reused buffer
+    and handled one at a time, so this doesn't make any objects.
+    Other MIDI messages are ignored. """
+    def __init__(self, port, arpy, buf_size=32):
+        self.port = port
+        self.arpy = arpy
+        self.buf = bytearray(buf_size)
+        self.status = 0  # last status byte, for running status
+        self.data1 = -1  # first data byte of a note message, -1 if waiting for it
+
+    def update(self):
+        n = self.port.readinto(self.buf)
+        if not n:
+            return
+        for i in range(n):
+            b = self.buf[i]
+            if b == 0xF8:
+                self.arpy.clock_tick()
+            elif b == 0xFA:
+                self.arpy.clock_start()
+            elif b == 0xFB:
+                self.arpy.clock_continue()
+            elif b == 0xFC:
+                self.arpy.clock_stop()
+            elif b >= 0xF8:  # other realtime bytes (active sensing...) can come anywhere, skip them
+                pass
+            elif b >= 0xF0:  # system common messages cancel running status
+                self.status = 0
+                self.data1 = -1
+            elif b >= 0x80:
+                self.status = b & 0xF0
+                self.data1 = -1
+            elif self.status == 0x90 or self.status == 0x80:
+                if self.data1 < 0:
+                    self.data1 = b
+                else:
+                    if self.status == 0x90 and b > 0:
+                        self.arpy.note_pressed(self.data1)
+                    else:
+                        self.arpy.note_released(self.data1)
+                    self.data1 = -1
@@ -11,29 +11,42 @@
 #  knobB - adjusts BPM            (QTPY A1)
 #  buttonA - changes arp pattern  (QTPy SDA)
 #  buttonB - changes num iters up for pattern (QTPy SCL)
+#  USB MIDI clock - if a DAW sends clock & start/stop, the arp follows it instead of knobB
+#  USB MIDI notes - while notes are held down, the arp plays them instead of its pattern
+#  both buttons - save the input trace (when trace_mode = "record", see inputtrace.py)
 #
 # Circuit:
 # - See: "eighties_arp_bb.png" wiring
 # - QT Py RP2040 or similar
 # - QTPy RX pin is audio out, going through RC filter (1k + 100nF) to TRS jack
 #
+# Boots in stages (see lib/staged.py): the arp starts playing first,
+# then the neopixel loads from the main loop, and boot timings are printed.
+#
+
 
+import time
+from staged import StagedBoot  # from this repo's "lib" directory
+boot = StagedBoot()  # start timing as early as we can
 
-import time, random
 import board, analogio, keypad
 import audiopwmio, audiomixer, synthio
 import ulab.numpy as np
-import neopixel, rainbowio  # circup install neopixel
-from arpy import Arpy
+from arpy import Arpy, ArpMidiIn
+from inputtrace import InputRecorder, InputReplayer  # from this repo's "lib" directory
+from ledpresenter import LEDPresenter  # from this repo's "lib" directory
 
 num_voices = 3       # how many voices for each note
 lpf_basef = 2500     # filter lowest frequency
 lpf_resonance = 1.5  # filter q
+trace_mode = None    # None, "record", or "replay" knobs, buttons & MIDI to/from trace_file
+trace_file = "/eighties_arp.trace"
 
 knobA = analogio.AnalogIn(board.A0)
 knobB = analogio.AnalogIn(board.A1)
 keys = keypad.Keys( (board.SDA, board.SCL), value_when_pressed=False )
-led = neopixel.NeoPixel(board.NEOPIXEL, 1, brightness=0.1)
+led = None  # loaded by a boot stage below
+midi_in = None  # loaded by a boot stage below
 
 audio = audiopwmio.PWMAudioOut(board.RX)  # RX pin on QTPY RP2040
 
@@ -42,6 +55,7 @@ synth = synthio.Synthesizer(channel_count=1, sample_rate=28000)
 audio.play(mixer)
 mixer.voice[0].play(synth)
 mixer.voice[0].level = 0.8
+boot.mark("audio")
 
 # our oscillator waveform, a 512 sample downward saw wave going from +/-30k
 wave_saw = np.linspace(30000, -30000, num=512, dtype=np.int16)  # max is +/-32k but gives us headroom
@@ -52,7 +66,8 @@ voices=[]  # holds our currently sounding voices ('Notes' in synthio speak)
 # called by arpy to turn on a note
 def note_on(n):
     print("  note on ", n )
-    led.fill(rainbowio.colorwheel( n % 12 * 20  ))
+    if led:
+        led.fill(rainbowio.colorwheel( n % 12 * 20  ))
     fo = synthio.midi_to_hz(n)
     voices.clear()  # delete any old voices
     for i in range(num_voices):
@@ -65,7 +80,8 @@ def note_on(n):
 # called by arpy to turn off a note
 def note_off(n):
     print("  note off", n)
-    led.fill(0)
+    if led:
+        led.fill(0)
     synth.release(voices)
 
 # simple range mapper, like Arduino map()
@@ -81,14 +97,58 @@ arpy.set_arp('suspended4th')
 
 arpy.set_bpm( bpm=110, steps_per_beat=4 ) # 110 bpm 16th notes
 arpy.set_transpose(distance=12, steps=0)
+boot.mark("arp")
+boot.first_sound()
+
+def load_led():
+    global led, rainbowio
+    import neopixel, rainbowio  # circup install neopixel
+    # notes only set its color, the main loop writes it at most 30 times a sec
+    led = LEDPresenter(neopixel.NeoPixel(board.NEOPIXEL, 1, brightness=0.1), fps=30)
+
+def load_midi():
+    global midi_in
+    import usb_midi
+    port = usb_midi.ports[0]
+    if replayer:
+        port = replayer.port()  # the recorded MIDI bytes, clock & all
+    elif recorder:
+        port = recorder.port(port)  # records every byte read
+    midi_in = ArpMidiIn(port, arpy)
+
+boot.add("led", load_led)
+boot.add("midi", load_midi)
+
+recorder = InputRecorder() if trace_mode == "record" else None
+replayer = InputReplayer(trace_file) if trace_mode == "replay" else None
+
+def read_key():
+    key = replayer.key() if replayer else keys.events.get()
+    return recorder.key(key) if recorder else key
+
+def read_knob(num, knob):
+    if replayer:
+        return replayer.knob(num)
+    return recorder.knob(num, knob.value) if recorder else knob.value
+
+keys_down = [False, False]
 
 knobfilter = 0.75
-knobAval = knobA.value
-knobBval = knobB.value
+knobAval = read_knob(0, knobA)
+knobBval = read_knob(1, knobB)
 
 while True:
-
-    key = keys.events.get()
+    boot.update()  # finish booting, one stage per pass
+
+    key = read_key()
+    if key:
+        keys_down[key.key_number] = key.pressed
+        if recorder and all(keys_down):
+            print("saving input trace", trace_file)
+            try:
+                recorder.save(trace_file)
+            except OSError as e:
+                print("could not save trace, is CIRCUITPY writable?", e)
     if key and key.pressed:
         if key.key_number==0:  # left button changes arp played
             arpy.next_arp()
@@ -99,12 +159,17 @@ while True:
             arpy.set_transpose(steps=steps)
 
     # filter noisy adc
-    knobAval = knobAval * knobfilter + (1-knobfilter) * knobA.value
-    knobBval = knobBval * knobfilter + (1-knobfilter) * knobB.value
+    knobAval = knobAval * knobfilter + (1-knobfilter) * read_knob(0, knobA)
+    knobBval = knobBval * knobfilter + (1-knobfilter) * read_knob(1, knobB)
 
     # map knobA to root note
     arpy.root_note = int(map_range( knobAval, 0,65535, 24, 72) )
-    # map knobB to bpm
-    arpy.set_bpm( map_range(knobBval, 0,65535, 40, 180 ) )
+    if midi_in:
+        midi_in.update()
+    if not arpy.clock_running:  # MIDI clock sets the tempo when it's running
+        # map knobB to bpm, in whole bpm so arpy only recalculates when it really changes
+        arpy.set_bpm( int(map_range(knobBval, 0,65535, 40, 180 )) )
 
     arpy.update()
+    if led:
+        led.update()  # show the latest note's color, if it changed
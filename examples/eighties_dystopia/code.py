@@ -16,28 +16,34 @@
 #  - The filter modulation rate also changes randomly every second (also reflected on neopixel)
 #  - Every 15 seconds a new note is randomly chosen from the allowed note list
 
-import time, random
+import time
 import board, audiopwmio, audiomixer, synthio
 import ulab.numpy as np
 import neopixel, rainbowio   # circup install neopixel
+from gcwatch import GCWatch  # from this repo's "lib" directory
+from noise import XorShift16  # from this repo's "lib" directory
+from autotune import AutoTuner  # from this repo's "lib" directory
+from lfotap import LFOTap  # from this repo's "lib" directory
+from modmath import compile_mod  # from this repo's "lib" directory
+from ledpresenter import LEDPresenter  # from this repo's "lib" directory
+from noteparams import NoteParams  # from this repo's "lib" directory
 
 notes = (33, 34, 31) # possible notes to play MIDI A1, A1#, G1
 note_duration = 15   # how long each note plays for
 num_voices = 5       # how many voices for each note
 lpf_basef = 500      # filter lowest frequency
 lpf_resonance = 1.5  # filter q
+rng = XorShift16(seed=1234)  # change seed for a different evolution, same every boot
+sample_rate = 28000  # audio settings, or set auto_tune = True to have them
+buffer_size = 2048   #  measured for this board at first boot (needs writable CIRCUITPY)
+auto_tune = False
 
-led = neopixel.NeoPixel(board.NEOPIXEL, 1, brightness=0.1)
+# the LED is written at most 30 times a sec from the main loop, set report=True to see what it costs
+led = LEDPresenter(neopixel.NeoPixel(board.NEOPIXEL, 1, brightness=0.1), fps=30, report=False)
 
 audio = audiopwmio.PWMAudioOut(board.RX)  # RX pin on QTPY RP2040
 #audio = audiobusio.I2SOut(bit_clock=board.MOSI, word_select=board.MISO, data=board.SCK)
 
-mixer = audiomixer.Mixer(channel_count=1, sample_rate=28000, buffer_size=2048)
-synth = synthio.Synthesizer(channel_count=1, sample_rate=28000)
-audio.play(mixer)
-mixer.voice[0].play(synth)
-mixer.voice[0].level = 0.8
-
 # our oscillator waveform, a 512 sample downward saw wave going from +/-30k
 wave_saw = np.linspace(30000, -30000, num=512, dtype=np.int16)  # max is +/-32k but gives us headroom
 amp_env = synthio.Envelope(attack_level=1, sustain_level=1)
@@ -47,44 +53,90 @@ voices = []
 for i in range(num_voices):
     voices.append( synthio.Note( frequency=0, envelope=amp_env, waveform=wave_saw ) )
 
+if auto_tune:
+    def setup_patch(synth):  # the real patch: all voices, each filter rebuilt every loop
+        for v in voices:
+            v.frequency = synthio.midi_to_hz(notes[0])
+        synth.press(voices)
+        def update():
+            for v in voices:
+                v.filter = synth.low_pass_filter( lpf_basef + 2000, lpf_resonance )
+            led.fill( rainbowio.colorwheel(100) )
+            led.update()
+        return update
+    tuner = AutoTuner(audio, setup_patch, patch_id="dystopia%d" % num_voices)
+    sample_rate, buffer_size = tuner.run("/eighties_dystopia.tune")
+
+mixer = audiomixer.Mixer(channel_count=1, sample_rate=sample_rate, buffer_size=buffer_size)
+synth = synthio.Synthesizer(channel_count=1, sample_rate=sample_rate)
+audio.play(mixer)
+mixer.voice[0].play(synth)
+mixer.voice[0].level = 0.8
+voice_params = NoteParams(synth, size=num_voices)  # only changed settings get written to the voices
+voice_params.set_notes(voices)
+
 # set all the voices to the "same" frequency (with random detuning)
 # zeroth voice is sub-oscillator, one-octave down
 def set_notes(n):
-    for voice in voices:
+    for i in range(num_voices):
         #f = synthio.midi_to_hz( n ) + random.uniform(0,1.0)  # what orig sketch does
-        f = synthio.midi_to_hz( n + random.uniform(0,0.4) ) # more valid if we move up the scale
-        voice.frequency = f
-    voices[0].frequency = voices[0].frequency/2  # bass note one octave down
+        f = synthio.midi_to_hz( n + rng.uniform(0,0.4) ) # more valid if we move up the scale
+        if i == 0:
+            f = f/2  # bass note one octave down
+        voice_params.frequency(i, f)
+    voice_params.commit()
 
 # the LFO that modulates the filter cutoff
 lfo_filtermod = synthio.LFO(rate=0.05, scale=2000, offset=2000)
-# we can't attach this directly to a filter input, so stash it in the blocks runner
-synth.blocks.append(lfo_filtermod)
+# we can't attach this directly to a filter input, so have LFOTap hand us its value
+lfo_tap = LFOTap(synth, rate=100)  # check 100 times a sec, plenty for a slow sweep
+# the synth adds the base frequency for us, as a synthio.Math block
+filter_freq = compile_mod("base + lfo", base=lpf_basef, lfo=lfo_filtermod)
+
+def set_filters(value, delta):
+    # no global filter, so update each voice's filter (they all share one, made at commit)
+    for i in range(num_voices):
+        voice_params.filter(i, value, lpf_resonance)
+
+def set_led(value, delta):
+    led.fill( rainbowio.colorwheel( value/20 ) )  # show filtermod moving, written by led.update()
+
+lfo_tap.subscribe(filter_freq, set_filters, threshold=2)  # Hz
+lfo_tap.subscribe(lfo_filtermod, set_led, threshold=20)  # one colorwheel step
 
 note = notes[0]
 last_note_time = time.monotonic()
 last_filtermod_time = time.monotonic()
 
+# set enabled=True to print how much memory each part of the loop allocates
+gc_watch = GCWatch(("lfotap", "leds", "notes"), enabled=False)
+
 # start the voices playing
 set_notes(note)
 synth.press(voices)
 
 while True:
-    # continuosly update filter, no global filter, so update each voice's filter
-    for v in voices:
-        v.filter = synth.low_pass_filter( lpf_basef + lfo_filtermod.value, lpf_resonance )
+    gc_watch.loop()
+    gc_watch.report_every(5)
+
+    lfo_tap.update()  # filter & led follow lfo_filtermod
+    voice_params.commit()
+    voice_params.report_every(5)
+    gc_watch.mark("leds")
 
-    led.fill( rainbowio.colorwheel( lfo_filtermod.value/20 ) )  # show filtermod moving
+    led.update()
+    led.report_every(5)
+    gc_watch.mark("notes")
 
     if time.monotonic() - last_filtermod_time > 1:
         last_filtermod_time = time.monotonic()
         # randomly modulate the filter frequency ('rate' in synthio) to make more dynamic
-        lfo_filtermod.rate = 0.01 + random.random() / 8
+        lfo_filtermod.rate = 0.01 + rng.random() / 8
         print("filtermod",lfo_filtermod.rate)
 
     if time.monotonic() - last_note_time > note_duration:
         last_note_time = time.monotonic()
         # pick new note, but not one we're currently playing
-        note = random.choice([n for n in notes if n != note])
+        note = rng.choice([n for n in notes if n != note])
         set_notes(note)
         print("note", note, ["%3.2f" % v.frequency for v in voices] )
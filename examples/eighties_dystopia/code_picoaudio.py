@@ -16,14 +16,18 @@
 #  - The filter modulation rate also changes randomly every second (also reflected on neopixel)
 #  - Every 15 seconds a new note is randomly chosen from the allowed note list
 #  - New for PicoADK version: slow ominoous panning
+#  - Voices are spread across the stereo field, see lib/stereo.py
 
 import time, random
 import board, digitalio, audiobusio, audiomixer, synthio
 import ulab.numpy as np
+from stereo import pan_voices, compare_stereo  # from this repo's "lib" directory
 
 notes = (33, 34, 31) # possible notes to play MIDI A1, A1#, G1
 note_duration = 15   # how long each note plays for
 num_voices = 5       # how many voices for each note
+stereo_width = 0.5   # how far apart voices are panned, 0 = all in the middle
+compare_mono = False # set True to print mono vs stereo CPU & memory at startup, to pick width vs voices
 lpf_basef = 300      # filter lowest frequency
 lpf_resonance = 1.7  # filter q
 
@@ -32,6 +36,13 @@ lpf_resonance = 1.7  # filter q
 #mute_pin.switch_to_output(value=True)
 audio = audiobusio.I2SOut(bit_clock=board.GP10, word_select=board.GP11, data=board.GP9)
 
+if compare_mono:  # a stack of saws like the real patch, mono then stereo
+    def make_voices(n):
+        wave = np.linspace(30000, -30000, num=512, dtype=np.int16)
+        return [synthio.Note(synthio.midi_to_hz(notes[0]) * (1 + 0.003*i), waveform=wave)
+                for i in range(n)]
+    compare_stereo(audio, 28000, make_voices, voice_counts=(3, 5, 7, 9), width=stereo_width)
+
 mixer = audiomixer.Mixer(channel_count=2, sample_rate=28000, buffer_size=2048)
 synth = synthio.Synthesizer(channel_count=2, sample_rate=28000)
 audio.play(mixer)
@@ -53,6 +64,7 @@ lfo_filtermod = synthio.LFO(rate=0.05, scale=2000, offset=2000)
 synth.blocks.append(lfo_filtermod)
 
 lfo_panning = synthio.LFO( rate=0.1, scale=0.5 )
+pan_voices(voices, width=stereo_width, lfo=lfo_panning)  # spread stack, all swaying together
 
 # set all the voices to the "same" frequency (with random detuning)
 # zeroth voice is sub-oscillator, one-octave down
@@ -61,7 +73,6 @@ def set_notes(n):
         #f = synthio.midi_to_hz( n ) + random.uniform(0,1.0)  # what orig sketch does
         f = synthio.midi_to_hz( n + random.uniform(0,0.4) ) # more valid if we move up the scale
         voice.frequency = f
-        voice.panning = lfo_panning
     voices[0].frequency = voices[0].frequency/2  # bass note one octave down
 
 note = notes[0]
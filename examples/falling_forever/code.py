@@ -41,6 +41,7 @@ class Wavetable:
             raise ValueError("unsupported WAV format")
         self.waveform = np.zeros(wave_len, dtype=np.int16)  # empty buffer we'll copy into
         self.num_waves = self.w.getnframes() // self.wave_len
+        self.last_wave_pos = (self.num_waves-1) * self.wave_len
         self.set_wave_pos(0)  # set initial position
 
     def set_wave_pos(self, pos):
@@ -49,7 +50,7 @@ class Wavetable:
         samp_pos = int(pos) * self.wave_len  # get sample position
         self.w.setpos(samp_pos)
         waveA = np.frombuffer(self.w.readframes(self.wave_len), dtype=np.int16)
-        self.w.setpos(samp_pos + self.wave_len)  # one wave up
+        self.w.setpos(min(samp_pos + self.wave_len, self.last_wave_pos))  # one wave up, if there is one
         waveB = np.frombuffer(self.w.readframes(self.wave_len), dtype=np.int16)
         pos_frac = pos - int(pos)  # fractional position between wave A & B
         self.waveform[:] = lerp(waveA, waveB, pos_frac) # mix waveforms A & B
@@ -19,16 +19,21 @@
 # - GP10 - I2S LRCK
 # - GP11 - IS2 DIN
 #
+# The two notes are panned apart, set stereo_width = 0 for both in the middle
+#
 # For a PWM version of this using QTPy RP2040 and PWM audio, see code.py
 #
 
 import board, time, audiobusio, synthio
 import ulab.numpy as np
 import adafruit_wave
+from stereo import pan_voices  # from this repo's "lib" directory
+
+stereo_width = 0.6  # how far left & right the two notes are panned
 
 i2s_bclk, i2s_wsel, i2s_data = board.GP9, board.GP10, board.GP11
 audio = audiobusio. I2SOut(bit_clock=i2s_bclk, word_select=i2s_wsel, data=i2s_data)
-synth = synthio.Synthesizer(sample_rate=28672)  # 28 * 1024
+synth = synthio.Synthesizer(sample_rate=28672, channel_count=2)  # 28 * 1024, stereo I2S DAC
 audio.play(synth)
 
 # mix between values a and b, works with numpy arrays too,  t ranges 0-1
@@ -43,6 +48,7 @@ class Wavetable:
             raise ValueError("unsupported WAV format")
         self.waveform = np.zeros(wave_len, dtype=np.int16)  # empty buffer we'll copy into
         self.num_waves = self.w.getnframes() // self.wave_len
+        self.last_wave_pos = (self.num_waves-1) * self.wave_len
         self.set_wave_pos(0)  # set initial position
 
     def set_wave_pos(self, pos):
@@ -51,7 +57,7 @@ class Wavetable:
         samp_pos = int(pos) * self.wave_len  # get sample position
         self.w.setpos(samp_pos)
         waveA = np.frombuffer(self.w.readframes(self.wave_len), dtype=np.int16)
-        self.w.setpos(samp_pos + self.wave_len)  # one wave up
+        self.w.setpos(min(samp_pos + self.wave_len, self.last_wave_pos))  # one wave up, if there is one
         waveB = np.frombuffer(self.w.readframes(self.wave_len), dtype=np.int16)
         pos_frac = pos - int(pos)  # fractional position between wave A & B
         self.waveform[:] = lerp(waveA, waveB, pos_frac) # mix waveforms A & B
@@ -66,6 +72,7 @@ plfo1 = synthio.LFO(rate=0.10, once=True, waveform=lfo_wave_dz)
 plfo2 = synthio.LFO(rate=0.10, once=True, waveform=lfo_wave_uz)
 note1 = synthio.Note(frequency=65.4, waveform=wavetable1.waveform, bend=plfo1)
 note2 = synthio.Note(frequency=65.4, waveform=wavetable2.waveform, bend=plfo2, amplitude=0.7)
+pan_voices((note1, note2), width=stereo_width)  # note1 left, note2 right
 synth.press( (note1,note2) )
 
 # scan through the wavetable, morphing through each one
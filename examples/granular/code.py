@@ -0,0 +1,56 @@
+# granular_code.py -- clouds of tiny grains sprayed from a WAV file
+# part of https://github.com/todbot/circuitpython-synthio-tricks
+#
+# Demonstrate granular.py: a WAV file is loaded once, and short "grains" of it
+# are played by a pool of synthio.Notes, each grain a zero-copy slice of the sample.
+# A slow LFO scans where in the sample the grains come from, and every few
+# seconds the pitch of the cloud changes.
+#
+# Needs WAV file from waveeditonline.com (any 16-bit mono WAV will work)
+# - BRAIDS02.WAV - http://waveeditonline.com/index-17.html
+#
+# External libraries needed:
+# - adafruit_wave  - circup install adafruit_wave
+# - granular.py & noise.py - copy from this repo's "lib" directory to CIRCUITPY/lib
+#
+# Pins used on QTPY RP2040:
+# - board.MOSI - Audio PWM output (needs RC filter output)
+#
+
+import time
+import board, audiopwmio, audiomixer, synthio
+from granular import GrainCloud, load_sample
+
+pitches = (1.0, 0.75, 1.5, 0.5)  # playback speeds the cloud moves between
+pitch_time = 4  # seconds between pitch changes
+
+audio = audiopwmio.PWMAudioOut(board.MOSI)
+mixer = audiomixer.Mixer(channel_count=1, sample_rate=28000, buffer_size=4096)
+synth = synthio.Synthesizer(channel_count=1, sample_rate=28000)
+audio.play(mixer)
+mixer.voice[0].play(synth)
+mixer.voice[0].level = 0.5  # lots of grains overlapping gets loud
+
+sample, sample_rate = load_sample("wav/BRAIDS02.WAV")
+print("loaded sample:", len(sample), "samples at", sample_rate)
+
+cloud = GrainCloud(synth, sample, sample_rate, num_voices=8)
+cloud.density = 25
+cloud.grain_time = 0.12
+cloud.spray = 0.02
+cloud.pitch_spray = 0.01
+
+# slowly scan through the sample, 0 to 1 and back
+lfo_position = synthio.LFO(rate=0.05, scale=0.5, offset=0.5)
+synth.blocks.append(lfo_position)  # runs without being attached to a note
+
+pitch_pos = 0
+last_pitch_time = time.monotonic()
+while True:
+    cloud.position = lfo_position.value
+    cloud.update()
+    if time.monotonic() - last_pitch_time > pitch_time:
+        last_pitch_time = time.monotonic()
+        pitch_pos = (pitch_pos + 1) % len(pitches)
+        cloud.pitch = pitches[pitch_pos]
+        print("pitch", cloud.pitch)
@@ -4,18 +4,36 @@
 # video demo: https://youtu.be/S1-TDjxE3Qs
 #
 # Responds to these MIDI messages (over both USB or Serial MIDI):
-# - note on / off
+# - note on / off       -- legato, falls back to held notes by note_priority
+# - sustain pedal       -- CC 64
 # - filter cutoff      -- CC 74
 # - filter resonance   -- CC 71
 # - env release time   -- CC 72 / CC 18
 # - osc detune amount  -- CC 93
 # - pitch vibrato      -- CC 1 (modwheel)
+# - pitch bend         -- +/- pitch_bend_range semitones
+# - recall preset      -- Program Change
+# - save preset        -- CC 119 (saves into the last recalled preset slot)
+# - save input trace   -- CC 117 (when trace_mode = "record")
+#
+# Presets are saved to "/monosynth1.presets" using presets.py from this repo's "lib",
+# which needs CIRCUITPY writable from CircuitPython (see presets.py)
+#
+# To reproduce a glitch exactly, set trace_mode = "record", play until it happens,
+# send CC 117 to save what was played, then set trace_mode = "replay" to play it back
+# at the same times, on the board or in tools/hostsynth.py (see inputtrace.py)
+#
+# Set measure_latency = True to print how long note-ons take to get through
+# each stage on their way to the synth, and the audio buffers after it (see latency.py)
 #
 # Pins used:
 # - board.RX - MIDI input  (needs optoisolator input)
 # - board.SCK - Audio PWM output (needs RC filter output)
 
 import time,random
+from staged import StagedBoot  # from this repo's "lib" directory
+boot = StagedBoot()  # start timing as early as we can
+
 import board, busio
 import audiomixer, audiopwmio
 import synthio
@@ -26,7 +44,15 @@ import adafruit_midi  # circup install adafruit_midi
 from adafruit_midi.note_on import NoteOn
 from adafruit_midi.note_off import NoteOff
 from adafruit_midi.control_change import ControlChange
+from adafruit_midi.program_change import ProgramChange
+from adafruit_midi.pitch_bend import PitchBend
 import neopixel   # circup install neopixel
+from envcache import EnvelopeCache
+from gcwatch import GCWatch
+from notestate import NoteState
+from noteparams import NoteParams
+from smoothcc import SmoothCC
+from modmath import compile_mod
 
 midi_channel=1         # which midi channel to receive on
 oscs_per_note = 3      # how many oscillators for each note
@@ -37,11 +63,19 @@ filter_res_lo = 0.5    # filter q lowest value
 filter_res_hi = 2.0    # filter q highest value
 vibrato_lfo_hi = 0.1   # vibrato amount when modwheel is maxxed out
 vibrato_rate = 5       # vibrato frequency
+pitch_bend_range = 2   # semitones up or down at full pitch bend
+note_priority = "last" # which held note plays: "last", "low", or "high"
+trace_mode = None      # None, "record", or "replay" MIDI input to/from trace_file
+trace_file = "/monosynth1.trace"
+measure_latency = False  # print note-on latency of each stage every few seconds
 
 led = neopixel.NeoPixel(board.NEOPIXEL, 1, brightness=0.2)
 uart = busio.UART(rx=board.RX, baudrate=31250, timeout=0.001 )
 midi_usb  = adafruit_midi.MIDI(midi_in=usb_midi.ports[0], in_channel=midi_channel-1)
 midi_uart = adafruit_midi.MIDI(midi_in=uart, in_channel=midi_channel-1)
+recorder = replayer = None  # loaded by a boot stage below, if trace_mode is set
+latency = None  # loaded by a boot stage below, if measure_latency is set
+preset_bank = None  # loaded by a boot stage below
 
 # set up the audio system, mixer, and synth
 audio = audiopwmio.PWMAudioOut(board.SCK)  # SCK pin on QTPY RP2040
@@ -50,26 +84,80 @@ synth = synthio.Synthesizer(channel_count=1, sample_rate=28000)
 audio.play(mixer)
 mixer.voice[0].play(synth)
 mixer.voice[0].level = 0.75  # cut the volume a bit so doesn't distort
+boot.mark("audio")
 
 # our oscillator waveform, a 512 sample downward saw wave going from +/-28k
 wave_saw = np.linspace(28000, -28000, num=512, dtype=np.int16)  # max is +/-32k but gives us headroom
-lfo_vibrato = synthio.LFO(rate=vibrato_rate, scale=0.01 ) # scale set with modwheel
+# modwheel & pitch bend glide between MIDI values in the synth, so no zipper noise (see smoothcc.py)
+modwheel = SmoothCC(synth, value=0.01)
+pitch_bend = SmoothCC(synth)
+lfo_vibrato = synthio.LFO(rate=vibrato_rate, scale=modwheel.block ) # scale set with modwheel
+osc_bend = compile_mod("vibrato + bend", vibrato=lfo_vibrato, bend=pitch_bend.block)  # one synthio.Math
 
 oscs = []   # holds currently sounding oscillators
+osc_params = NoteParams(synth, size=oscs_per_note)  # writes only changed osc settings, report=True to see
 filter_freq = 2000  # current setting of filter
 filter_res = 1.0    # current setting of filter
 amp_env_release_time = 0.8  # current release time
-note_played = 0  # current note playing
+note_played = None  # current note playing
+note_velocity = 100  # velocity it was started with
+notes = NoteState(priority=note_priority)  # held & sustained notes
+env_cache = EnvelopeCache(max_size=32, sustain_ratio=0.8)  # so note_on doesn't make new Envelopes
+preset_slot = 0  # last preset recalled
 
 # simple range mapper, like Arduino map()
 def map_range(s, a1, a2, b1, b2): return  b1 + ((s - a1) * (b2 - b1) / (a2 - a1))
 
+def preset_params():
+    return {"filter_freq": filter_freq, "filter_res": filter_res,
+            "amp_env_release_time": amp_env_release_time, "osc_detune": osc_detune,
+            "vibrato": modwheel.target}
+
+def recall_filter(params):
+    global filter_freq, filter_res
+    filter_freq, filter_res = params["filter_freq"], params["filter_res"]  # main loop sends to oscs
+
+def recall_amp_env(params):
+    global amp_env_release_time
+    amp_env_release_time = params["amp_env_release_time"]
+
+def recall_osc(params):
+    global osc_detune
+    osc_detune = params["osc_detune"]
+    modwheel.set(params["vibrato"])
+
+def load_presets():
+    global preset_bank
+    from presets import PresetBank  # from this repo's "lib" directory
+    preset_bank = PresetBank("/monosynth1.presets", (("filter_freq","f"), ("filter_res","f"),
+                             ("amp_env_release_time","f"), ("osc_detune","f"), ("vibrato","f")))
+    # recalling a preset only rebuilds the things whose settings changed
+    preset_bank.watch(("filter_freq","filter_res"), recall_filter)
+    preset_bank.watch(("amp_env_release_time",), recall_amp_env)
+    preset_bank.watch(("osc_detune","vibrato"), recall_osc)
+
+def load_trace():
+    global recorder, replayer
+    from inputtrace import InputRecorder, InputReplayer  # from this repo's "lib" directory
+    recorder = InputRecorder() if trace_mode == "record" else None
+    replayer = InputReplayer(trace_file) if trace_mode == "replay" else None
+
+def load_latency():
+    global latency
+    from latency import NoteLatency  # from this repo's "lib" directory
+    latency = NoteLatency(("handler", "press"), sample_rate=mixer.sample_rate, buffer_size=2048)
+
+# only what the notes need is loaded before the main loop, the rest comes in from it
+boot.add("presets", load_presets)
+if trace_mode:
+    boot.add("trace", load_trace)
+if measure_latency:
+    boot.add("latency", load_latency)
+
 # midi note on
 def note_on(notenum, vel):
     amp_level = map_range(vel, 0,127, 0,1)
-    amp_env = synthio.Envelope(attack_time=0.1, decay_time=0.05,
-                               release_time=amp_env_release_time,
-                               attack_level=amp_level, sustain_level=amp_level*0.8)
+    amp_env = env_cache.get(0.1, 0.05, amp_env_release_time, amp_level)
     f = synthio.midi_to_hz(notenum)
     oscs.clear()  # chuck out old oscs to make new ones
     for i in range(oscs_per_note):
@@ -77,41 +165,92 @@ def note_on(notenum, vel):
         lpf = synth.low_pass_filter(filter_freq, filter_res)
         # in synthio, 'Note' objects are more like oscillators
         oscs.append( synthio.Note( frequency=fr, filter=lpf, envelope=amp_env,
-                                   waveform=wave_saw, bend=lfo_vibrato) )
+                                   waveform=wave_saw, bend=osc_bend) )
+    if latency:
+        latency.mark("press")
+    osc_params.set_notes(oscs)
     synth.press(oscs)  # press the 'note' (collection of oscs acting in concert)
 
 # midi note off
 def note_off(notenum,vel):
     synth.release(oscs)
     oscs.clear()
+    osc_params.set_notes(oscs)
+
+# glide the sounding oscs to a new note, without restarting their envelopes
+def note_legato(notenum):
+    f = synthio.midi_to_hz(notenum)
+    for i in range(len(oscs)):
+        osc_params.frequency(i, f * (1 + (osc_detune*i)))
+
+# make the synth play whatever note the held notes say it should
+def play_current_note():
+    global note_played
+    notenum = notes.current()
+    if notenum == note_played:
+        return
+    if notenum is None:
+        led.fill(0x00000)
+        note_off(note_played, 0)
+    elif oscs:  # this is a monosynth, so if they play legato, just change pitch
+        note_legato(notenum)
+    else:
+        led.fill(0xff00ff)
+        note_on(notenum, note_velocity)
+    note_played = notenum
+
+# set enabled=True to print how much memory each part of the loop allocates
+gc_watch = GCWatch(("filter", "midi", "handle"), enabled=False)
 
+boot.mark("notes")
+boot.first_sound()
 print("monosynth1 ready, listening to incoming USB and Serial MIDI")
 
 while True:
+    boot.update()  # finish booting, one stage per pass
+    gc_watch.loop()
+    gc_watch.report_every(5)
+    if latency:
+        latency.report_every(5)
+    osc_params.report_every(5)
 
-    # to do global filtermod we must iterate over all oscillators in each note
-    for osc in oscs:
-        osc.filter = synth.low_pass_filter( filter_freq, filter_res )
+    # to do global filtermod we must iterate over all oscillators in each note,
+    # osc_params only hands them a new filter when the settings have changed
+    for i in range(len(oscs)):
+        osc_params.filter(i, filter_freq, filter_res)
+    osc_params.commit()  # and the legato frequency changes from last pass
 
-    msg = midi_uart.receive() or midi_usb.receive()
+    gc_watch.mark("midi")
+    if latency:
+        latency.poll()
+    msg = replayer.midi() if replayer else midi_uart.receive() or midi_usb.receive()
+    if recorder:
+        recorder.midi(msg)
+    gc_watch.mark("handle")
 
     if isinstance(msg, NoteOn) and msg.velocity != 0:
+        if latency:
+            latency.start()
         print("noteOn: ", msg.note, "vel=", msg.velocity)
-        led.fill(0xff00ff)
-        note_off( note_played, 0 )  # this is a monosynth, so if they play legato, noteoff!
-        note_on(msg.note, msg.velocity)
-        note_played = msg.note
+        if len(notes) == 0:
+            note_velocity = msg.velocity  # legato notes keep the first note's velocity
+        notes.press(msg.note)
+        play_current_note()
+        if latency:
+            latency.done()
 
     elif isinstance(msg,NoteOff) or isinstance(msg,NoteOn) and msg.velocity==0:
         print("noteOff:", msg.note, "vel=", msg.velocity)
-        if msg.note == note_played:  # only release note that's sounding
-            led.fill(0x00000)
-            note_off(msg.note, msg.velocity)
+        notes.release(msg.note)
+        play_current_note()  # back to a note still held, or off
 
     elif isinstance(msg,ControlChange):
         print("CC", msg.control, "=", msg.value)
-        if msg.control == 1:  # mod wheel
-            lfo_vibrato.scale = map_range(msg.value, 0,127, 0, vibrato_lfo_hi)
+        if msg.control == 64:  # sustain pedal
+            notes.sustain(msg.value >= 64)
+            play_current_note()
+        elif msg.control == 1:  # mod wheel
+            modwheel.cc(msg.value, 0, vibrato_lfo_hi)
         elif msg.control == 74: # filter cutoff
             filter_freq = map_range( msg.value, 0,127, filter_freq_lo, filter_freq_hi)
         elif msg.control == 71: # filter resonance
@@ -120,3 +259,28 @@ while True:
             amp_env_release_time = map_range( msg.value, 0,127, 0.1, 1)
         elif msg.control == 93:  # 'chorus' amount (detune amount)
             osc_detune = map_range( msg.value, 0,127, 0, 0.01)
+        elif msg.control == 117 and msg.value > 0 and recorder:  # save input trace
+            print("saving input trace", trace_file)
+            try:
+                recorder.save(trace_file)
+            except OSError as e:
+                print("could not save trace, is CIRCUITPY writable?", e)
+        elif msg.control == 119 and msg.value > 0 and preset_bank:  # save preset
+            print("saving preset", preset_slot)
+            try:
+                preset_bank.save(preset_slot, preset_params())
+            except OSError as e:
+                print("could not save preset, is CIRCUITPY writable?", e)
+            except ValueError as e:  # old or broken preset file
+                print("could not save preset:", e)
+
+    elif isinstance(msg,PitchBend):
+        pitch_bend.pitch_bend(msg.pitch_bend, pitch_bend_range)
+
+    elif isinstance(msg,ProgramChange) and preset_bank:
+        preset_slot = msg.patch % preset_bank.num_slots
+        print("recall preset", preset_slot)
+        try:
+            preset_bank.recall(preset_slot, preset_params())
+        except (OSError, ValueError) as e:  # old or broken preset file
+            print("could not recall preset:", e)
@@ -0,0 +1,112 @@
+# multitimbral_code.py -- bass and pad synths at once, on different MIDI channels
+# part of https://github.com/todbot/circuitpython-synthio-tricks
+#
+# Demonstrate running more than one patch with patchengine.py:
+# - MIDI channel 1 - monophonic detuned-saw bass, like monosynth1
+# - MIDI channel 2 - polyphonic swirly pad, like eighties_dystopia
+#
+# At startup it plays test notes on each part and prints how much CPU
+# each one takes, so you can tell if adding voices will cause underruns.
+#
+# External libraries needed:
+# - adafruit_midi  - circup install adafruit_midi
+# - patchengine.py - copy from this repo's "lib" directory to CIRCUITPY/lib
+#
+# Pins used on QTPY RP2040:
+# - board.MOSI - Audio PWM output (needs RC filter output)
+#
+
+import board, audiopwmio, synthio
+import ulab.numpy as np
+import usb_midi
+import adafruit_midi
+from patchengine import PatchEngine, Part
+
+sample_rate = 28000
+
+# one waveform shared by both parts, a 512 sample downward saw wave going from +/-28k
+wave_saw = np.linspace(28000, -28000, num=512, dtype=np.int16)
+
+# simple range mapper, like Arduino map()
+def map_range(s, a1, a2, b1, b2): return  b1 + ((s - a1) * (b2 - b1) / (a2 - a1))
+
+class BassPart(Part):
+    """ The monosynth1 patch: three detuned saws through a lowpass filter """
+    def setup(self):
+        self.oscs_per_note = 3
+        self.osc_detune = 0.001
+        self.filter_freq = 1200
+        self.filter_res = 1.2
+        self.amp_env = synthio.Envelope(attack_time=0.01, decay_time=0.1, release_time=0.2,
+                                        attack_level=1, sustain_level=0.8)
+        self.release_time = self.amp_env.release_time
+        self.oscs = []
+        self.note_played = 0
+        self.test_notes = (36,)  # it's a monosynth
+
+    def note_on(self, notenum, vel):
+        self.synth.release(self.oscs)  # monosynth, so release any note playing
+        f = synthio.midi_to_hz(notenum)
+        lpf = self.synth.low_pass_filter(self.filter_freq, self.filter_res)
+        self.oscs.clear()
+        for i in range(self.oscs_per_note):
+            self.oscs.append( synthio.Note( frequency=f * (1 + self.osc_detune*i), filter=lpf,
+                                            envelope=self.amp_env, waveform=wave_saw) )
+        self.synth.press(self.oscs)
+        self.note_played = notenum
+
+    def note_off(self, notenum, vel):
+        if notenum == self.note_played:
+            self.synth.release(self.oscs)
+
+    def control_change(self, control, value):
+        if control == 74:  # filter cutoff
+            self.filter_freq = map_range(value, 0,127, 100, 4500)
+            lpf = self.synth.low_pass_filter(self.filter_freq, self.filter_res)
+            for osc in self.oscs:
+                osc.filter = lpf
+
+
+class PadPart(Part):
+    """ The eighties_dystopia patch: slow detuned saws with an LFO on the filter """
+    def setup(self):
+        self.amp_env = synthio.Envelope(attack_time=0.8, release_time=1.5, sustain_level=0.8)
+        self.release_time = self.amp_env.release_time
+        self.lfo_filtermod = synthio.LFO(rate=0.2, scale=800, offset=1200)
+        self.synth.blocks.append(self.lfo_filtermod)  # so it runs without a note
+        self.notes_pressed = {}  # key = midi note num, value = list of synthio.Notes
+
+    def note_on(self, notenum, vel):
+        self.note_off(notenum, 0)
+        f = synthio.midi_to_hz(notenum)
+        lpf = self.synth.low_pass_filter(self.lfo_filtermod.value, 1.2)
+        voices = [synthio.Note(frequency=f * (1 + i*0.004), envelope=self.amp_env,
+                               waveform=wave_saw, filter=lpf) for i in range(2)]
+        self.synth.press(voices)
+        self.notes_pressed[notenum] = voices
+
+    def note_off(self, notenum, vel):
+        if voices := self.notes_pressed.pop(notenum, None):
+            self.synth.release(voices)
+
+    def update(self):
+        lpf = self.synth.low_pass_filter(self.lfo_filtermod.value, 1.2)
+        for voices in self.notes_pressed.values():
+            for v in voices:
+                v.filter = lpf
+
+
+audio = audiopwmio.PWMAudioOut(board.MOSI)
+engine = PatchEngine(audio, num_parts=2, sample_rate=sample_rate, buffer_size=4096)
+engine.add( BassPart(channel=1, name="bass"), level=0.6 )
+engine.add( PadPart(channel=2, name="pad"), level=0.4 )
+
+engine.measure()
+
+midi_usb = adafruit_midi.MIDI(midi_in=usb_midi.ports[0])  # listen on all channels
+
+print("multitimbral ready, bass on MIDI channel 1, pad on channel 2")
+
+while True:
+    engine.handle_midi( midi_usb.receive() )
+    engine.update()
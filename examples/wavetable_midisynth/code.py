@@ -6,6 +6,16 @@
 # Needs WAV files from waveeditonline.com
 # - PLAITS02.WAV - http://waveeditonline.com/index-17.html
 #
+# Each voice morphs through the wavetable on its own, see lib/wavetable.py
+#
+# The sustain pedal (CC 64) holds notes after their keys are let go (see lib/notestate.py)
+#
+# If wav/ has an index made by tools/wavetable_index.py, MIDI Program Change
+# switches between all the wavetables in it, by number.
+#
+# Boots in stages (see lib/staged.py): audio starts first, then MIDI
+# and the wavetable load from the main loop, and boot timings are printed.
+#
 # External libraries needed:
 # - adafruit_wave  - circup install adafruit_wave
 # - adafruit_midi  - circup install adafruit_midi
@@ -14,15 +24,14 @@
 # - board.MOSI - Audio PWM output (needs RC filter output)
 #
 
-import time, random
-import board, audiopwmio, audiomixer, synthio
-import ulab.numpy as np
-import adafruit_wave
+import time
+from staged import StagedBoot  # from this repo's "lib" directory
+boot = StagedBoot()  # start timing as early as we can
 
-import usb_midi
-import adafruit_midi
-from adafruit_midi.note_on import NoteOn
-from adafruit_midi.note_off import NoteOff
+import board, audiopwmio, audiomixer, synthio
+from gcwatch import GCWatch  # from this repo's "lib" directory
+from modmath import compile_mod  # from this repo's "lib" directory
+from notestate import NoteState  # from this repo's "lib" directory
 
 auto_play = False  # set to true to have it play its own little song
 auto_play_notes = [36, 38, 40, 41, 43, 45, 46, 48, 50, 52]
@@ -31,10 +40,14 @@ auto_play_speed = 0.9  # time in seconds between notes
 midi_channel = 1
 
 wavetable_fname = "wav/PLAITS02.WAV"  # from http://waveeditonline.com/index-17.html
+wavetable_index_fname = "wav/WAVES.IDX"  # made by tools/wavetable_index.py, if there is one
 wavetable_sample_size = 256  # number of samples per wave in wavetable (256 is standard)
+wavetable_normalize = False  # True evens out the loudness of each wave in the table, but changes the sound
+wavetable_cache = None  # e.g. "/wav/PLAITS02.CVT" to save converted tables, needs CIRCUITPY writable
 sample_rate = 25000
 wave_lfo_min = 10  # which wavetable number to start from
 wave_lfo_max = 25  # which wavetable number to go up to
+num_voices = 6  # how many notes can play at once
 
 # pin definitions
 audio_pwm_pin = board.MOSI
@@ -45,78 +58,121 @@ mixer = audiomixer.Mixer(buffer_size=4096, voice_count=1, sample_rate=sample_rat
 audio.play(mixer)  # attach mixer to audio playback
 synth = synthio.Synthesizer(sample_rate=sample_rate)
 mixer.play(synth)  # attach synth to mixer
-
-midi_usb  = adafruit_midi.MIDI(midi_in=usb_midi.ports[0], in_channel=midi_channel-1)
-
-# mix between values a and b, works with numpy arrays too,  t ranges 0-1
-def lerp(a, b, t):  return (1-t)*a + t*b
-
-class Wavetable:
-    """ A 'waveform' for synthio.Note that uses a wavetable w/ a scannable wave position."""
-    def __init__(self, filepath, wave_len=256):
-        self.w = adafruit_wave.open(filepath)
-        self.wave_len = wave_len  # how many samples in each wave
-        if self.w.getsampwidth() != 2 or self.w.getnchannels() != 1:
-            raise ValueError("unsupported WAV format")
-        self.waveform = np.zeros(wave_len, dtype=np.int16)  # empty buffer we'll copy into
-        self.num_waves = self.w.getnframes() // self.wave_len
-        self.set_wave_pos(0)
-
-    def set_wave_pos(self, pos):
-        """Pick where in wavetable to be, morphing between waves"""
-        pos = min(max(pos, 0), self.num_waves-1)  # constrain
-        samp_pos = int(pos) * self.wave_len  # get sample position
-        self.w.setpos(samp_pos)
-        waveA = np.frombuffer(self.w.readframes(self.wave_len), dtype=np.int16)
-        self.w.setpos(samp_pos + self.wave_len)  # one wave up
-        waveB = np.frombuffer(self.w.readframes(self.wave_len), dtype=np.int16)
-        pos_frac = pos - int(pos)  # fractional position between wave A & B
-        self.waveform[:] = lerp(waveA, waveB, pos_frac) # mix waveforms A & B
-
-
-wavetable1 = Wavetable(wavetable_fname, wave_len=wavetable_sample_size)
+boot.mark("audio")
 
 amp_env = synthio.Envelope(sustain_level=0.8, attack_time=0.05, release_time=0.3)
-wave_lfo = synthio.LFO(rate=0.1, waveform=np.array((0,32767), dtype=np.int16) )
 lpf = synth.low_pass_filter(4000, 1)  # cut some of the annoying harmonics
 
-synth.blocks.append(wave_lfo)  # attach wavelfo to global lfo runner since cannot attach to note
-
-notes_pressed = {}  # keys = midi note num, value = synthio.Note,
+# voices play synthio's default square wave until the wavetable is loaded
+voice_notes = [synthio.Note(frequency=440, envelope=amp_env, filter=lpf,
+                            bend=synthio.LFO(rate=1, scale=0.01))
+               for i in range(num_voices)]
+notes_pressed = {}  # keys = midi note num, value = voice number
+notes_held = NoteState()  # which notes are held down or by the sustain pedal
+next_voice = 0
+boot.mark("voices")
+boot.first_sound()
+
+midi_usb = None  # these are filled in by the boot stages below
+wt_voices = None
+wt_index = None
+wave_lfos = []  # each voice's wave position LFO
+
+def load_midi():
+    global midi_usb, NoteOn, NoteOff, ControlChange, ProgramChange
+    import usb_midi
+    import adafruit_midi
+    from adafruit_midi.note_on import NoteOn
+    from adafruit_midi.note_off import NoteOff
+    from adafruit_midi.control_change import ControlChange
+    from adafruit_midi.program_change import ProgramChange
+    midi_usb = adafruit_midi.MIDI(midi_in=usb_midi.ports[0], in_channel=midi_channel-1)
+
+def load_wavetable():
+    global wt_voices, wt_index
+    import ulab.numpy as np
+    from wavetable import Wavetable, WavetableVoices, WavetableIndex  # from this repo's "lib" directory
+    wavetable = None
+    try:
+        wt_index = WavetableIndex(wavetable_index_fname)
+        if len(wt_index):  # an empty index is the same as none
+            # no WAV header parsing, just a seek & read, if it's 16-bit mono waves of the right size
+            wavetable = wt_index.load(0, normalize=wavetable_normalize, wave_len=wavetable_sample_size)
+    except (OSError, ValueError, IndexError) as e:  # no index, or a WAV in it is missing or bad
+        print("not using wavetable index:", e)
+    if wavetable is None:
+        wt_index = None  # so Program Change doesn't try it again
+        wavetable = Wavetable(wavetable_fname, wave_len=wavetable_sample_size,  # whole table in RAM, once
+                              normalize=wavetable_normalize, cache=wavetable_cache)
+    voices = WavetableVoices(wavetable, num_voices)  # but each voice morphs on its own
+    # every voice gets its own wave position LFO, so each note scans the wavetable from its own start
+    for i in range(num_voices):
+        wave_lfos.append( synthio.LFO(rate=0.1, waveform=np.array((0,32767), dtype=np.int16)) )  # 0-1 ramp
+        voice_notes[i].waveform = voices.waveforms[i]
+    wt_voices = voices
+    set_wave_lfo_minmax(wave_lfo_min, wave_lfo_max)
+
+boot.add("midi", load_midi)
+boot.add("wavetable", load_wavetable)
 
 def note_on(notenum, vel=100):
+    global next_voice
     # release old note at this notenum if present
-    if oldnote := notes_pressed.pop(notenum, None):
-        print("oldnote", oldnote, notes_pressed)
-        synth.release(oldnote)
-
-    if not auto_play:
-        wave_lfo.retrigger()   # retrigger the wavetable when playing over MIDI
-
-    f = synthio.midi_to_hz(notenum) # + random.uniform(-0.1,0.1) )
-    vibrato_lfo = synthio.LFO(rate=1, scale=0.01)
-    note = synthio.Note( frequency=f, waveform=wavetable1.waveform,
-                         envelope=amp_env, filter=lpf, bend=vibrato_lfo )
-    synth.press(note)
-    notes_pressed[notenum] = note
+    if (old_voice := notes_pressed.pop(notenum, None)) is not None:
+        synth.release(voice_notes[old_voice])
+
+    # use the next voice not held down, or steal the next one if all are
+    voice = next_voice
+    for i in range(num_voices):
+        v = (next_voice + i) % num_voices
+        if v not in notes_pressed.values():
+            voice = v
+            break
+    next_voice = (voice + 1) % num_voices
+    for n, v in notes_pressed.items():
+        if v == voice:  # stolen
+            notes_pressed.pop(n)
+            break
+
+    if wt_voices and not auto_play:
+        wave_lfos[voice].retrigger()   # retrigger the wavetable when playing over MIDI
+
+    note = voice_notes[voice]
+    note.frequency = synthio.midi_to_hz(notenum)
+    synth.release_then_press(note, note)
+    notes_pressed[notenum] = voice
 
 def note_off(notenum,vel=0):
-    if note := notes_pressed.pop(notenum, None):
-        synth.release(note)
+    if (voice := notes_pressed.pop(notenum, None)) is not None:
+        synth.release(voice_notes[voice])
 
 def set_wave_lfo_minmax(wmin, wmax):
-    scale = (wmax - wmin)
-    wave_lfo.scale = scale
-    wave_lfo.offset = wmin
+    # each voice's wave position is its 0-1 LFO mapped to wmin-wmax, worked out by the synth
+    for i, wave_lfo in enumerate(wave_lfos):
+        if wt_voices.lfos[i] in synth.blocks:
+            synth.blocks.remove(wt_voices.lfos[i])
+        wave_pos = compile_mod("lo + (hi - lo) * lfo", lo=wmin, hi=wmax, lfo=wave_lfo)
+        synth.blocks.append(wave_pos)  # attach to global lfo runner since cannot attach to note
+        wt_voices.lfos[i] = wave_pos  # WavetableVoices just reads its .value
+
+def set_wavetable(num):
+    if not wt_index:  # no index, or an empty one
+        return
+    num = num % len(wt_index)
+    print("wavetable", num, wt_index.name(num))
+    try:
+        wt_voices.set_wavetable( wt_index.load(num, wt_voices.wavetable, normalize=wavetable_normalize,
+                                             wave_len=wavetable_sample_size) )  # same memory if it fits
+    except (OSError, ValueError, IndexError) as e:  # WAV renamed or deleted since indexing, or bad
+        print("can't use it:", e)
 
 last_synth_update_time = 0
 def update_synth():
     global last_synth_update_time
     # only update 100 times a sec to lighten the load
-    if time.monotonic() - last_synth_update_time > 0.01:
-       last_update_time = time.monotonic()
-       #print( "%.2f" % wave_lfo.value )
-       wavetable1.set_wave_pos( wave_lfo.value )
+    if wt_voices and time.monotonic() - last_synth_update_time > 0.01:
+       last_synth_update_time = time.monotonic()
+       wt_voices.update()  # morph every voice whose LFO has moved
 
 last_auto_play_time = 0
 auto_play_pos = -1
@@ -130,20 +186,37 @@ def update_auto_play():
        note_on( auto_play_notes[ auto_play_pos ] )
 
 
-set_wave_lfo_minmax(wave_lfo_min, wave_lfo_max)
+# set enabled=True to print how much memory each part of the loop allocates
+gc_watch = GCWatch(("wavetable", "autoplay", "midi"), enabled=False)
 
 print("wavetable midisynth. auto_play:",auto_play)
 
 while True:
+    boot.update()  # finish booting, one stage per pass
+    gc_watch.loop()
+    gc_watch.report_every(5)
     update_synth()
+    gc_watch.mark("autoplay")
     update_auto_play()
+    gc_watch.mark("midi")
 
+    if not midi_usb:
+        continue
     msg = midi_usb.receive()
 
     if isinstance(msg, NoteOn) and msg.velocity != 0:
         print("noteOn: ", msg.note, "v=", msg.velocity)
+        notes_held.press(msg.note)
         note_on(msg.note, msg.velocity)
 
     elif isinstance(msg,NoteOff) or isinstance(msg,NoteOn) and msg.velocity==0:
         print("noteOff:", msg.note, "v=", msg.velocity)
-        note_off(msg.note, msg.velocity)
+        if notes_held.release(msg.note):  # unless the sustain pedal is holding it
+            note_off(msg.note, msg.velocity)
+
+    elif isinstance(msg, ControlChange) and msg.control == 64:  # sustain pedal
+        for i in range(notes_held.sustain(msg.value >= 64)):  # notes the pedal was holding
+            note_off(notes_held.ended[i])
+
+    elif isinstance(msg, ProgramChange) and wt_voices:
+        set_wavetable(msg.patch)
@@ -0,0 +1,133 @@
+# autotune.py -- pick the best sample rate & buffer size your board can keep up with
+# part of https://github.com/todbot/circuitpython-synthio-tricks
+#
+# Higher sample rates sound better and smaller mixer buffers respond faster,
+# but both cost CPU, and if audio can't be rendered before the buffer runs out
+# you get glitches.  Instead of guessing per example, AutoTuner plays your real
+# patch (same voices, same filters, same main loop work) at each candidate
+# setting and measures the headroom left before the buffer deadline:
+#
+#   headroom = 1 - (CPU load of rendering) - (longest main loop pass / buffer time)
+#
+# It picks the highest sample rate, and then the smallest buffer at that rate,
+# whose headroom is at least 'margin'.  The answer is saved in a small file so
+# later boots skip the calibration, until you change the patch_id.
+#
+# Use it like:
+#   def setup_patch(synth):      # press your real voices, return your per-loop work
+#       synth.press(voices)
+#       def update():
+#           for v in voices: v.filter = synth.low_pass_filter(cutoff, 1.5)
+#       return update
+#   tuner = AutoTuner(audio, setup_patch, patch_id="dystopia5")
+#   sample_rate, buffer_size = tuner.run("/autotune.bin")
+#
+# Note: to save to flash, CIRCUITPY must be writable by CircuitPython, which needs
+# a boot.py with `storage.remount("/", readonly=False)`. If it isn't, tuning
+# still works, it just happens every boot.
+#
+
+import time, struct
+import audiomixer, synthio
+
+SAMPLE_RATES = (22050, 25000, 28000, 28672, 32000)
+BUFFER_SIZES = (1024, 2048, 4096)  # audiomixer buffer_size is in bytes, not samples
+
+TUNE_MAGIC = b"SYN2"  # SYNT files were tuned with a buffer time twice too long, so tune again
+TUNE_FMT = "<4s16sBIH"  # magic, patch_id, channel_count, sample_rate, buffer_size (bytes)
+
+class AutoTuner:
+    """ Measures a patch at each sample rate & buffer size to find the best that fits """
+    def __init__(self, audio, setup_patch, patch_id="patch", channel_count=1,
+                 sample_rates=SAMPLE_RATES, buffer_sizes=BUFFER_SIZES, margin=0.3, duration=0.3):
+        self.audio = audio
+        self.setup_patch = setup_patch  # setup_patch(synth) presses notes, returns update func or None
+        self.patch_id = patch_id.encode()[:16]
+        self.channel_count = channel_count
+        self.sample_rates = sorted(sample_rates, reverse=True)  # best first
+        self.buffer_sizes = sorted(buffer_sizes)  # best first
+        self.margin = margin  # headroom fraction that must be left over
+        self.duration = duration  # seconds to measure each setting
+
+    def _spin(self, update):
+        # count main loop passes in self.duration seconds & find the longest one,
+        # audio rendering happens in the background so it eats into this count
+        n = 0
+        longest = 0
+        last = time.monotonic_ns()
+        deadline = last + int(self.duration * 1_000_000_000)
+        while last < deadline:
+            if update:
+                update()
+            n += 1
+            now = time.monotonic_ns()
+            longest = max(longest, now - last)
+            last = now
+        return n, longest / 1_000_000_000
+
+    def measure(self, sample_rate, buffer_size):
+        """Play the patch at this setting, return headroom fraction left before the buffer deadline"""
+        mixer = audiomixer.Mixer(channel_count=self.channel_count, sample_rate=sample_rate,
+                                 buffer_size=buffer_size)
+        synth = synthio.Synthesizer(channel_count=self.channel_count, sample_rate=sample_rate)
+        self.audio.play(mixer)
+        mixer.voice[0].play(synth)
+        idle, _ = self._spin(None)
+        update = self.setup_patch(synth)
+        busy, longest = self._spin(update)
+        synth.release_all()
+        self.audio.stop()
+        mixer.deinit()
+        synth.deinit()
+        load = 1 - busy / idle
+        buffer_time = buffer_size // (2 * self.channel_count) / sample_rate  # 16-bit samples
+        headroom = 1 - load - longest / buffer_time
+        print("autotune: %5d Hz %4d buffer: load %3d%% longest loop %4.1f ms of %4.1f ms headroom %3d%%" %
+              (sample_rate, buffer_size, load*100, longest*1000, buffer_time*1000, headroom*100))
+        return headroom
+
+    def tune(self):
+        """Return (sample_rate, buffer_size), the best setting with enough headroom"""
+        for sample_rate in self.sample_rates:
+            for buffer_size in self.buffer_sizes:
+                if self.measure(sample_rate, buffer_size) >= self.margin:
+                    return sample_rate, buffer_size
+        print("autotune: nothing has enough headroom, using the safest setting")
+        return self.sample_rates[-1], self.buffer_sizes[-1]
+
+    def load(self, filepath):
+        """Return cached (sample_rate, buffer_size) for this patch, or None"""
+        try:
+            with open(filepath, "rb") as f:
+                data = f.read(struct.calcsize(TUNE_FMT))
+        except OSError:  # no file yet
+            return None
+        if len(data) != struct.calcsize(TUNE_FMT):
+            return None
+        magic, patch_id, channel_count, sample_rate, buffer_size = struct.unpack(TUNE_FMT, data)
+        if (magic != TUNE_MAGIC or patch_id.rstrip(b"\0") != self.patch_id or
+            channel_count != self.channel_count):
+            return None
+        return sample_rate, buffer_size
+
+    def save(self, filepath, sample_rate, buffer_size):
+        """Cache the setting, return False if the filesystem is read-only"""
+        try:
+            with open(filepath, "wb") as f:
+                f.write(struct.pack(TUNE_FMT, TUNE_MAGIC, self.patch_id, self.channel_count,
+                                    sample_rate, buffer_size))
+        except OSError:
+            print("autotune: can't save to", filepath, "(is CIRCUITPY writable?)")
+            return False
+        return True
+
+    def run(self, filepath):
+        """Use the cached setting if there is one, otherwise tune & cache it"""
+        setting = self.load(filepath)
+        if setting:
+            print("autotune: cached %d Hz, %d buffer" % setting)
+            return setting
+        setting = self.tune()
+        self.save(filepath, *setting)
+        print("autotune: chose %d Hz, %d buffer" % setting)
+        return setting
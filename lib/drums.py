@@ -0,0 +1,117 @@
+# drums.py -- simple drum synthesis (kick, snare, hat, clap) with synthio
+# part of https://github.com/todbot/circuitpython-synthio-tricks
+#
+# Each drum is made of synthio.Notes, LFOs, and filters that are created once,
+# then re-triggered on every hit.  So playing a fast pattern doesn't make any
+# new objects, and the drums can run alongside a synth part on the same Synthesizer.
+#
+# Tricks used:
+# - kick: a sine wave with a fast "once" pitch bend LFO sweeping down (like falling_forever)
+# - snare: a short pitch-dropping tone plus band-passed noise
+# - hat: high-passed noise with a very short envelope
+# - clap: band-passed noise with a "once" amplitude LFO that makes a few quick bursts
+#
+# Use it like:
+#   kit = DrumKit(synth)
+#   kit.hit(KICK)   # or kit.kick.hit()
+#   while True:
+#       kit.update()  # releases drum notes when they're done
+#
+
+import time
+import synthio
+import ulab.numpy as np
+from noise import noise_wave
+
+KICK, SNARE, HAT, CLAP = 0, 1, 2, 3
+
+SAMPLE_SIZE = 256
+wave_sine = np.array(np.sin(np.linspace(0, 2*np.pi, SAMPLE_SIZE, endpoint=False)) * 32000, dtype=np.int16)
+wave_noise = noise_wave(SAMPLE_SIZE, seed=2023)
+
+# Waveforms for "once" LFOs.  A once LFO goes from its first value to its last over
+# one period, len-1 steps, then holds the last value
+def once_rate(wave, step_time):
+    """LFO rate that makes each step of a once LFO's wave last step_time seconds"""
+    return 1 / (step_time * (len(wave) - 1))
+
+wave_rampdown = np.array((32767, 0), dtype=np.int16)  # pitch bend starts high, reaches zero after one step
+
+class DrumVoice:
+    """ One drum sound, made of preallocated Notes that are re-pressed on every hit """
+    def __init__(self, synth, notes, lfos=(), duration=0.2):
+        self.synth = synth
+        self.notes = notes  # tuple of synthio.Notes, pressed together
+        self.lfos = lfos  # "once" LFOs to retrigger on each hit
+        self.duration = duration  # how long until the notes are released
+        self.hit_time = 0
+        self.playing = False
+
+    def hit(self):
+        for lfo in self.lfos:
+            lfo.retrigger()
+        # releasing then pressing makes an already-sounding drum start over
+        self.synth.release_then_press(self.notes, self.notes)
+        self.hit_time = time.monotonic()
+        self.playing = True
+
+    def update(self, now):
+        if self.playing and now - self.hit_time > self.duration:
+            self.synth.release(self.notes)
+            self.playing = False
+
+
+def make_kick(synth, freq=50, bend_octaves=2, sweep=0.04, decay=0.2):
+    bend_lfo = synthio.LFO(rate=once_rate(wave_rampdown, sweep), scale=bend_octaves,
+                           waveform=wave_rampdown, once=True)
+    env = synthio.Envelope(attack_time=0.001, decay_time=decay, sustain_level=0,
+                           release_time=0.05, attack_level=1)
+    note = synthio.Note(freq, waveform=wave_sine, envelope=env, bend=bend_lfo)
+    return DrumVoice(synth, (note,), (bend_lfo,), duration=decay)
+
+def make_snare(synth, freq=180, noise_freq=2000, sweep=0.03, decay=0.15):
+    bend_lfo = synthio.LFO(rate=once_rate(wave_rampdown, sweep), scale=0.5,
+                           waveform=wave_rampdown, once=True)
+    tone_env = synthio.Envelope(attack_time=0.001, decay_time=decay/2, sustain_level=0,
+                                release_time=0.02, attack_level=0.7)
+    noise_env = synthio.Envelope(attack_time=0.001, decay_time=decay, sustain_level=0,
+                                 release_time=0.05, attack_level=0.8)
+    bpf = synth.band_pass_filter(noise_freq, 1.0)
+    tone = synthio.Note(freq, waveform=wave_sine, envelope=tone_env, bend=bend_lfo)
+    noise = synthio.Note(freq*8, waveform=wave_noise, envelope=noise_env, filter=bpf)
+    return DrumVoice(synth, (tone, noise), (bend_lfo,), duration=decay)
+
+def make_hat(synth, cutoff=7000, decay=0.05):
+    hpf = synth.high_pass_filter(cutoff, 1.5)
+    env = synthio.Envelope(attack_time=0.001, decay_time=decay, sustain_level=0,
+                           release_time=0.02, attack_level=0.6)
+    note = synthio.Note(3000, waveform=wave_noise, envelope=env, filter=hpf)
+    return DrumVoice(synth, (note,), duration=decay)
+
+def make_clap(synth, center_freq=1200, burst=0.012, decay=0.12):
+    # amplitude goes burst, burst, burst, then decays, each step is 'burst' secs long
+    clap_wave = np.array((32767, 0, 32767, 0, 32767, 16000, 8000, 4000, 2000, 0), dtype=np.int16)
+    amp_lfo = synthio.LFO(rate=once_rate(clap_wave, burst), waveform=clap_wave, once=True)
+    bpf = synth.band_pass_filter(center_freq, 2.0)
+    env = synthio.Envelope(attack_time=0.001, decay_time=decay, sustain_level=0,
+                           release_time=0.05, attack_level=1)
+    note = synthio.Note(2500, waveform=wave_noise, envelope=env, filter=bpf, amplitude=amp_lfo)
+    return DrumVoice(synth, (note,), (amp_lfo,), duration=decay)
+
+
+class DrumKit:
+    """ A kick, snare, hat, and clap, all made ahead of time """
+    def __init__(self, synth):
+        self.kick = make_kick(synth)
+        self.snare = make_snare(synth)
+        self.hat = make_hat(synth)
+        self.clap = make_clap(synth)
+        self.voices = (self.kick, self.snare, self.hat, self.clap)  # indexed by KICK, SNARE, etc
+
+    def hit(self, drum):
+        self.voices[drum].hit()
+
+    def update(self):
+        now = time.monotonic()
+        for v in self.voices:
+            v.update(now)
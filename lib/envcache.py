@@ -0,0 +1,63 @@
+# envcache.py -- reuse synthio.Envelopes instead of making a new one every note-on
+# part of https://github.com/todbot/circuitpython-synthio-tricks
+#
+# A velocity-sensitive synth needs a different Envelope per velocity, but there
+# are only 128 velocities and the other envelope settings rarely change.
+# EnvelopeCache files Envelopes under (attack, decay, release, level) rounded to
+# 7-bit steps, so playing the same velocity again is just a lookup.  Each Envelope
+# is made with the exact times it was first asked for, so a synth whose times
+# don't change gets exactly the times it set.  Times are part of the key, so
+# changing one (a release time knob) doesn't need the cache cleared.
+#
+# Use it like:
+#   env_cache = EnvelopeCache(max_size=32, sustain_ratio=0.8)
+#   amp_env = env_cache.get(0.1, 0.05, release_time, vel/127)   # in note_on()
+#   env_cache.clear()   # only if sustain_ratio changes, it's not part of the key
+#
+
+import synthio
+
+class EnvelopeCache:
+    """ A bounded cache of synthio.Envelopes, oldest one is evicted when full """
+    def __init__(self, max_size=32, sustain_ratio=0.8, max_time=2.0):
+        self.max_size = max_size
+        self.sustain_ratio = sustain_ratio  # sustain_level = level * sustain_ratio
+        self.max_time = max_time  # longest attack/decay/release time we can hold
+        self.envs = {}  # key = packed quantized settings, value = synthio.Envelope
+        self.keys = [None] * max_size  # ring of keys in the order they were added
+        self.pos = 0  # next spot in ring to fill/evict
+        self.hits = 0
+        self.misses = 0
+
+    def _q(self, t):
+        # quantize a time to 0-127
+        return min(max(int(t * 127 / self.max_time + 0.5), 0), 127)
+
+    def get(self, attack_time, decay_time, release_time, level):
+        """Return an Envelope for these settings, making one only if needed"""
+        aq, dq, rq = self._q(attack_time), self._q(decay_time), self._q(release_time)
+        lq = min(max(int(level * 127 + 0.5), 0), 127)
+        key = (aq << 21) | (dq << 14) | (rq << 7) | lq  # small int, no allocation
+        env = self.envs.get(key)
+        if env is not None:
+            self.hits += 1
+            return env
+        self.misses += 1
+        old_key = self.keys[self.pos]
+        if old_key is not None:
+            self.envs.pop(old_key, None)
+        level = lq / 127
+        env = synthio.Envelope(attack_time=attack_time, decay_time=decay_time,
+                               release_time=release_time,
+                               attack_level=level, sustain_level=level * self.sustain_ratio)
+        self.envs[key] = env
+        self.keys[self.pos] = key
+        self.pos = (self.pos + 1) % self.max_size
+        return env
+
+    def clear(self):
+        """Drop all cached Envelopes, e.g. when sustain_ratio changes"""
+        self.envs.clear()
+        for i in range(self.max_size):
+            self.keys[i] = None
+        self.pos = 0
@@ -0,0 +1,97 @@
+# gcwatch.py -- find out which parts of your main loop allocate memory
+# part of https://github.com/todbot/circuitpython-synthio-tricks
+#
+# Audio glitches are often caused by garbage collection pauses, and those
+# are caused by code in the main loop that makes new objects every pass:
+# new Notes, Envelopes, filters, ulab temporaries, floats, strings...
+# GCWatch samples gc.mem_alloc() at marks you put in your loop, and adds up
+# how many bytes each named section allocates and how many collections happen in it.
+#
+# Use it like:
+#   watch = GCWatch(("midi", "filter", "led"))
+#   while True:
+#       watch.loop()           # top of the loop
+#       msg = midi.receive()
+#       watch.mark("filter")   # bytes since last mark are charged to "midi"
+#       ...
+#       watch.mark("led")
+#       ...
+#       watch.report_every(5)  # print a report every 5 seconds
+#
+# For tests, GCWatch(..., strict=True) raises AssertionError the moment any
+# section allocates, and watch.assert_no_alloc("filter") checks the totals.
+#
+# Note: watching isn't free, each mark is a function call and a gc.mem_alloc()
+#
+
+import gc, time
+
+class GCWatch:
+    """ Adds up memory allocated & garbage collections per named section of a loop """
+    def __init__(self, sections, enabled=True, strict=False):
+        self.names = tuple(sections)
+        self.index = {name: i for (i, name) in enumerate(self.names)}
+        self.enabled = enabled
+        self.strict = strict  # raise AssertionError as soon as a section allocates
+        self.reset()
+
+    def reset(self):
+        n = len(self.names)
+        self.alloc_bytes = [0] * n   # bytes allocated per section
+        self.collections = [0] * n   # gc runs that happened during each section
+        self.loops = 0
+        self.section = 0
+        self.last_report = time.monotonic()
+        self.min_free = gc.mem_free() if self.enabled else 0
+        self.last_alloc = gc.mem_alloc() if self.enabled else 0
+
+    def _charge(self):
+        # give the memory allocated since the last mark to the current section
+        alloc = gc.mem_alloc()
+        delta = alloc - self.last_alloc
+        if delta < 0:  # gc ran and freed memory, so we can't know the bytes this time
+            self.collections[self.section] += 1
+        else:
+            self.alloc_bytes[self.section] += delta
+            if self.strict and delta > 0:
+                raise AssertionError("section '%s' allocated %d bytes" % (self.names[self.section], delta))
+        self.last_alloc = gc.mem_alloc()  # don't count our own call
+
+    def loop(self):
+        """Call at the top of every pass of the main loop"""
+        if not self.enabled:
+            return
+        self._charge()
+        self.loops += 1
+        self.section = 0
+        free = gc.mem_free()
+        if free < self.min_free:
+            self.min_free = free
+        self.last_alloc = gc.mem_alloc()
+
+    def mark(self, name):
+        """Start the named section, charging what came before to the previous one"""
+        if not self.enabled:
+            return
+        self._charge()
+        self.section = self.index[name]
+
+    def report(self):
+        loops = max(self.loops, 1)
+        print("gcwatch: %d loops, min free %d bytes" % (self.loops, self.min_free))
+        for i, name in enumerate(self.names):
+            print("  %-12s %7.1f bytes/loop  %3d collections" %
+                  (name, self.alloc_bytes[i] / loops, self.collections[i]))
+
+    def report_every(self, secs):
+        """Print a report and start counting again every secs seconds"""
+        if self.enabled and time.monotonic() - self.last_report > secs:
+            self.report()
+            self.reset()
+
+    def assert_no_alloc(self, *names):
+        """Raise AssertionError if any of the named sections (default all) allocated"""
+        names = names or self.names
+        bad = [(n, self.alloc_bytes[self.index[n]]) for n in names if self.alloc_bytes[self.index[n]]]
+        if bad:
+            raise AssertionError("sections allocated memory: %r" % bad)
@@ -0,0 +1,123 @@
+# granular.py -- sample playback & granular synthesis with synthio
+# part of https://github.com/todbot/circuitpython-synthio-tricks
+#
+# A WAV file is loaded into memory once, as a memoryview of 16-bit samples.
+# Every grain is a synthio.Note whose waveform is a memoryview slice of that
+# sample, so making a grain never copies sample data, no matter how many play.
+# The Notes & their Envelopes come from a fixed pool, so more grains per second
+# only costs more synth voices, not more memory.
+#
+# A Note plays its waveform as one cycle, so to play a slice of 'length' samples
+# at its original pitch, the Note frequency is sample_rate / length.
+# synthio won't take a waveform longer than 16384 samples, so that's the longest
+# slice played at once, however long the sample is.
+#
+# Use it like:
+#   sample, sample_rate = load_sample("wav/BRAIDS02.WAV")
+#   cloud = GrainCloud(synth, sample, sample_rate, num_voices=8)
+#   cloud.density = 20      # grains per second
+#   cloud.position = 0.3    # where in sample grains come from, 0-1
+#   while True:
+#       cloud.update()
+#
+
+import time
+import synthio
+import adafruit_wave
+from noise import XorShift16
+
+MAX_LENGTH = 16384  # longest waveform a synthio.Note can have
+
+def load_sample(filename):
+    """Read a whole 16-bit mono WAV file, return (memoryview of samples, sample rate)"""
+    with adafruit_wave.open(filename) as w:
+        if w.getsampwidth() != 2 or w.getnchannels() != 1:
+            raise ValueError("unsupported format")
+        return memoryview(w.readframes(w.getnframes())).cast('h'), w.getframerate()
+
+class SamplePlayer:
+    """ Play regions of a sample as one-shots, on a single preallocated Note """
+    def __init__(self, synth, sample, sample_rate, envelope=None):
+        self.synth = synth
+        self.sample = sample
+        self.sample_rate = sample_rate
+        self.envelope = envelope or synthio.Envelope(attack_time=0.005, release_time=0.02)
+        self.note = synthio.Note(frequency=1, waveform=sample[:MAX_LENGTH], envelope=self.envelope)
+        self.stop_time = 0
+        self.playing = False
+
+    def play(self, start=0, length=0, pitch=1.0):
+        """Play length samples from start (0 length means to the end), pitch 2 = up an octave.
+        At most MAX_LENGTH samples are played"""
+        start = min(max(start, 0), len(self.sample) - 2)
+        length = min(length or len(self.sample) - start, len(self.sample) - start, MAX_LENGTH)
+        self.note.waveform = self.sample[start:start+length]  # zero-copy slice
+        self.note.frequency = pitch * self.sample_rate / length
+        self.synth.release_then_press(self.note, self.note)
+        self.stop_time = time.monotonic() + length / (self.sample_rate * pitch)
+        self.playing = True
+
+    def update(self):
+        if self.playing and time.monotonic() >= self.stop_time:
+            self.synth.release(self.note)
+            self.playing = False
+
+class GrainCloud:
+    """ Sprays short grains from a sample, using a fixed pool of Notes """
+    def __init__(self, synth, sample, sample_rate, num_voices=8, seed=1):
+        self.synth = synth
+        self.sample = sample
+        self.sample_rate = sample_rate
+        self.num_samples = len(sample)
+        self.rng = XorShift16(seed)
+        self.density = 10       # grains per second
+        self.position = 0.5     # where grains start, 0-1 through the sample
+        self.spray = 0.05       # random spread of start position, 0-1
+        self.pitch = 1.0        # playback speed, 2 = up an octave
+        self.pitch_spray = 0.0  # random spread of pitch
+        self.grain_time = 0.08  # length of each grain in seconds
+        self.notes = [synthio.Note(frequency=1, waveform=sample[:MAX_LENGTH]) for i in range(num_voices)]
+        self.stop_times = [0] * num_voices
+        self.playing = [False] * num_voices
+        self.voice_pos = 0
+        self.envelope = None
+        self.envelope_time = 0
+        self.next_grain_time = time.monotonic()
+
+    def _grain_envelope(self):
+        # all grains share one smooth rise & fall envelope, only rebuilt if grain_time changes
+        if self.envelope_time != self.grain_time:
+            half = self.grain_time / 2
+            self.envelope = synthio.Envelope(attack_time=half, decay_time=0, sustain_level=1,
+                                             release_time=half)
+            self.envelope_time = self.grain_time
+        return self.envelope
+
+    def spawn(self):
+        """Start one grain on the next voice in the pool, stealing it if needed"""
+        i = self.voice_pos
+        self.voice_pos = (i + 1) % len(self.notes)
+        note = self.notes[i]
+        pitch = self.pitch * (1 + self.rng.uniform(-self.pitch_spray, self.pitch_spray))
+        length = int(self.grain_time * self.sample_rate * pitch)
+        length = min(max(length, 2), self.num_samples, MAX_LENGTH)
+        pos = self.position + self.rng.uniform(-self.spray, self.spray)
+        start = int(min(max(pos, 0), 1) * (self.num_samples - length))
+        note.waveform = self.sample[start:start+length]  # zero-copy slice
+        note.frequency = pitch * self.sample_rate / length
+        note.envelope = self._grain_envelope()
+        self.synth.release_then_press(note, note)
+        self.stop_times[i] = time.monotonic() + self.grain_time / 2  # release starts halfway
+        self.playing[i] = True
+
+    def update(self):
+        now = time.monotonic()
+        for i in range(len(self.notes)):
+            if self.playing[i] and now >= self.stop_times[i]:
+                self.synth.release(self.notes[i])
+                self.playing[i] = False
+        if self.density > 0 and now >= self.next_grain_time:
+            self.next_grain_time += 1 / self.density
+            if self.next_grain_time < now:  # fell behind, don't try to catch up
+                self.next_grain_time = now + 1 / self.density
+            self.spawn()
@@ -0,0 +1,251 @@
+# inputtrace.py -- record MIDI, key & knob input with timestamps, and play it back exactly
+# part of https://github.com/todbot/circuitpython-synthio-tricks
+#
+# A glitch that only happens during a CC sweep over a chord, or a knob turn
+# during an arp, is hard to make happen again by hand.  InputRecorder logs
+# every input with a microsecond timestamp into a fixed-size ring buffer
+# (8 bytes per event, oldest events are overwritten), and saves it to a file.
+# InputReplayer reads the file and hands the same inputs back at the same
+# times, through stand-ins for midi.receive(), keys.events.get(), and knob.value,
+# so the rest of the code runs exactly as it did.  It works the same on the host
+# emulator (tools/hostsynth.py), so a trace from the device can be profiled there.
+#
+# File layout: magic "SYNI", version (1 byte), record count (2 bytes),
+#   then records of: microseconds since the first record (4 bytes), kind (1 byte), 3 data bytes
+#   MIDI: status, data1, data2    KEY: key number, pressed, 0    KNOB: knob number, value (2 bytes)
+#   RAW: up to 3 bytes read from a MIDI port, how many is in the kind's top 4 bits
+#
+# Use it like:
+#   rec = InputRecorder(size=1024)
+#   while True:
+#       msg = rec.midi( midi.receive() )          # records & passes through
+#       key = rec.key( keys.events.get() )
+#       val = rec.knob( 0, knobA.value )
+#       ...
+#       rec.save("/trace.bin")   # when you've caught the problem
+#
+#   play = InputReplayer("/trace.bin")
+#   while True:
+#       msg = play.midi()         # instead of midi.receive()
+#       key = play.key()          # instead of keys.events.get()
+#       val = play.knob(0)        # instead of knobA.value
+#
+# Code that reads raw MIDI bytes from a port (clock, Start, running status...)
+# records & replays the bytes themselves, with stand-ins for the port:
+#   port = rec.port(usb_midi.ports[0])   # records what's read through it
+#   port = play.port()                   # hands back the recorded bytes
+#   n = port.readinto(buf)
+#
+# Times are 32-bit microseconds, which wrap around every 71 minutes.  They're
+# compared wrap-safe, so recording and replay keep working for as long as you
+# like, as long as no two inputs are more than 35 minutes apart.
+#
+# Note: to save to flash, CIRCUITPY must be writable by CircuitPython, which needs
+# a boot.py with `storage.remount("/", readonly=False)`.
+#
+
+import time, struct
+try:
+    from adafruit_midi.note_on import NoteOn
+    from adafruit_midi.note_off import NoteOff
+    from adafruit_midi.control_change import ControlChange
+    from adafruit_midi.program_change import ProgramChange
+    from adafruit_midi.pitch_bend import PitchBend
+except ImportError:  # no adafruit_midi, so just keys & knobs
+    pass
+
+TRACE_MAGIC = b"SYNI"
+TRACE_HEADER_FMT = "<4sBH"
+TRACE_HEADER_SIZE = struct.calcsize(TRACE_HEADER_FMT)
+RECORD_FMT = "<IBBBB"
+RECORD_SIZE = struct.calcsize(RECORD_FMT)  # 8
+
+MIDI, KEY, KNOB, RAW = 1, 2, 3, 4  # record kinds, in the bottom 4 bits of the kind byte
+_MASK = 0xffffffff  # record times wrap around at 32 bits
+
+def _due(now, t):
+    # True if t is now or before, even if the times wrapped around in between
+    return (now - t) & _MASK < 0x80000000
+
+def _now_us():
+    return time.monotonic_ns() // 1000
+
+class _Event:
+    # stands in for keypad.Event
+    def __init__(self, key_number, pressed):
+        self.key_number = key_number
+        self.pressed = pressed
+        self.released = not pressed
+
+class InputRecorder:
+    """ Logs timestamped inputs into a ring buffer of fixed-size records """
+    def __init__(self, size=1024, knob_threshold=64):
+        self.size = size  # most records kept, older ones are overwritten
+        self.knob_threshold = knob_threshold  # smaller knob changes aren't recorded
+        self.last_knobs = {}  # knob number: last recorded value
+        self.buf = bytearray(size * RECORD_SIZE)
+        self.pos = 0  # next record to write
+        self.count = 0
+        self.start_us = _now_us()
+
+    def _add(self, kind, a, b, c):
+        struct.pack_into(RECORD_FMT, self.buf, self.pos * RECORD_SIZE,
+                         (_now_us() - self.start_us) & _MASK, kind, a, b, c)
+        self.pos = (self.pos + 1) % self.size
+        self.count = min(self.count + 1, self.size)
+
+    def midi(self, msg):
+        """Record an adafruit_midi message (None is fine), and return it"""
+        if msg is None:
+            return None
+        ch = msg.channel or 0
+        if isinstance(msg, NoteOn):
+            self._add(MIDI, 0x90 | ch, msg.note, msg.velocity)
+        elif isinstance(msg, NoteOff):
+            self._add(MIDI, 0x80 | ch, msg.note, msg.velocity)
+        elif isinstance(msg, ControlChange):
+            self._add(MIDI, 0xB0 | ch, msg.control, msg.value)
+        elif isinstance(msg, ProgramChange):
+            self._add(MIDI, 0xC0 | ch, msg.patch, 0)
+        elif isinstance(msg, PitchBend):
+            self._add(MIDI, 0xE0 | ch, msg.pitch_bend & 0x7f, msg.pitch_bend >> 7)
+        return msg
+
+    def key(self, event):
+        """Record a keypad.Event (None is fine), and return it"""
+        if event is not None:
+            self._add(KEY, event.key_number, event.pressed, 0)
+        return event
+
+    def knob(self, knob_num, value):
+        """Record a knob reading 0-65535 if it changed by more than a little, and return
+        the value as recorded, so recording and replaying see the same knob values"""
+        if abs(value - self.last_knobs.get(knob_num, -65536)) >= self.knob_threshold:
+            self.last_knobs[knob_num] = value
+            self._add(KNOB, knob_num, value >> 8, value & 0xff)
+        return self.last_knobs[knob_num]
+
+    def midi_bytes(self, buf, n):
+        """Record the first n bytes of buf, raw MIDI read from a port, and return n"""
+        for i in range(0, n, 3):
+            k = min(n - i, 3)
+            self._add(RAW | (k << 4), buf[i], buf[i+1] if k > 1 else 0, buf[i+2] if k > 2 else 0)
+        return n
+
+    def port(self, port):
+        """A stand-in for a MIDI port that records every byte read through it"""
+        return _RecordingPort(port, self)
+
+    def save(self, filename):
+        """Write the records, oldest first, with times from the first one kept,
+        so a trace whose start was overwritten doesn't replay a silent lead-in"""
+        first = (self.pos - self.count) % self.size
+        t0 = struct.unpack_from(RECORD_FMT, self.buf, first * RECORD_SIZE)[0]
+        rec = bytearray(RECORD_SIZE)
+        with open(filename, "wb") as f:
+            f.write(struct.pack(TRACE_HEADER_FMT, TRACE_MAGIC, 1, self.count))
+            for i in range(self.count):
+                offset = ((first + i) % self.size) * RECORD_SIZE
+                t = struct.unpack_from("<I", self.buf, offset)[0]
+                rec[:] = self.buf[offset:offset + RECORD_SIZE]
+                struct.pack_into("<I", rec, 0, (t - t0) & _MASK)
+                f.write(rec)
+
+class _RecordingPort:
+    def __init__(self, port, recorder):
+        self.port = port
+        self.recorder = recorder
+
+    def readinto(self, buf):
+        n = self.port.readinto(buf)
+        if n:
+            self.recorder.midi_bytes(buf, n)
+        return n
+
+class _ReplayPort:
+    def __init__(self, replayer):
+        self.replayer = replayer
+
+    def readinto(self, buf):
+        return self.replayer.midi_bytes(buf) or None  # like a port with nothing waiting
+
+class InputReplayer:
+    """ Hands back recorded inputs at the times they were recorded """
+    def __init__(self, filename):
+        with open(filename, "rb") as f:
+            magic, version, count = struct.unpack(TRACE_HEADER_FMT, f.read(TRACE_HEADER_SIZE))
+            if magic != TRACE_MAGIC:
+                raise ValueError("not an input trace file")
+            self.buf = f.read(count * RECORD_SIZE)
+        self.count = len(self.buf) // RECORD_SIZE
+        self.end_us = 0  # time of the last record
+        if self.count:
+            self.end_us = struct.unpack_from(RECORD_FMT, self.buf, (self.count-1) * RECORD_SIZE)[0]
+        self.knobs = {}  # knob number: last value
+        self.midi_pos = self.key_pos = self.knob_pos = self.raw_pos = 0  # next record for each kind
+        self.start_us = _now_us()
+
+    def _next(self, kind, pos):
+        # find the next record of this kind from pos that's due, return (pos, record) or (pos, None)
+        now = (_now_us() - self.start_us) & _MASK
+        while pos < self.count:
+            rec = struct.unpack_from(RECORD_FMT, self.buf, pos * RECORD_SIZE)
+            if not _due(now, rec[0]):
+                return pos, None
+            pos += 1
+            if rec[1] & 0x0F == kind:
+                return pos, rec
+        return pos, None
+
+    @property
+    def done(self):
+        """True once the time of the last record has passed"""
+        now = (_now_us() - self.start_us) & _MASK
+        return now != self.end_us and _due(now, self.end_us)
+
+    def midi(self):
+        """Like midi.receive(), the next due MIDI message or None"""
+        self.midi_pos, rec = self._next(MIDI, self.midi_pos)
+        if rec is None:
+            return None
+        status, ch, a, b = rec[2] & 0xF0, rec[2] & 0x0F, rec[3], rec[4]
+        if status == 0x90:
+            return NoteOn(a, b, channel=ch)
+        if status == 0x80:
+            return NoteOff(a, b, channel=ch)
+        if status == 0xB0:
+            return ControlChange(a, b, channel=ch)
+        if status == 0xC0:
+            return ProgramChange(a, channel=ch)
+        return PitchBend(a | (b << 7), channel=ch)
+
+    def midi_bytes(self, buf):
+        """Like port.readinto(buf), the raw MIDI bytes that are due, returns how many"""
+        n = 0
+        while n + 3 <= len(buf):
+            self.raw_pos, rec = self._next(RAW, self.raw_pos)
+            if rec is None:
+                break
+            for i in range(rec[1] >> 4):
+                buf[n] = rec[2 + i]
+                n += 1
+        return n
+
+    def port(self):
+        """A stand-in for a MIDI port, for code that calls port.readinto()"""
+        return _ReplayPort(self)
+
+    def key(self):
+        """Like keys.events.get(), the next due key event or None"""
+        self.key_pos, rec = self._next(KEY, self.key_pos)
+        return None if rec is None else _Event(rec[2], bool(rec[3]))
+
+    def knob(self, knob_num, default=32768):
+        """Like knob.value, the latest recorded value for this knob"""
+        while True:
+            pos, rec = self._next(KNOB, self.knob_pos)
+            self.knob_pos = pos
+            if rec is None:
+                break
+            self.knobs[rec[2]] = (rec[3] << 8) | rec[4]
+        return self.knobs.get(knob_num, default)
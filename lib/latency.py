@@ -0,0 +1,117 @@
+# latency.py -- find out where the time goes between a MIDI note-on and hearing it
+# part of https://github.com/todbot/circuitpython-synthio-tricks
+#
+# A note-on spends time in several places before it's heard: waiting in the
+# MIDI port until the main loop gets around to receive(), in your Python
+# handler, in synth.press(), and then in the audio buffers.  The mixer has two
+# buffers of buffer_size bytes: a new note is mixed into the next buffer to be
+# filled, which plays once the one playing now is done, so 1 to 2 buffer times.
+#
+# NoteLatency times each stage of the note path you mark, keeps the last
+# `history` notes, and reports min/median/90th percentile/max for each stage,
+# plus a total with the buffer delay worked out from the mixer settings.
+# "poll" is the main loop time before the message was received, the longest
+# the message could have been waiting for receive().
+#
+# Use it like:
+#   latency = NoteLatency(("handler", "press"), sample_rate=28000, buffer_size=2048)
+#   while True:
+#       latency.poll()           # just before midi.receive()
+#       msg = midi.receive()
+#       if isinstance(msg, NoteOn):
+#           latency.start()      # "handler" starts now
+#           ...
+#           latency.mark("press")
+#           synth.press(note)
+#           latency.done()       # the note's at the synth, keep its timings
+#       latency.report_every(5)
+#
+# tools/latency_render.py measures the same thing from the outside, on the host,
+# by finding where each note starts in the rendered audio.
+#
+
+import time
+
+class NoteLatency:
+    """ Times the stages of a note-on's path to the synth, and adds the audio buffer delay """
+    def __init__(self, stages=("handler", "press"), sample_rate=28000, buffer_size=2048,
+                 channel_count=1, bits_per_sample=16, history=32, enabled=True):
+        self.names = ("poll",) + tuple(stages)
+        self.index = {name: i for (i, name) in enumerate(self.names)}
+        self.enabled = enabled
+        self.history = history
+        frames = buffer_size // (channel_count * bits_per_sample // 8)  # buffer_size is in bytes
+        self.buffer_ns = int(frames * 1_000_000_000 // sample_rate)  # one buffer's play time
+        self.timings = [[0] * history for name in self.names]  # ns per stage, for the last notes
+        self.reset()
+
+    def reset(self):
+        self.count = 0  # notes measured
+        self.pos = 0    # where the next note's timings go
+        self.section = -1  # stage being timed, -1 when not timing a note
+        self.last_poll_ns = self.last_ns = time.monotonic_ns() if self.enabled else 0
+        self.poll_ns = 0
+        self.last_report = time.monotonic()
+
+    def poll(self):
+        """Call just before checking for MIDI"""
+        if not self.enabled:
+            return
+        now = time.monotonic_ns()
+        self.poll_ns = now - self.last_poll_ns
+        self.last_poll_ns = now
+
+    def start(self):
+        """A note-on was just received, start timing its first stage"""
+        if not self.enabled:
+            return
+        self.last_ns = time.monotonic_ns()
+        self.timings[0][self.pos] = self.poll_ns
+        for t in self.timings[1:]:
+            t[self.pos] = 0
+        self.section = 1
+
+    def mark(self, name):
+        """Start the named stage, charging the time before it to the previous one"""
+        if not self.enabled or self.section < 0:
+            return
+        now = time.monotonic_ns()
+        self.timings[self.section][self.pos] += now - self.last_ns
+        self.last_ns = now
+        self.section = self.index[name]
+
+    def done(self):
+        """The note has been handed to the synth, keep its timings"""
+        if not self.enabled or self.section < 0:
+            return
+        now = time.monotonic_ns()
+        self.timings[self.section][self.pos] += now - self.last_ns
+        self.section = -1
+        self.pos = (self.pos + 1) % self.history
+        self.count += 1
+
+    def _stats(self, values):
+        # min, median, 90th percentile, and max, in ms
+        v = sorted(values)
+        n = len(v)
+        return v[0] / 1e6, v[n // 2] / 1e6, v[min(n * 9 // 10, n - 1)] / 1e6, v[-1] / 1e6
+
+    def report(self):
+        n = min(self.count, self.history)
+        if n == 0:
+            print("latency: no notes yet")
+            return
+        print("latency: %-10s %7s %7s %7s %7s   (ms, last %d notes)" % ("stage", "min", "median", "p90", "max", n))
+        for i, name in enumerate(self.names):
+            print("latency: %-10s %7.2f %7.2f %7.2f %7.2f" % ((name,) + self._stats(self.timings[i][:n])))
+        print("latency: %-10s %7.2f %7s %7s %7.2f   (1 to 2 mixer buffers)" %
+              ("buffer", self.buffer_ns / 1e6, "", "", 2 * self.buffer_ns / 1e6))
+        totals = [sum(t[j] for t in self.timings) + self.buffer_ns * 3 // 2 for j in range(n)]
+        print("latency: %-10s %7.2f %7.2f %7.2f %7.2f   (with 1.5 buffers)" % (("total",) + self._stats(totals)))
+
+    def report_every(self, secs):
+        """Print a report every secs seconds, if any notes were measured"""
+        if self.enabled and time.monotonic() - self.last_report > secs:
+            self.last_report = time.monotonic()
+            if self.count:
+                self.report()
@@ -0,0 +1,82 @@
+# ledpresenter.py -- update NeoPixels at a capped frame rate, away from the audio code
+# part of https://github.com/todbot/circuitpython-synthio-tricks
+#
+# Every led.fill() on a NeoPixel with auto_write pushes the data out to the LEDs
+# right then, and the main loop waits for it.  Called from a note handler or an
+# LFO callback, that can be hundreds of writes a second, most of them the same
+# color again, all taking time the synth control code could have used.
+#
+# LEDPresenter keeps the color you want and a dirty flag. fill() only stores the
+# color, so it's cheap to call from anywhere. update() from the main loop writes
+# to the LEDs at most `fps` times a second, and only if the color changed since
+# the last write. It also times the writes, so you can see what LEDs cost the loop.
+#
+# Use it like:
+#   leds = LEDPresenter(neopixel.NeoPixel(board.NEOPIXEL, 1, brightness=0.1), fps=30)
+#   def note_on(n):
+#       leds.fill( rainbowio.colorwheel(n * 20) )   # just stores the color
+#   while True:
+#       leds.update()            # writes to the LEDs if it's time and the color changed
+#       leds.report_every(5)     # print writes & loop time spent on LEDs
+#
+
+import time
+
+class LEDPresenter:
+    """ Writes a target color to NeoPixels at most fps times a second, only when it changed """
+    def __init__(self, pixels, fps=30, report=False):
+        self.pixels = pixels
+        pixels.auto_write = False  # we decide when to show()
+        self.period_ns = int(1_000_000_000 / fps)
+        self.next_ns = time.monotonic_ns()
+        self.color = 0      # color we want to show
+        self.shown = None   # color last written to the LEDs
+        self.dirty = True
+        self.report_enabled = report
+        self.reset()
+
+    def reset(self):
+        """Start counting writes & time again"""
+        self.requests = 0  # how many times fill() was called
+        self.writes = 0    # how many times the LEDs were actually written
+        self.write_ns = 0  # total time spent writing
+        self.max_write_ns = 0
+        self.start_ns = time.monotonic_ns()
+
+    def fill(self, color):
+        """Set the color to show on all the LEDs, written by a later update()"""
+        self.requests += 1
+        self.color = color
+        self.dirty = color != self.shown
+
+    def update(self):
+        """Call from the main loop, writes to the LEDs if it's time and the color changed"""
+        if not self.dirty:
+            return
+        now = time.monotonic_ns()
+        if now < self.next_ns:
+            return
+        self.next_ns += self.period_ns
+        if self.next_ns < now:  # fell behind, don't try to catch up
+            self.next_ns = now + self.period_ns
+        self.pixels.fill(self.color)
+        self.pixels.show()
+        took = time.monotonic_ns() - now
+        self.shown = self.color
+        self.dirty = False
+        self.writes += 1
+        self.write_ns += took
+        if took > self.max_write_ns:
+            self.max_write_ns = took
+
+    def report(self):
+        secs = max(time.monotonic_ns() - self.start_ns, 1) / 1e9
+        print("leds: %d fills, %d writes (%.1f/sec), %.2f ms max write, %.2f%% of loop time" %
+              (self.requests, self.writes, self.writes / secs, self.max_write_ns / 1e6,
+               self.write_ns / 1e7 / secs))
+
+    def report_every(self, secs):
+        """Print a report and start counting again every secs seconds, if report=True"""
+        if self.report_enabled and time.monotonic_ns() - self.start_ns > secs * 1_000_000_000:
+            self.report()
+            self.reset()
@@ -0,0 +1,70 @@
+# lfotap.py -- call your own code with LFO values, only as often as needed
+# part of https://github.com/todbot/circuitpython-synthio-tricks
+#
+# synthio.LFOs can't drive everything: Note.filter, LEDs, wavetable positions
+# all need Python to copy lfo.value over by hand.  Doing that every pass of a
+# tight main loop does the same work thousands of times a second, mostly for
+# values that haven't changed enough to matter.
+#
+# LFOTap checks its LFOs at a fixed control rate (say 100 times a second) and
+# calls your callback(value, delta) only when an LFO has moved at least its
+# threshold since the last callback.  LFOs are added to synth.blocks for you
+# so they tick even when they're not attached to a Note.
+#
+# Use it like:
+#   tap = LFOTap(synth, rate=100)
+#   def set_filter(value, delta):
+#       note.filter = synth.low_pass_filter(value, 1.5)
+#   tap.subscribe(lfo_filtermod, set_filter, threshold=5)  # only when it moves 5 Hz or more
+#   while True:
+#       tap.update()
+#
+
+import time
+
+class LFOTap:
+    """ Calls Python callbacks with LFO values at a control rate, skipping small changes """
+    def __init__(self, synth, rate=100):
+        self.synth = synth
+        self.period_ns = int(1_000_000_000 / rate)  # how often to check LFOs
+        self.next_ns = time.monotonic_ns()
+        self.lfos = []        # each subscription's LFO
+        self.callbacks = []   # each subscription's callback(value, delta)
+        self.thresholds = []  # smallest change that triggers the callback
+        self.last_values = []  # value last passed to each callback
+        self.calls = 0    # how many callbacks were made
+        self.skips = 0    # how many were skipped because change was under threshold
+
+    def subscribe(self, lfo, callback, threshold=0):
+        """Call callback(value, delta) when lfo moves at least threshold.
+        Called once right away with the current value and a delta of 0."""
+        if getattr(lfo, "native", True) and lfo not in self.synth.blocks:
+            self.synth.blocks.append(lfo)  # make sure it ticks (modmath.PyMath can't)
+        self.lfos.append(lfo)
+        self.callbacks.append(callback)
+        self.thresholds.append(threshold)
+        self.last_values.append(lfo.value)
+        callback(lfo.value, 0)
+
+    def unsubscribe(self, callback):
+        i = self.callbacks.index(callback)
+        for l in (self.lfos, self.callbacks, self.thresholds, self.last_values):
+            l.pop(i)
+
+    def update(self):
+        """Call from the main loop, checks LFOs if it's time"""
+        now = time.monotonic_ns()
+        if now < self.next_ns:
+            return
+        self.next_ns += self.period_ns
+        if self.next_ns < now:  # fell behind, don't try to catch up
+            self.next_ns = now + self.period_ns
+        for i in range(len(self.lfos)):
+            value = self.lfos[i].value
+            delta = value - self.last_values[i]
+            if abs(delta) >= self.thresholds[i] and delta != 0:
+                self.last_values[i] = value
+                self.callbacks[i](value, delta)
+                self.calls += 1
+            else:
+                self.skips += 1
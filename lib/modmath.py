@@ -0,0 +1,269 @@
+# modmath.py -- turn modulation math into synthio.Math blocks that run in the synth
+# part of https://github.com/todbot/circuitpython-synthio-tricks
+#
+# Code like `lpf_basef + lfo.value` or `lfo.value * depth` in a main loop is
+# Python doing arithmetic hundreds of times a second.  synthio.Math can do that
+# arithmetic natively, once per synth block, and can be put anywhere a
+# synthio.BlockInput goes (bend, amplitude, panning, LFO rate/scale/offset...),
+# but each one only does one three-input operation, so chains of them get fiddly.
+#
+# compile_mod() takes a small expression and builds the chain for you:
+#   +  -  *  /  ( )          arithmetic on LFOs, Math blocks, and numbers
+#   clamp(x, lo, hi)         keep x between lo and hi
+#   xfade(a, b, t)           crossfade from a (t=0) to b (t=1), t clamped to 0-1
+#   lerp(a, b, t)            same but t isn't clamped
+#   min(a, b), max(a, b), abs(x)
+# Numbers are folded together, and "x * k + c" becomes a single SCALE_OFFSET.
+#
+# If synthio.Math isn't there (CircuitPython 8), or native=False, you get PyMath
+# objects instead: same .value, computed in Python when read. They can't be put
+# on a Note or in synth.blocks, so their LFOs have to be ticking some other way.
+# evaluate() computes an expression from plain numbers, to check a compiled one.
+#
+# Use it like:
+#   cutoff = compile_mod("base + lfo * depth", base=500, depth=0.5, lfo=lfo_filtermod)
+#   synth.blocks.append(cutoff)     # cutoff.value is now 500 + lfo_filtermod.value/2
+#   pan = compile_mod("xfade(lfo1, lfo2, mix)", lfo1=lfo1, lfo2=lfo2, mix=0.3)
+#   note.panning = pan
+#
+
+import synthio
+
+NATIVE = hasattr(synthio, "Math")
+
+_OPS = {  # Python versions of the MathOperations we use
+    "SUM": lambda a,b,c: a + b + c,
+    "PRODUCT": lambda a,b,c: a * b * c,
+    "SCALE_OFFSET": lambda a,b,c: a * b + c,
+    "MUL_DIV": lambda a,b,c: a * b / c if c else 0,
+    "LERP": lambda a,b,c: a * (1 - c) + b * c,
+    "CONSTRAINED_LERP": lambda a,b,c: a * (1 - min(max(c, 0), 1)) + b * min(max(c, 0), 1),
+    "MID": lambda a,b,c: sorted((a, b, c))[1],
+    "MIN": lambda a,b,c: min(a, b, c),
+    "MAX": lambda a,b,c: max(a, b, c),
+    "ABS": lambda a,b,c: abs(a),
+}
+
+_CALLS = {  # function name: (operation, number of args, default for missing args)
+    "clamp": ("MID", 3, None),
+    "xfade": ("CONSTRAINED_LERP", 3, None),
+    "lerp": ("LERP", 3, None),
+    "min": ("MIN", 2, "dup"),
+    "max": ("MAX", 2, "dup"),
+    "abs": ("ABS", 1, 0.0),
+}
+
+def _value(x):
+    return x if isinstance(x, (int, float)) else x.value
+
+class PyMath:
+    """ Stands in for synthio.Math, computing its value in Python when read """
+    native = False  # can't go in synth.blocks
+    def __init__(self, operation, a, b=0.0, c=1.0):
+        self.operation = operation  # an _OPS name
+        self.a, self.b, self.c = a, b, c
+
+    @property
+    def value(self):
+        return _OPS[self.operation](_value(self.a), _value(self.b), _value(self.c))
+
+def _tokenize(expr):
+    tokens = []
+    i = 0
+    while i < len(expr):
+        ch = expr[i]
+        if ch in " \t":
+            i += 1
+        elif ch in "+-*/(),":
+            tokens.append(ch)
+            i += 1
+        elif ch.isdigit() or ch == ".":
+            j = i
+            while j < len(expr) and (expr[j].isdigit() or expr[j] in ".eE" or
+                                      expr[j] in "+-" and expr[j-1] in "eE"):  # 1e-3
+                j += 1
+            tokens.append(float(expr[i:j]))
+            i = j
+        elif ch.isalpha() or ch == "_":
+            j = i
+            while j < len(expr) and (expr[j].isalpha() or expr[j].isdigit() or expr[j] == "_"):
+                j += 1
+            tokens.append(expr[i:j])
+            i = j
+        else:
+            raise ValueError("bad character %r in %r" % (ch, expr))
+    return tokens
+
+class _Parser:
+    # recursive descent parser, makes a tree of tuples:
+    #   ("add", [terms]), ("mul", [factors]), ("div", a, b), ("neg", x),
+    #   ("call", name, [args]), ("name", name), or a float
+    def __init__(self, expr):
+        self.expr = expr
+        self.tokens = _tokenize(expr)
+        self.pos = 0
+
+    def _peek(self):
+        return self.tokens[self.pos] if self.pos < len(self.tokens) else None
+
+    def _take(self, want=None):
+        tok = self._peek()
+        if tok is None or (want is not None and tok != want):
+            raise ValueError("expected %r in %r" % (want or "more", self.expr))
+        self.pos += 1
+        return tok
+
+    def parse(self):
+        tree = self._sum()
+        if self._peek() is not None:
+            raise ValueError("unexpected %r in %r" % (self._peek(), self.expr))
+        return tree
+
+    def _sum(self):
+        terms = [self._product()]
+        while self._peek() in ("+", "-"):
+            if self._take() == "+":
+                terms.append(self._product())
+            else:
+                terms.append(("neg", self._product()))
+        return terms[0] if len(terms) == 1 else ("add", terms)
+
+    def _product(self):
+        node = self._unary()
+        factors = [node]
+        while self._peek() in ("*", "/"):
+            if self._take() == "*":
+                factors.append(self._unary())
+            else:
+                a = factors[0] if len(factors) == 1 else ("mul", factors)
+                factors = [("div", a, self._unary())]
+        return factors[0] if len(factors) == 1 else ("mul", factors)
+
+    def _unary(self):
+        if self._peek() == "-":
+            self._take()
+            return ("neg", self._unary())
+        return self._atom()
+
+    def _atom(self):
+        tok = self._take()
+        if isinstance(tok, float):
+            return tok
+        if tok == "(":
+            node = self._sum()
+            self._take(")")
+            return node
+        if not isinstance(tok, str) or not (tok[0].isalpha() or tok[0] == "_"):
+            raise ValueError("unexpected %r in %r" % (tok, self.expr))
+        if self._peek() != "(":
+            return ("name", tok)
+        self._take("(")
+        args = [self._sum()]
+        while self._peek() == ",":
+            self._take()
+            args.append(self._sum())
+        self._take(")")
+        return ("call", tok, args)
+
+class _Compiler:
+    def __init__(self, inputs, native):
+        self.inputs = inputs
+        self.native = native and NATIVE
+        self.blocks = 0  # how many Math blocks were made
+
+    def math(self, operation, a, b=0.0, c=1.0):
+        if all(isinstance(x, float) for x in (a, b, c)):
+            return _OPS[operation](a, b, c)  # fold constants
+        self.blocks += 1
+        if self.native:
+            return synthio.Math(getattr(synthio.MathOperation, operation), a, b, c)
+        return PyMath(operation, a, b, c)
+
+    def build(self, node):
+        """Compile node to a float or a block"""
+        scaled = self.scaled(node)
+        return scaled[0] if scaled[1] == 1 else self.math("SCALE_OFFSET", scaled[0], scaled[1], 0.0)
+
+    def scaled(self, node):
+        # compile node to (block or float, scale), so "x * k" can become one SCALE_OFFSET later
+        if isinstance(node, float):
+            return node, 1.0
+        kind = node[0]
+        if kind == "name":
+            if node[1] not in self.inputs:
+                raise ValueError("no input named %r" % node[1])
+            val = self.inputs[node[1]]
+            return (float(val) if isinstance(val, (int, float)) else val), 1.0
+        if kind == "neg":
+            x, k = self.scaled(node[1])
+            return (-x, k) if isinstance(x, float) else (x, -k)
+        if kind == "mul":
+            k = 1.0
+            blocks = []
+            for f in node[1]:
+                x, fk = self.scaled(f)
+                if isinstance(x, float):
+                    k *= x * fk
+                else:
+                    k *= fk
+                    blocks.append(x)
+            if not blocks:
+                return k, 1.0
+            acc = blocks[0]
+            for i in range(1, len(blocks), 2):  # three inputs per PRODUCT block
+                acc = self.math("PRODUCT", acc, blocks[i], blocks[i+1] if i+1 < len(blocks) else 1.0)
+            return acc, k
+        if kind == "div":
+            a, ka = self.scaled(node[1])
+            b = self.build(node[2])
+            if isinstance(b, float):
+                return (a / b, ka) if isinstance(a, float) else (a, ka / b)
+            return self.math("MUL_DIV", a, ka, b), 1.0
+        if kind == "add":
+            offset = 0.0
+            terms = []
+            for t in node[1]:
+                x = self.scaled(t)
+                if isinstance(x[0], float):
+                    offset += x[0] * x[1]
+                else:
+                    terms.append(x)
+            if not terms:
+                return offset, 1.0
+            if len(terms) == 1:  # x * k + offset is one block
+                x, k = terms[0]
+                return (x, 1.0) if (k == 1 and offset == 0) else (self.math("SCALE_OFFSET", x, k, offset), 1.0)
+            blocks = [x if k == 1 else self.math("SCALE_OFFSET", x, k, 0.0) for (x, k) in terms]
+            acc = blocks[0]
+            for i in range(1, len(blocks), 2):  # three inputs per SUM block
+                last = blocks[i+1] if i+1 < len(blocks) else offset
+                if i+1 >= len(blocks):
+                    offset = 0.0
+                acc = self.math("SUM", acc, blocks[i], last)
+            if offset:
+                acc = self.math("SUM", acc, offset, 0.0)
+            return acc, 1.0
+        if kind == "call":
+            name, args = node[1], node[2]
+            if name not in _CALLS:
+                raise ValueError("unknown function %r" % name)
+            operation, nargs, fill = _CALLS[name]
+            if len(args) != nargs:
+                raise ValueError("%s() takes %d arguments" % (name, nargs))
+            vals = [self.build(a) for a in args]
+            while len(vals) < 3:
+                vals.append(vals[-1] if fill == "dup" else fill)
+            return self.math(operation, *vals), 1.0
+        raise ValueError("can't compile %r" % (node,))
+
+def compile_mod(expr, native=True, **inputs):
+    """Compile expr into synthio.Math blocks (or PyMath if not native), inputs are
+    the LFOs, blocks, and numbers the expression's names refer to.
+    Returns a float if the whole expression is constant."""
+    return _Compiler(inputs, native).build(_Parser(expr).parse())
+
+def evaluate(expr, **values):
+    """Compute expr in plain Python, with each name's current value (numbers or .value)"""
+    numbers = {name: float(_value(v)) for (name, v) in values.items()}
+    result = _Compiler(numbers, False).build(_Parser(expr).parse())
+    return _value(result)
@@ -0,0 +1,77 @@
+# noise.py -- repeatable noise & random modulation for synthio
+# part of https://github.com/todbot/circuitpython-synthio-tricks
+#
+# `random` in CircuitPython is seeded differently every boot, so a noise
+# waveform made with randint() sounds different every time.  This uses a tiny
+# seeded xorshift generator instead: the same seed always gives the same numbers,
+# so renders and benchmarks repeat exactly, and it only uses small ints so it
+# doesn't allocate.  It's plain Python, one sample at a time, so it's not much
+# quicker than randint(): make noise waveforms once at startup, not in the main loop.
+#
+# Random LFOs are made from synthio.LFOs with a random waveform, so they run
+# natively in the synth with no Python work per loop:
+#  - interpolate=False gives sample-and-hold (steps between random values)
+#  - interpolate=True gives smoothed random (ramps between random values)
+#
+# Use it like:
+#   rng = XorShift16(seed=1234)
+#   wave_noise = noise_wave(256, seed=1234)        # int16 noise waveform
+#   f = rng.uniform(0, 0.4)                        # like random.uniform()
+#   drift = random_lfo(rate=4, scale=0.1, seed=5)  # new random value 4 times/sec
+#
+
+import synthio
+import ulab.numpy as np
+
+class XorShift16:
+    """ A 16-bit xorshift random number generator, period 65535 """
+    def __init__(self, seed=1):
+        self.seed(seed)
+
+    def seed(self, seed):
+        self.state = (seed & 0xffff) or 1  # zero state would stay zero forever
+
+    def next(self):
+        """Return next value, 1-65535"""
+        x = self.state
+        x ^= (x << 7) & 0xffff
+        x ^= x >> 9
+        x ^= (x << 8) & 0xffff
+        self.state = x
+        return x
+
+    def random(self):
+        """Like random.random(), 0 to just under 1"""
+        return self.next() / 65536
+
+    def uniform(self, a, b):
+        return a + (b - a) * self.next() / 65536
+
+    def randint(self, a, b):
+        return a + self.next() % (b - a + 1)
+
+    def choice(self, seq):
+        return seq[self.next() % len(seq)]
+
+    def fill(self, buf):
+        """Fill an int16 buffer (ulab array, array.array('h'), etc) with full-range noise.
+        This is a per-sample Python loop: xorshift needs each value to make the next,
+        so it can't be done as ulab array ops without giving up the seeded sequence"""
+        x = self.state
+        for i in range(len(buf)):
+            x ^= (x << 7) & 0xffff
+            x ^= x >> 9
+            x ^= (x << 8) & 0xffff
+            buf[i] = x - 32768
+        self.state = x
+        return buf
+
+def noise_wave(size=256, seed=1):
+    """Make an int16 white noise waveform, the same one every time for the same seed"""
+    return XorShift16(seed).fill(np.zeros(size, dtype=np.int16))
+
+def random_lfo(rate=1, scale=1, offset=0, steps=16, seed=1, smooth=False):
+    """Make an LFO that moves to a new random value 'rate' times a second,
+    stepping (sample & hold) or gliding (smooth=True) between 'steps' values before repeating"""
+    return synthio.LFO(waveform=noise_wave(steps, seed), rate=rate/steps, scale=scale,
+                       offset=offset, interpolate=smooth)
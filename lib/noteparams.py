@@ -0,0 +1,152 @@
+# noteparams.py -- only write the Note settings that actually changed
+# part of https://github.com/todbot/circuitpython-synthio-tricks
+#
+# Setting note.filter, note.frequency, etc. hands the value to the synth every
+# time, even when it's the same as before, and a filter setting makes a new
+# Biquad each time too.  Main loops that set them every pass "just in case"
+# spend most of that work on values that didn't change.
+#
+# NoteParams keeps a copy of what each note was last given (numbers in a float
+# array, a few bytes per note) and what you want it to be.  Setting a value only
+# marks the note dirty if it's different, and commit() writes just the changed
+# settings, once per pass or control tick.  Notes that want the same filter
+# in one commit share one Biquad.  It counts writes made and writes saved.
+#
+# Use it like:
+#   params = NoteParams(synth, size=3)
+#   params.set_notes(oscs)           # after making new Notes
+#   while True:
+#       for i in range(len(oscs)):
+#           params.filter(i, filter_freq, filter_res)   # only marked if different
+#       params.commit()              # writes what changed
+#
+
+import time, array
+
+FREQUENCY, AMPLITUDE, BEND, FILTER, WAVEFORM = 1, 2, 4, 8, 16  # dirty bits
+_NUMBERS = 5  # numbers kept per note: frequency, amplitude, bend, filter frequency, filter Q
+_UNKNOWN = float("nan")  # never equal to anything, so the next setting gets written
+
+def _number(x):
+    return x if isinstance(x, (int, float)) else _UNKNOWN  # an LFO or other block
+
+class NoteParams:
+    """ Mirrors the settings of some synthio.Notes, writing only changed ones on commit() """
+    def __init__(self, synth, size, report=False):
+        self.synth = synth
+        self.size = size  # most notes handled
+        self.notes = [None] * size
+        self.count = 0
+        self.want = array.array("f", [0] * (size * _NUMBERS))  # settings asked for
+        self.have = array.array("f", [0] * (size * _NUMBERS))  # settings the notes have
+        self.want_waves = [None] * size
+        self.have_waves = [None] * size
+        self.dirty = bytearray(size)  # bits of what to write for each note
+        self.report_enabled = report
+        self.reset()
+
+    def reset(self):
+        """Start counting again"""
+        self.writes = 0   # settings written to notes
+        self.saved = 0    # settings not written because they hadn't changed
+        self.commits = 0
+        self.filters = 0  # Biquads made
+        self.last_report = time.monotonic()
+
+    def set_notes(self, notes):
+        """Handle these notes from now on, reading what settings they have now"""
+        if len(notes) > self.size:
+            raise ValueError("more than %d notes" % self.size)
+        self.count = len(notes)
+        for i in range(self.count):
+            note = notes[i]
+            self.notes[i] = note
+            j = i * _NUMBERS
+            self.have[j] = _number(note.frequency)
+            self.have[j+1] = _number(note.amplitude)
+            self.have[j+2] = _number(note.bend)
+            self.have[j+3] = self.have[j+4] = _UNKNOWN  # can't read a Biquad's settings back
+            for k in range(_NUMBERS):
+                self.want[j+k] = self.have[j+k]
+            self.have_waves[i] = self.want_waves[i] = note.waveform
+            self.dirty[i] = 0
+
+    def _mark(self, i, bit, changed):
+        if changed:
+            self.dirty[i] |= bit
+        else:
+            self.dirty[i] &= ~bit  # back to what it has, so nothing to write
+            self.saved += 1
+
+    def _set(self, i, k, bit, value):
+        j = i * _NUMBERS + k
+        self.want[j] = value  # stored first, so it's compared at the array's precision
+        self._mark(i, bit, self.want[j] != self.have[j])
+
+    def frequency(self, i, f):
+        self._set(i, 0, FREQUENCY, f)
+
+    def amplitude(self, i, a):
+        self._set(i, 1, AMPLITUDE, a)
+
+    def bend(self, i, b):
+        self._set(i, 2, BEND, b)
+
+    def filter(self, i, frequency, Q=0.7071067811865475):
+        """A low-pass filter for note i"""
+        j = i * _NUMBERS + 3
+        self.want[j] = frequency
+        self.want[j+1] = Q
+        self._mark(i, FILTER, self.want[j] != self.have[j] or self.want[j+1] != self.have[j+1])
+
+    def waveform(self, i, waveform):
+        self.want_waves[i] = waveform
+        self._mark(i, WAVEFORM, waveform is not self.have_waves[i])
+
+    def commit(self):
+        """Write every changed setting to its note, returns how many were written"""
+        self.commits += 1
+        written = 0
+        lpf = None  # last filter made, and its settings
+        lpf_f = lpf_q = 0
+        for i in range(self.count):
+            d = self.dirty[i]
+            if not d:
+                continue
+            note = self.notes[i]
+            j = i * _NUMBERS
+            if d & FREQUENCY:
+                note.frequency = self.have[j] = self.want[j]
+                written += 1
+            if d & AMPLITUDE:
+                note.amplitude = self.have[j+1] = self.want[j+1]
+                written += 1
+            if d & BEND:
+                note.bend = self.have[j+2] = self.want[j+2]
+                written += 1
+            if d & FILTER:
+                f, q = self.want[j+3], self.want[j+4]
+                if lpf is None or f != lpf_f or q != lpf_q:  # else share the last one
+                    lpf = self.synth.low_pass_filter(f, q)
+                    lpf_f, lpf_q = f, q
+                    self.filters += 1
+                note.filter = lpf
+                self.have[j+3], self.have[j+4] = f, q
+                written += 1
+            if d & WAVEFORM:
+                note.waveform = self.have_waves[i] = self.want_waves[i]
+                written += 1
+            self.dirty[i] = 0
+        self.writes += written
+        return written
+
+    def report(self):
+        total = max(self.writes + self.saved, 1)
+        print("noteparams: %d writes, %d saved (%d%%), %d filters made, %d commits" %
+              (self.writes, self.saved, 100 * self.saved // total, self.filters, self.commits))
+
+    def report_every(self, secs):
+        """Print a report and start counting again every secs seconds, if report=True"""
+        if self.report_enabled and time.monotonic() - self.last_report > secs:
+            self.report()
+            self.reset()
@@ -0,0 +1,147 @@
+# notestate.py -- which notes are held down or sustained, for mono & poly synths
+# part of https://github.com/todbot/circuitpython-synthio-tricks
+#
+# A monosynth needs to know which note to fall back to when the top one is let go,
+# and a polysynth with a sustain pedal (CC 64) needs to know which notes to release
+# when the pedal comes up.  NoteState keeps that in two 128-bit bitmaps (key is down,
+# note is only still sounding because of the pedal) plus the sounding notes in the
+# order they were played, as a linked list in two 128-byte arrays (the notes before
+# & after each note), so adding or removing any note is a few byte writes, no
+# searching.  Nothing is allocated per note.
+#
+# Which note a monosynth should play comes from current(), by note priority:
+#   "last"  the most recently played note (most synths)
+#   "low"   the lowest sounding note (Minimoog-style)
+#   "high"  the highest sounding note
+#
+# Use it like, for a monosynth:
+#   notes = NoteState(priority="last")
+#   notes.press(60); notes.press(64)   # current() is 64
+#   notes.release(64)                  # current() is 60 again, glide back to it
+#   notes.sustain(True)                # pedal down
+#   notes.release(60)                  # current() is still 60, the pedal's holding it
+# or a polysynth:
+#   if notes.release(n):               # False while the pedal's holding it
+#       note_off(n)
+#   for i in range(notes.sustain(False)):  # pedal up
+#       note_off(notes.ended[i])
+#
+
+PRIORITIES = ("last", "low", "high")
+_NONE = 255  # end of the list of sounding notes
+
+class NoteState:
+    """ Held & sustained MIDI notes as bitmaps, and the sounding notes in order played """
+    def __init__(self, size=16, priority="last"):
+        self.size = size  # most notes sounding at once, the oldest is dropped after that
+        self.keys = bytearray(16)       # bit per note: key is down
+        self.sustained = bytearray(16)  # bit per note: key is up, but the pedal's holding it
+        self.older = bytearray(128)     # sounding notes as a linked list, oldest first:
+        self.newer = bytearray(128)     #   the note played before & after each one, _NONE at the ends
+        self.oldest = self.newest = _NONE
+        self.count = 0
+        self.ended = bytearray(size)    # notes that stopped sounding when the pedal came up
+        self.pedal = False
+        self.set_priority(priority)
+
+    def set_priority(self, priority):
+        if priority not in PRIORITIES:
+            raise ValueError("priority must be one of %s" % (PRIORITIES,))
+        self.priority = priority
+
+    def is_held(self, note):
+        """True if note's key is down"""
+        return bool(self.keys[note >> 3] & (1 << (note & 7)))
+
+    def is_sustained(self, note):
+        """True if note's key is up, but the pedal is holding it"""
+        return bool(self.sustained[note >> 3] & (1 << (note & 7)))
+
+    def is_sounding(self, note):
+        return self.is_held(note) or self.is_sustained(note)
+
+    def __len__(self):
+        return self.count  # how many notes are sounding
+
+    def _remove(self, note):
+        # take a sounding note out of the list, and forget it was held or sustained
+        older, newer = self.older[note], self.newer[note]
+        if older == _NONE:
+            self.oldest = newer
+        else:
+            self.newer[older] = newer
+        if newer == _NONE:
+            self.newest = older
+        else:
+            self.older[newer] = older
+        self.count -= 1
+        self.keys[note >> 3] &= ~(1 << (note & 7))
+        self.sustained[note >> 3] &= ~(1 << (note & 7))
+
+    def press(self, note):
+        """A note-on. Returns the oldest note if it was dropped to make room, else None"""
+        dropped = None
+        if self.is_sounding(note):
+            self._remove(note)  # played again, so it's the newest
+        elif self.count == self.size:
+            dropped = self.oldest
+            self._remove(dropped)
+        self.keys[note >> 3] |= 1 << (note & 7)
+        self.older[note] = self.newest
+        self.newer[note] = _NONE
+        if self.newest == _NONE:
+            self.oldest = note
+        else:
+            self.newer[self.newest] = note
+        self.newest = note
+        self.count += 1
+        return dropped
+
+    def release(self, note):
+        """A note-off. Returns True if the note stops sounding, False if the pedal holds it"""
+        if not self.is_sounding(note):
+            return True  # a stray note-off, or for a note press() already dropped
+        if self.pedal:
+            self.keys[note >> 3] &= ~(1 << (note & 7))
+            self.sustained[note >> 3] |= 1 << (note & 7)
+            return False
+        self._remove(note)
+        return True
+
+    def sustain(self, down):
+        """Sustain pedal down or up. When it comes up, returns how many notes stopped
+        sounding, and they're in the first entries of self.ended"""
+        self.pedal = down
+        if down:
+            return 0
+        n = 0
+        note = self.oldest
+        while note != _NONE:
+            newer = self.newer[note]
+            if self.is_sustained(note):
+                self._remove(note)
+                self.ended[n] = note
+                n += 1
+            note = newer
+        return n
+
+    def current(self):
+        """The note a monosynth should be playing, by priority, or None if none are sounding"""
+        if self.count == 0:
+            return None
+        if self.priority == "last":
+            return self.newest
+        best = note = self.oldest
+        while note != _NONE:
+            if (note < best) if self.priority == "low" else (note > best):
+                best = note
+            note = self.newer[note]
+        return best
+
+    def clear(self):
+        """Forget all notes (like MIDI all notes off), the pedal stays where it is"""
+        for i in range(16):
+            self.keys[i] = 0
+            self.sustained[i] = 0
+        self.oldest = self.newest = _NONE
+        self.count = 0
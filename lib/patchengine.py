@@ -0,0 +1,141 @@
+# patchengine.py -- run several synth patches at once, one per MIDI channel
+# part of https://github.com/todbot/circuitpython-synthio-tricks
+#
+# Each Part is one patch (a bass, a pad, an arp...) with its own
+# synthio.Synthesizer playing on its own audiomixer.Mixer voice.
+# That gives every patch its own volume, its own synth.blocks LFOs,
+# and its own voice budget.  Incoming MIDI is routed to parts by channel.
+#
+# Use it like:
+#   engine = PatchEngine(audio, num_parts=2, sample_rate=28000)
+#   engine.add( MyBassPart(channel=1) )
+#   engine.add( MyPadPart(channel=2), level=0.5 )
+#   engine.measure()   # optional: print how much CPU each part costs
+#   while True:
+#       engine.handle_midi( midi.receive() )
+#       engine.update()
+#
+
+import time
+import audiomixer, synthio
+from adafruit_midi.note_on import NoteOn
+from adafruit_midi.note_off import NoteOff
+from adafruit_midi.control_change import ControlChange
+
+class Part:
+    """One patch, subclass it and fill in note_on(), note_off(), etc.
+    self.synth is set up by PatchEngine.add() before setup() is called."""
+    def __init__(self, channel, name="part"):
+        self.channel = channel  # which midi channel to receive on, 1-16
+        self.name = name
+        self.synth = None
+        self.test_notes = (48, 55, 60)  # notes pressed when measuring CPU load
+        self.release_time = 0.5  # longest note release, so measure() knows when it's quiet
+
+    def setup(self):
+        """Called once self.synth exists, make filters & LFOs here"""
+        pass
+
+    def note_on(self, notenum, vel):
+        pass
+
+    def note_off(self, notenum, vel):
+        pass
+
+    def control_change(self, control, value):
+        pass
+
+    def update(self):
+        """Called every pass of the main loop, do per-part modulation here"""
+        pass
+
+
+class PatchEngine:
+    """ Plays several Parts on one audio output through a shared Mixer """
+    def __init__(self, audio, num_parts, sample_rate=28000, buffer_size=4096, channel_count=1):
+        self.sample_rate = sample_rate
+        self.buffer_size = buffer_size
+        self.channel_count = channel_count
+        self.mixer = audiomixer.Mixer(voice_count=num_parts, sample_rate=sample_rate,
+                                      channel_count=channel_count, buffer_size=buffer_size)
+        audio.play(self.mixer)
+        self.parts = []
+        self.parts_by_channel = [None] * 16  # index is midi channel 0-15
+        self.loads = {}  # part name -> fraction of CPU used, filled in by measure()
+
+    def add(self, part, level=0.75):
+        """Give a part its own synth and mixer voice"""
+        if not 1 <= part.channel <= 16:
+            raise ValueError("part channel must be 1-16")
+        voice = len(self.parts)
+        if voice >= len(self.mixer.voice):
+            raise ValueError("no mixer voice left for part")
+        part.synth = synthio.Synthesizer(sample_rate=self.sample_rate,
+                                         channel_count=self.channel_count)
+        part.setup()
+        self.mixer.voice[voice].play(part.synth)
+        self.mixer.voice[voice].level = level
+        self.parts.append(part)
+        self.parts_by_channel[part.channel-1] = part
+        return part
+
+    def handle_midi(self, msg):
+        """Send a MIDI message to the part listening on its channel"""
+        if msg is None or msg.channel is None:  # system messages like clock have no channel
+            return
+        part = self.parts_by_channel[msg.channel]
+        if part is None:
+            return
+        if isinstance(msg, NoteOn) and msg.velocity != 0:
+            part.note_on(msg.note, msg.velocity)
+        elif isinstance(msg,NoteOff) or isinstance(msg,NoteOn) and msg.velocity==0:
+            part.note_off(msg.note, msg.velocity)
+        elif isinstance(msg,ControlChange):
+            part.control_change(msg.control, msg.value)
+
+    def update(self):
+        for part in self.parts:
+            part.update()
+
+    def buffer_time(self):
+        """How long one mixer buffer plays for, the deadline for refilling it"""
+        return self.buffer_size // (2 * self.channel_count) / self.sample_rate  # buffer_size is bytes
+
+    def _spin(self, duration):
+        # count how many main loop passes we get in 'duration' seconds,
+        # audio rendering happens in the background so it eats into this count
+        n = 0
+        deadline = time.monotonic_ns() + int(duration * 1_000_000_000)
+        while time.monotonic_ns() < deadline:
+            self.update()
+            n += 1
+        return n
+
+    def measure(self, duration=0.5, max_load=0.8):
+        """Estimate CPU used by each part by playing its test_notes and seeing
+        how much the main loop slows down. Prints a report and returns
+        the total load of all parts playing at once."""
+        idle = self._spin(duration)
+        tail = max(part.release_time for part in self.parts)
+        for part in self.parts:
+            for n in part.test_notes:
+                part.note_on(n, 100)
+            busy = self._spin(duration)
+            for n in part.test_notes:
+                part.note_off(n, 0)
+            time.sleep(tail)  # let release tails finish, so they're not in the next part's count
+            self.loads[part.name] = 1 - busy / idle
+        for part in self.parts:  # now everyone at once
+            for n in part.test_notes:
+                part.note_on(n, 100)
+        total = 1 - self._spin(duration) / idle
+        for part in self.parts:
+            for n in part.test_notes:
+                part.note_off(n, 0)
+        buf_ms = self.buffer_time() * 1000
+        for name,load in self.loads.items():
+            print("part %-10s load: %3d%%  (%.1f ms of each %.1f ms buffer)" %
+                  (name, load*100, load*buf_ms, buf_ms))
+        print("all parts load: %3d%%  budget: %3d%%  %s" %
+              (total*100, max_load*100, "ok" if total <= max_load else "OVER BUDGET"))
+        return total
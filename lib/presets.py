@@ -0,0 +1,117 @@
+# presets.py -- save & recall synth parameter sets in a small binary file
+# part of https://github.com/todbot/circuitpython-synthio-tricks
+#
+# Every preset slot is the same size and packed with `struct`, so recalling
+# slot N is one seek and one read, no JSON parsing and no searching.
+# File layout:
+#   header: magic "SYNP", version (1 byte), field count (1 byte), slot size (2 bytes)
+#   slots:  num_slots * slot_size bytes, each one "used" byte + the packed fields
+#
+# Use it like:
+#   bank = PresetBank("/presets.bin", (("filter_freq","f"), ("filter_res","f"), ("arp_id","B")))
+#   bank.watch(("filter_freq","filter_res"), rebuild_filter)  # only called if these change
+#   params = {"filter_freq": 2000, "filter_res": 1.0, "arp_id": 0}
+#   bank.recall(3, params)   # params is a dict of current values, updated in place
+#   bank.save(3, params)
+#
+# Note: to save to flash, CIRCUITPY must be writable by CircuitPython, which needs
+# a boot.py with `storage.remount("/", readonly=False)`. (Then your computer can't write to it)
+#
+
+import struct
+
+PRESET_MAGIC = b"SYNP"
+PRESET_HEADER_FMT = "<4sBBH"
+PRESET_HEADER_SIZE = struct.calcsize(PRESET_HEADER_FMT)
+
+class PresetBank:
+    """ A file of fixed-size preset slots, each holding the same set of fields """
+    def __init__(self, filepath, fields, num_slots=16, version=1):
+        self.filepath = filepath
+        self.names = [name for (name,fmt) in fields]
+        self.fmt = "<B" + "".join([fmt for (name,fmt) in fields])  # "used" byte + fields
+        self.field_fmts = ["<" + fmt for (name,fmt) in fields]  # for quantizing current values
+        self.slot_size = struct.calcsize(self.fmt)
+        self.num_slots = num_slots
+        self.version = version
+        self.buf = bytearray(self.slot_size)  # reused for every read & write
+        self.qbuf = bytearray(max([struct.calcsize(fmt) for fmt in self.field_fmts] + [1]))
+        self.watchers = []  # list of (names, callback)
+
+    def watch(self, names, callback):
+        """Call callback(params) after a recall changes any of the named fields"""
+        self.watchers.append( (names, callback) )
+
+    def _quantize(self, i, val):
+        # val as it would come back from the file, so 2000.1 compares equal to its float32 self
+        struct.pack_into(self.field_fmts[i], self.qbuf, 0, val)
+        return struct.unpack_from(self.field_fmts[i], self.qbuf)[0]
+
+    def _check_slot(self, slot):
+        if not 0 <= slot < self.num_slots:
+            raise ValueError("preset slot out of range")
+
+    def _check_header(self, f):
+        f.seek(0)
+        magic, version, num_fields, slot_size = struct.unpack(PRESET_HEADER_FMT, f.read(PRESET_HEADER_SIZE))
+        if magic != PRESET_MAGIC:
+            raise ValueError("not a preset file")
+        if version != self.version or num_fields != len(self.names) or slot_size != self.slot_size:
+            raise ValueError("preset file version mismatch")
+
+    def _create(self):
+        with open(self.filepath, "wb") as f:
+            f.write(struct.pack(PRESET_HEADER_FMT, PRESET_MAGIC, self.version,
+                                len(self.names), self.slot_size))
+            empty = bytes(self.slot_size)
+            for i in range(self.num_slots):
+                f.write(empty)
+
+    def load(self, slot):
+        """Return the packed values in slot as a tuple, or None if slot is empty"""
+        self._check_slot(slot)
+        try:
+            f = open(self.filepath, "rb")
+        except OSError:
+            return None  # no preset file yet
+        with f:
+            self._check_header(f)
+            f.seek(PRESET_HEADER_SIZE + slot * self.slot_size)
+            f.readinto(self.buf)
+        values = struct.unpack(self.fmt, self.buf)
+        if not values[0]:
+            return None
+        return values[1:]
+
+    def recall(self, slot, params):
+        """Load slot into the params dict, run the watchers whose fields changed,
+        and return the number of fields that changed (0 if the slot is empty)"""
+        values = self.load(slot)
+        if values is None:
+            return 0
+        changed = set()
+        for i, (name,val) in enumerate(zip(self.names, values)):
+            # compared as stored, or a float field saved from these very params looks changed
+            if name not in params or self._quantize(i, params[name]) != val:
+                params[name] = val
+                changed.add(name)
+        for (names, callback) in self.watchers:
+            for name in names:
+                if name in changed:
+                    callback(params)
+                    break
+        return len(changed)
+
+    def save(self, slot, params):
+        """Pack the fields from params into slot"""
+        self._check_slot(slot)
+        try:
+            f = open(self.filepath, "r+b")
+        except OSError:
+            self._create()
+            f = open(self.filepath, "r+b")
+        with f:
+            self._check_header(f)
+            struct.pack_into(self.fmt, self.buf, 0, 1, *[params[name] for name in self.names])
+            f.seek(PRESET_HEADER_SIZE + slot * self.slot_size)
+            f.write(self.buf)
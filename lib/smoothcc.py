@@ -0,0 +1,64 @@
+# smoothcc.py -- glide between MIDI controller values in the synth, not in Python
+# part of https://github.com/todbot/circuitpython-synthio-tricks
+#
+# A MIDI CC is only 128 steps, and pitch bend arrives a message at a time, so
+# writing each new value straight to note.bend or lfo.scale makes audible steps
+# ("zipper noise").  Hiding them by nudging the value in Python every pass
+# of the main loop costs lots of writes and still steps at the loop rate.
+#
+# SmoothCC turns each new value into a short straight-line ramp that the synth
+# works out itself, once per synth block: a one-shot 0-to-1 synthio.LFO drives a
+# synthio.Math CONSTRAINED_LERP from wherever the last ramp had got to, to the
+# new value.  Python only does a few writes per MIDI message.  SmoothCC.block
+# goes anywhere a synthio.BlockInput does (note.bend, note.amplitude, an LFO's scale...).
+#
+# Use it like:
+#   bend = SmoothCC(synth, ramp_time=0.02)
+#   note = synthio.Note(220, bend=bend.block)
+#   modwheel = SmoothCC(synth)
+#   lfo_vibrato.scale = modwheel.block
+#   ...
+#   if isinstance(msg, PitchBend):
+#       bend.pitch_bend(msg.pitch_bend, semitones=2)
+#   elif isinstance(msg, ControlChange) and msg.control == 1:
+#       modwheel.cc(msg.value, 0, 0.1)
+#
+# Needs synthio.Math (CircuitPython 9)
+#
+
+import synthio
+import ulab.numpy as np
+
+_RAMP = np.array((0, 32767), dtype=np.int16)  # one-shot, so 0 to 1 and stays at 1
+
+class SmoothCC:
+    """ A controller value that glides to each new setting, computed by the synth """
+    def __init__(self, synth, value=0.0, ramp_time=0.02):
+        self.ramp = synthio.LFO(waveform=_RAMP, rate=1/ramp_time, once=True)
+        self.block = synthio.Math(synthio.MathOperation.CONSTRAINED_LERP, value, value, self.ramp)
+        self.target = value
+        synth.blocks.append(self.block)  # so the ramp runs even when no note is using it
+
+    @property
+    def value(self):
+        """Where the ramp has got to"""
+        return self.block.value
+
+    def set(self, value, ramp_time=None):
+        """Glide to value, over ramp_time seconds (or the one it was made with)"""
+        if value == self.target:
+            return
+        if ramp_time is not None:
+            self.ramp.rate = 1 / ramp_time if ramp_time > 0 else 1000
+        self.block.a = self.block.value  # from wherever it is now
+        self.block.b = value
+        self.target = value
+        self.ramp.retrigger()
+
+    def cc(self, value, lo=0.0, hi=1.0):
+        """Glide to a 7-bit CC value 0-127, mapped to lo-hi"""
+        self.set(lo + (hi - lo) * value / 127)
+
+    def pitch_bend(self, value, semitones=2):
+        """Glide to a 14-bit pitch bend 0-16383 (8192 is center), as octaves for note.bend"""
+        self.set((value - 8192) / 8192 * semitones / 12)
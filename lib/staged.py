@@ -0,0 +1,77 @@
+# staged.py -- get to first sound sooner by finishing startup from the main loop
+# part of https://github.com/todbot/circuitpython-synthio-tricks
+#
+# On CircuitPython every import loads or compiles code and takes heap, and
+# opening files & building tables takes time too. If all of that happens before
+# audio.play(), nothing sounds until all of it is done.
+#
+# Instead: import only what the audio path needs, start it playing, then hand
+# the rest (MIDI, UI, wavetables...) to StagedBoot as functions. update() runs
+# one stage per main loop pass, so the synth is already playing while the
+# rest loads. Every phase is timed from boot so you can see where time goes.
+#
+# Use it like:
+#   boot = StagedBoot()           # as early as possible in code.py
+#   ...start audio...
+#   boot.mark("audio")            # time for work already done, up to now
+#   def load_midi():
+#       global midi
+#       import usb_midi, adafruit_midi   # the import happens here, not at boot
+#       midi = adafruit_midi.MIDI(midi_in=usb_midi.ports[0])
+#   boot.add("midi", load_midi)
+#   while True:
+#       boot.update()             # runs the next stage, prints a report after the last
+#       if midi: ...
+#
+
+import time
+
+class StagedBoot:
+    """ Runs startup stages one per main loop pass, timing each of them """
+    def __init__(self, report=True):
+        self.start_ns = time.monotonic_ns()
+        self.last_ns = self.start_ns
+        self.stages = []   # list of (name, func) still to run
+        self.timings = []  # list of (name, ms since boot when finished, ms it took)
+        self.first_sound_ms = None
+        self.report_when_done = report
+
+    def _record(self, name):
+        now = time.monotonic_ns()
+        self.timings.append((name, (now - self.start_ns) / 1e6, (now - self.last_ns) / 1e6))
+        self.last_ns = now
+
+    def mark(self, name):
+        """Record a phase that was just finished in-line"""
+        self._record(name)
+
+    def first_sound(self):
+        """Record that the synth can make sound now"""
+        self.first_sound_ms = (time.monotonic_ns() - self.start_ns) / 1e6
+
+    def add(self, name, func):
+        """Queue func() to be run by a later update()"""
+        self.stages.append((name, func))
+
+    @property
+    def done(self):
+        return not self.stages
+
+    def update(self):
+        """Run the next stage, if any. Returns True while there are stages left"""
+        if not self.stages:
+            return False
+        name, func = self.stages.pop(0)
+        self.last_ns = time.monotonic_ns()  # don't charge main loop time between stages
+        func()
+        self._record(name)
+        if not self.stages and self.report_when_done:
+            self.report()
+        return bool(self.stages)
+
+    def report(self):
+        print("boot: %-12s %8s %8s" % ("phase", "done at", "took"))
+        for (name, at, took) in self.timings:
+            print("boot: %-12s %6.1fms %6.1fms" % (name, at, took))
+        if self.first_sound_ms is not None:
+            print("boot: first sound possible at %.1fms" % self.first_sound_ms)
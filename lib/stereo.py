@@ -0,0 +1,107 @@
+# stereo.py -- spread voices across a stereo field, and find what stereo costs
+# part of https://github.com/todbot/circuitpython-synthio-tricks
+#
+# Boards with I2S DACs (PicoADK, Pico Audio, Prop-Maker) are stereo, so a stack
+# of detuned voices can be spread out left-to-right instead of all in the middle.
+# Stereo makes synthio and the mixer do twice the output work and use twice
+# the buffer memory, so on a busy patch it can cost you voices.
+#
+# compare_stereo() measures that on your board: for each voice count it plays
+# the voices in mono and then stereo at the same sample rate, and prints the
+# CPU load and memory used, and how many voices each mode fits in the budget.
+# Then you can pick: wide stereo and fewer voices, or more voices in mono.
+#
+# Use it like:
+#   pan_voices(voices, width=0.8)   # spread voices from -0.8 (left) to 0.8 (right)
+#
+#   # at startup, while tuning a board:
+#   def make_voices(n):
+#       return [synthio.Note(110 * (1 + 0.003*i), waveform=wave_saw) for i in range(n)]
+#   compare_stereo(audio, 28000, make_voices, voice_counts=(2,4,6,8))
+#
+
+import gc, time
+import audiomixer, synthio
+
+def spread(num_voices, width=1.0, center=0.0):
+    """Panning positions for num_voices, evenly across center +/- width.
+    Positions alternate left & right from the middle out, so the first few
+    voices of a stack are balanced even if later ones get dropped."""
+    if num_voices < 2:
+        return [center] * num_voices
+    step = 2 * width / (num_voices - 1)
+    ordered = [center - width + i*step for i in range(num_voices)]  # left to right
+    pans = []
+    lo, hi = (num_voices - 1) // 2, (num_voices - 1) // 2 + 1
+    while lo >= 0 or hi < num_voices:
+        if lo >= 0:
+            pans.append(ordered[lo])
+            lo -= 1
+        if hi < num_voices:
+            pans.append(ordered[hi])
+            hi += 1
+    return [min(max(p, -1), 1) for p in pans]
+
+def pan_voices(notes, width=1.0, center=0.0, lfo=None):
+    """Set each Note's panning from spread(), optionally swaying all of them with an LFO"""
+    for note, pan in zip(notes, spread(len(notes), width, center)):
+        if lfo is None:
+            note.panning = pan
+        else:
+            note.panning = synthio.Math(synthio.MathOperation.SUM, lfo, pan, 0.0)  # c is 1.0 if not given
+
+def _spin(duration):
+    # count main loop passes in 'duration' seconds, audio rendering eats into this
+    n = 0
+    deadline = time.monotonic_ns() + int(duration * 1_000_000_000)
+    while time.monotonic_ns() < deadline:
+        n += 1
+    return n
+
+def measure(audio, sample_rate, channel_count, make_voices, num_voices,
+            width=1.0, buffer_size=2048, duration=0.5, idle=None):
+    """Play num_voices from make_voices(num_voices) with the given channel_count,
+    return (CPU load 0-1, bytes of memory used by mixer, synth & voices).
+    idle is the loop count from _spin(duration) with no audio playing, so the
+    load includes the mixer's own output work; it's counted now if not given"""
+    if idle is None:
+        idle = _spin(duration)
+    gc.collect()
+    free_before = gc.mem_free()
+    mixer = audiomixer.Mixer(channel_count=channel_count, sample_rate=sample_rate,
+                             buffer_size=buffer_size)
+    synth = synthio.Synthesizer(channel_count=channel_count, sample_rate=sample_rate)
+    audio.play(mixer)
+    mixer.voice[0].play(synth)
+    notes = make_voices(num_voices)
+    if channel_count == 2:
+        pan_voices(notes, width)
+    synth.press(notes)
+    busy = _spin(duration)
+    mem = free_before - gc.mem_free()
+    synth.release_all()
+    audio.stop()
+    mixer.deinit()
+    synth.deinit()
+    return 1 - busy / idle, mem
+
+def compare_stereo(audio, sample_rate, make_voices, voice_counts=(2, 4, 6, 8),
+                   width=1.0, buffer_size=2048, max_load=0.8):
+    """Print mono vs stereo load & memory for each voice count,
+    return (most voices mono fits in max_load, most voices stereo fits).
+    Call it before playing any audio, so every load is from the same silent baseline"""
+    idle = _spin(0.5)  # one baseline for all, so mono vs stereo mixer cost shows up
+    best = [0, 0]
+    print("voices   mono load  mem     stereo load  mem")
+    for n in voice_counts:
+        results = []
+        for i, channel_count in enumerate((1, 2)):
+            load, mem = measure(audio, sample_rate, channel_count, make_voices, n,
+                                width, buffer_size, idle=idle)
+            results += [load * 100, mem]
+            if load <= max_load:
+                best[i] = max(best[i], n)
+        print("%4d     %4d%%   %6d     %4d%%   %6d" % (n, *results))
+    print("at %d Hz and %d%% budget: up to %d voices mono, %d voices stereo" %
+          (sample_rate, max_load * 100, best[0], best[1]))
+    return tuple(best)
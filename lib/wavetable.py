@@ -0,0 +1,269 @@
+# wavetable.py -- one wavetable in memory, morphed separately by many voices
+# part of https://github.com/todbot/circuitpython-synthio-tricks
+#
+# The Wavetable class in the examples reads from the WAV file every time its
+# position changes, and has one waveform buffer, so every note playing it
+# morphs in lockstep.  Here the whole table is read into memory once
+# (64 waves * 256 samples * 2 bytes = 32 kB for a waveeditonline.com table)
+# and each voice gets just its own wave_len buffer to morph into.
+#
+# WavetableVoices.update() morphs all the voices in one pass, and skips voices
+# whose position hasn't moved enough to matter.  (ulab can't index with an
+# array of wave numbers, so it's one vectorized lerp per voice that moved.)
+#
+# Use it like:
+#   wavetable = Wavetable("wav/PLAITS02.WAV")
+#   wt_voices = WavetableVoices(wavetable, num_voices=6)
+#   note = synthio.Note(220, waveform=wt_voices.waveforms[0])
+#   wt_voices.lfos[0] = synthio.LFO(rate=0.2, scale=20, offset=10)  # modulate position
+#   while True:
+#       wt_voices.update()
+#
+# With an index made by tools/wavetable_index.py, tables are picked by number,
+# and loaded straight from their sample data without parsing the WAV again:
+#   index = WavetableIndex("wav/WAVES.IDX")
+#   wavetable = index.load(3)
+#   wt_voices.set_wavetable( index.load(4, wavetable) )  # reuses the table's memory
+#
+# Tables that aren't 256-sample 16-bit mono are converted as they're loaded:
+# 8 and 24-bit samples are scaled to 16-bit, stereo is mixed to mono, and each
+# wave is resampled to wave_len (a power of two), by averaging when it shrinks
+# by a whole number (2048-sample Serum tables to 256) and straight-line
+# interpolation otherwise.  It's done a few waves at a time, so the float
+# arrays it needs stay small.  normalize=True takes out each wave's DC offset
+# and brings its peak to the same level, so scanning the table doesn't jump in
+# loudness.  Converting is slow on a board, so give it a cache file and the
+# converted table is saved there (if CIRCUITPY is writable) and read straight
+# back next time, as long as the WAV (its size and time) and settings haven't changed:
+#   wavetable = Wavetable("wav/serum.wav", wave_len=256, src_wave_len=2048,
+#                         normalize=True, cache="/wav/serum.cvt")
+#
+
+import os, struct
+import ulab.numpy as np
+import adafruit_wave
+
+INDEX_MAGIC = b"WTIX"  # index file layout, must match tools/wavetable_index.py
+INDEX_HEADER_FMT = "<4sBH"
+INDEX_HEADER_SIZE = struct.calcsize(INDEX_HEADER_FMT)
+INDEX_ENTRY_FMT = "<24sIIHHBBI"
+INDEX_ENTRY_SIZE = struct.calcsize(INDEX_ENTRY_FMT)
+
+CACHE_MAGIC = b"WTCV"  # converted table cache: magic, WAV file size & mtime, src_wave_len, wave_len, num_waves, normalized
+CACHE_HEADER_FMT = "<4sIIHHHB"
+CACHE_HEADER_SIZE = struct.calcsize(CACHE_HEADER_FMT)
+NORMAL_PEAK = 30000  # a little headroom below 32767
+
+def _samples(data, bits, channels):
+    """WAV sample bytes as a float array of mono samples on a 16-bit scale"""
+    if bits == 16:
+        x = np.frombuffer(data, dtype=np.int16) * 1.0
+    elif bits == 8:  # unsigned, 128 is zero
+        x = np.frombuffer(data, dtype=np.uint8) * 256.0 - 32768.0
+    else:  # 24-bit, keep the top two bytes of each sample
+        hi = np.frombuffer(data, dtype=np.int8)
+        lo = np.frombuffer(data, dtype=np.uint8)
+        x = hi[2::3] * 256.0 + lo[1::3]
+    if channels == 2:
+        x = (x[0::2] + x[1::2]) * 0.5
+    return x
+
+# mix between values a and b, works with numpy arrays too,  t ranges 0-1
+def lerp(a, b, t):  return (1-t)*a + t*b
+
+class Wavetable:
+    """ A whole wavetable WAV file, held in memory as num_waves x wave_len samples """
+    def __init__(self, filepath, wave_len=256, offset=None, num_waves=None,
+                 src_wave_len=None, normalize=False, cache=None):
+        self.wave_len = wave_len  # how many samples in each wave
+        self.table = None
+        if offset is not None:  # where the samples are is already known, from a WavetableIndex
+            self.read_raw(filepath, offset, num_waves)
+            return
+        src_wave_len = src_wave_len or wave_len  # how many samples in each wave in the file
+        if cache and self.load_cache(cache, filepath, src_wave_len, normalize):
+            return
+        with adafruit_wave.open(filepath) as w:
+            bits, channels = w.getsampwidth() * 8, w.getnchannels()
+            if bits not in (8, 16, 24) or channels not in (1, 2):
+                raise ValueError("unsupported WAV format")
+            self.num_waves = w.getnframes() // src_wave_len
+            if bits == 16 and channels == 1 and src_wave_len == wave_len:  # the usual, read as is
+                data = bytearray(w.readframes(self.num_waves * wave_len))  # writable, for normalize()
+                self.table = np.frombuffer(data, dtype=np.int16).reshape((self.num_waves, wave_len))
+            else:
+                self.convert(w, bits, channels, src_wave_len)
+        if normalize:
+            self.normalize()
+        if cache:
+            self.save_cache(cache, filepath, src_wave_len, normalize)
+
+    def convert(self, w, bits, channels, src_wave_len):
+        """Read an open WAV of any supported format into a 16-bit mono table,
+        resampling each wave from src_wave_len to wave_len, a few waves at a time"""
+        wave_len = self.wave_len
+        if wave_len & (wave_len - 1):
+            raise ValueError("wave_len must be a power of two to resample")
+        self.table = np.zeros((self.num_waves, wave_len), dtype=np.int16)
+        block = max(1, 4096 // src_wave_len)  # waves converted at once, keeps the float arrays small
+        xs = np.linspace(0, src_wave_len, num=wave_len, endpoint=False)  # where to read each new sample
+        xp = np.linspace(0, src_wave_len, num=src_wave_len + 1)  # source samples, plus the first again
+        for i in range(0, self.num_waves, block):
+            n = min(block, self.num_waves - i)
+            x = _samples(w.readframes(n * src_wave_len), bits, channels)
+            for k in range(n):
+                wave = x[k * src_wave_len:(k + 1) * src_wave_len]
+                if src_wave_len == wave_len:
+                    self.table[i + k] = wave
+                elif src_wave_len % wave_len == 0:  # shrinking by a whole number, average each group
+                    self.table[i + k] = np.mean(wave.reshape((wave_len, src_wave_len // wave_len)), axis=1)
+                else:  # straight lines between samples, wrapping around to the start
+                    self.table[i + k] = np.interp(xs, xp, np.concatenate((wave, wave[:1])))
+            x = None  # let it go before reading the next block
+
+    def normalize(self, peak=NORMAL_PEAK):
+        """Take out each wave's DC offset and scale it so its peak is at peak,
+        so moving through the table doesn't jump in loudness"""
+        for i in range(self.num_waves):
+            wave = self.table[i] * 1.0  # as floats
+            wave = wave - np.mean(wave)
+            top = np.max(abs(wave))
+            if top > 0:
+                self.table[i] = wave * (peak / top)
+
+    def load_cache(self, cache, filepath, src_wave_len, normalized):
+        """Read the table from cache, if it was made from filepath with these settings"""
+        try:
+            with open(cache, "rb") as f:
+                header = f.read(CACHE_HEADER_SIZE)
+            if len(header) != CACHE_HEADER_SIZE:
+                return False
+            magic, src_size, src_mtime, src_len, wave_len, num_waves, norm = struct.unpack(CACHE_HEADER_FMT, header)
+            st = os.stat(filepath)
+            if (magic != CACHE_MAGIC or src_size != st[6] or src_mtime != int(st[8]) & 0xffffffff or
+                    src_len != src_wave_len or
+                    wave_len != self.wave_len or norm != int(normalized)):
+                return False
+        except OSError:  # no cache yet
+            return False
+        self.read_raw(cache, CACHE_HEADER_SIZE, num_waves)
+        return True
+
+    def save_cache(self, cache, filepath, src_wave_len, normalized):
+        """Write the table to cache, so the next load can skip converting it"""
+        try:
+            with open(cache, "wb") as f:
+                st = os.stat(filepath)
+                f.write(struct.pack(CACHE_HEADER_FMT, CACHE_MAGIC, st[6], int(st[8]) & 0xffffffff, src_wave_len,
+                                    self.wave_len, self.num_waves, int(normalized)))
+                f.write(self.table)
+        except OSError as e:
+            print("can't save wavetable cache", cache, e, "(is CIRCUITPY writable?)")
+
+    def read_raw(self, filepath, offset, num_waves):
+        """Read num_waves 16-bit mono waves from offset in filepath, without parsing the WAV.
+        Reads into the current table if it's the same size, so no new memory is needed"""
+        if self.table is None or self.num_waves != num_waves:
+            self.table = None  # let the old one go first
+            self.table = np.zeros((num_waves, self.wave_len), dtype=np.int16)
+        self.num_waves = num_waves
+        with open(filepath, "rb") as f:
+            f.seek(offset)
+            f.readinto(self.table)
+
+    def morph(self, buf, pos):
+        """Fill buf with the wave at pos, mixing between waves for fractional positions"""
+        pos = min(max(pos, 0), self.num_waves-1)  # constrain
+        i = int(pos)
+        j = min(i+1, self.num_waves-1)  # one wave up, if there is one
+        buf[:] = lerp(self.table[i], self.table[j], pos - i)  # mix waveforms A & B
+
+class WavetableVoices:
+    """ Many voices sharing one Wavetable, each with its own position & waveform buffer """
+    def __init__(self, wavetable, num_voices, min_change=0.01):
+        self.wavetable = wavetable
+        self.min_change = min_change  # how far a position must move to re-morph
+        self.waveforms = [np.zeros(wavetable.wave_len, dtype=np.int16) for i in range(num_voices)]
+        self.positions = [0.0] * num_voices  # wave position for each voice
+        self.lfos = [None] * num_voices  # if set, voice position comes from this LFO's value
+        self.last_positions = [-1.0] * num_voices  # what position each buffer holds now
+        for i in range(num_voices):
+            wavetable.morph(self.waveforms[i], 0)
+            self.last_positions[i] = 0
+
+    def set_wavetable(self, wavetable):
+        """Play from wavetable (or the same one, reloaded), every voice is re-morphed"""
+        if wavetable.wave_len != self.wavetable.wave_len:
+            raise ValueError("wave_len must stay %d" % self.wavetable.wave_len)
+        self.wavetable = wavetable
+        for i in range(len(self.waveforms)):
+            self.last_positions[i] = -1.0  # force a re-morph at the next update()
+        self.update()
+
+    def update(self):
+        """Morph every voice whose position has moved, return how many were morphed"""
+        morphed = 0
+        for i in range(len(self.waveforms)):
+            lfo = self.lfos[i]
+            pos = lfo.value if lfo else self.positions[i]
+            if abs(pos - self.last_positions[i]) >= self.min_change:
+                self.wavetable.morph(self.waveforms[i], pos)
+                self.last_positions[i] = pos
+                morphed += 1
+        return morphed
+
+class WavetableIndex:
+    """ Finds wavetables by number in an index made by tools/wavetable_index.py,
+    reading just the entries asked for, so it's small even for thousands of tables """
+    def __init__(self, filepath):
+        self.dir = filepath.rsplit("/", 1)[0] if "/" in filepath else "."  # WAVs are next to it
+        self.file = open(filepath, "rb")
+        magic, version, self.count = struct.unpack(INDEX_HEADER_FMT, self.file.read(INDEX_HEADER_SIZE))
+        if magic != INDEX_MAGIC:
+            raise ValueError("not a wavetable index")
+        self.buf = bytearray(INDEX_ENTRY_SIZE)
+
+    def __len__(self):
+        return self.count
+
+    def entry(self, i):
+        """(name, data offset, file size, wave_len, num_waves, bits, channels, loudness offset)"""
+        if not 0 <= i < self.count:
+            raise IndexError("no wavetable %d" % i)
+        self.file.seek(INDEX_HEADER_SIZE + i * INDEX_ENTRY_SIZE)
+        self.file.readinto(self.buf)
+        e = struct.unpack(INDEX_ENTRY_FMT, self.buf)
+        return (e[0].rstrip(b"\0").decode(),) + e[1:]
+
+    def name(self, i):
+        return self.entry(i)[0]
+
+    def find(self, name):
+        """Number of the wavetable named name, raises ValueError if there isn't one"""
+        for i in range(self.count):
+            if self.name(i) == name:
+                return i
+        raise ValueError("no wavetable named %r" % name)
+
+    def loudness(self, i):
+        """RMS of each wave in wavetable i, on a 16-bit scale"""
+        e = self.entry(i)
+        num_waves, loud_offset = e[4], e[7]
+        self.file.seek(loud_offset)
+        return np.frombuffer(self.file.read(num_waves * 2), dtype=np.uint16)
+
+    def load(self, i, wavetable=None, normalize=False, wave_len=256):
+        """Load wavetable i as waves of wave_len samples, into wavetable's memory if one is given
+        and it's the same size.  Tables that aren't 16-bit mono waves of wave_len samples
+        are converted, which is slower and needs new memory"""
+        name, offset, size, src_wave_len, num_waves, bits, channels, loud_offset = self.entry(i)
+        path = self.dir + "/" + name
+        if bits != 16 or channels != 1 or src_wave_len != wave_len:
+            return Wavetable(path, wave_len, src_wave_len=src_wave_len, normalize=normalize)
+        if wavetable is not None and wavetable.wave_len == wave_len:
+            wavetable.read_raw(path, offset, num_waves)
+        else:
+            wavetable = Wavetable(path, wave_len, offset=offset, num_waves=num_waves)
+        if normalize:
+            wavetable.normalize()
+        return wavetable
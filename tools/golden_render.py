@@ -0,0 +1,219 @@
+#!/usr/bin/env python3
+# golden_render.py -- check every example still sounds like it did, and how fast it renders
+# part of https://github.com/todbot/circuitpython-synthio-tricks
+#
+# Runs every examples/*/code*.py variant with hostsynth.py, feeding it a scripted
+# MIDI/knob/button trace, and compares the audio against a stored "golden"
+# fingerprint in tools/golden/: the RMS loudness and spectral centroid
+# (brightness) of every 0.1 second block of each channel, so a stereo image
+# that moves shows up too, and the output's sample rate & channel count.
+# Also reports how long each render took.
+# Some traces also have pitch checks, windows whose fundamental is estimated and
+# compared too, for things like pitch bend that barely move RMS or brightness.
+#
+# Use it like:
+#   python3 tools/golden_render.py              # check all variants
+#   python3 tools/golden_render.py monosynth1   # check just one example's variants
+#   python3 tools/golden_render.py --update     # record new goldens after an on-purpose sound change
+#   python3 tools/golden_render.py --wavs /tmp/renders   # also save WAVs to listen to
+#
+
+import sys, os, glob, json, argparse
+import numpy as np
+from hostsynth import HostRun, write_wav, NoteOn, NoteOff, ControlChange, ProgramChange, PitchBend, \
+    TimingClock, Start
+
+TOOLS_DIR = os.path.dirname(os.path.abspath(__file__))
+EXAMPLES_DIR = os.path.join(TOOLS_DIR, "..", "examples")
+GOLDEN_DIR = os.path.join(TOOLS_DIR, "golden")
+
+BLOCK_TIME = 0.1   # seconds per fingerprint block
+RMS_TOL = 0.05     # allowed relative difference in loudness per block
+RMS_FLOOR = 50     # differences smaller than this are just noise
+CENTROID_TOL = 0.10  # allowed relative difference in brightness per block
+CENTROID_FLOOR = 50  # Hz
+PITCH_TOL = 0.02   # allowed relative difference in pitch, about a third of a semitone
+
+# the input each example gets: seconds to render, and (time, kind, data) events
+TRACES = {
+    "monosynth1": (4, [
+        (0.25, "midi", NoteOn(36, 100)),
+        (1.0, "midi", NoteOn(40, 60)),   # legato, so noteoff then noteon
+        (1.0, "midi", NoteOff(36, 0)),
+        ] + [(1.0 + i/100, "midi", ControlChange(74, i)) for i in range(0, 128, 4)] + [
+        (2.0, "midi", ControlChange(1, 100)),
+        (2.2, "midi", NoteOn(43, 127)),
+        (2.5, "midi", ControlChange(72, 127)),
+        ] + [(2.6 + i/100, "midi", PitchBend(8192 + i * 512)) for i in range(16)] + [  # bend up a tone
+        (3.0, "midi", NoteOff(43, 0)),
+    ]),
+    "wavetable_midisynth": (4, [
+        (0.25, "midi", NoteOn(48, 100)),
+        (0.25, "midi", NoteOn(52, 100)),
+        (0.25, "midi", NoteOn(55, 100)),
+        (1.8, "midi", ControlChange(64, 127)),  # sustain pedal holds the chord past its note-offs
+        (2.0, "midi", NoteOff(48, 0)),
+        (2.0, "midi", NoteOff(52, 0)),
+        (2.0, "midi", NoteOff(55, 0)),
+        (2.3, "midi", ControlChange(64, 0)),
+        (2.5, "midi", NoteOn(60, 100)),
+        (3.0, "midi", ProgramChange(1)),  # wraps around to the only wavetable in the index
+        (3.5, "midi", NoteOff(60, 0)),
+    ]),
+    "eighties_arp": (4, [
+        (0, "knob", ("A0", 20000)),
+        (0, "knob", ("A1", 40000)),
+        (1.0, "key", (0, True)),
+        (1.05, "key", (0, False)),
+        (1.5, "midi", NoteOn(48, 100)),  # held notes get arpeggiated
+        (1.5, "midi", NoteOn(55, 100)),
+        (1.5, "midi", NoteOn(52, 100)),
+        (2.3, "midi", NoteOff(48, 0)),
+        (2.3, "midi", NoteOff(52, 0)),
+        (2.3, "midi", NoteOff(55, 0)),
+        (2.0, "knob", ("A0", 45000)),
+        (2.5, "key", (1, True)),
+        (2.55, "key", (1, False)),
+        (3.0, "midi", Start()),
+    ] + [(3.0 + i * 0.02 + (i * 7 % 5) * 0.001, "midi", TimingClock()) for i in range(50)]),  # 125 bpm, jittery
+    "multitimbral": (8, [  # startup measure() takes about 5 seconds
+        (5.5, "midi", NoteOn(36, 100, channel=0)),
+        (5.5, "midi", NoteOn(60, 100, channel=1)),
+        (5.5, "midi", NoteOn(64, 100, channel=1)),
+        (6.5, "midi", ControlChange(74, 90, channel=0)),
+        (7.0, "midi", NoteOff(36, 0, channel=0)),
+        (7.0, "midi", NoteOff(60, 0, channel=1)),
+        (7.0, "midi", NoteOff(64, 0, channel=1)),
+    ] + [(5.6 + i * 0.02, "midi", TimingClock()) for i in range(20)]),  # a DAW's clock, no channel
+    "derpnote2": (6, []),
+    "tiny_lfo_song": (10, []),  # some variants wait 8 secs before playing
+}
+DEFAULT_TRACE = (4, [])
+
+# (start, end) seconds of audio to estimate the pitch of, per example
+PITCH_CHECKS = {
+    "monosynth1": [(2.3, 2.5), (2.8, 3.0)],  # note 43 before, and at the top of, the bend
+}
+
+def estimate_pitch(audio, sample_rate, start, end, lo=40, hi=1000):
+    """Fundamental in Hz of audio from start to end seconds, by autocorrelation:
+    the shortest lag whose correlation is nearly as good as the best one"""
+    x = audio[int(start * sample_rate):int(end * sample_rate)].astype(float).mean(axis=1)
+    x -= x.mean()
+    spec = np.fft.rfft(x, 2 * len(x))
+    ac = np.fft.irfft(spec * np.conj(spec))[:len(x)]
+    lags = np.arange(int(sample_rate / hi), int(sample_rate / lo))
+    best = ac[lags].max()
+    if best <= 0:
+        return 0
+    lag = lags[np.nonzero(ac[lags] > 0.9 * best)[0][0]]
+    while lag + 1 < len(ac) and ac[lag + 1] > ac[lag]:  # up to the top of that peak
+        lag += 1
+    a, b, c = ac[lag - 1], ac[lag], ac[lag + 1]
+    shift = 0.5 * (a - c) / (a - 2 * b + c) if a - 2 * b + c else 0  # between samples
+    return sample_rate / (lag + shift)
+
+def fingerprint(audio, sample_rate, pitch_checks=()):
+    """RMS and spectral centroid of every BLOCK_TIME block of each channel of audio,
+    and the pitch of each (start, end) window in pitch_checks"""
+    n = int(sample_rate * BLOCK_TIME)
+    freqs = np.fft.rfftfreq(n, 1 / sample_rate)
+    fp = {"rms": [], "centroid": []}
+    for ch in range(audio.shape[1]):
+        samples = audio[:, ch].astype(float)
+        blocks = samples[:len(samples) // n * n].reshape(-1, n)
+        rms = np.sqrt((blocks ** 2).mean(axis=1))
+        spec = np.abs(np.fft.rfft(blocks * np.hanning(n), axis=1))
+        centroid = (spec * freqs).sum(axis=1) / np.maximum(spec.sum(axis=1), 1e-9)
+        fp["rms"].append([int(round(x)) for x in rms])
+        fp["centroid"].append([int(round(x)) for x in centroid])
+    if pitch_checks:
+        fp["pitch"] = [[start, end, round(float(estimate_pitch(audio, sample_rate, start, end)), 1)]
+                       for (start, end) in pitch_checks]
+    return fp
+
+def compare(fp, golden, sample_rate, channels):
+    """Return a list of problems, empty if fp (of audio at sample_rate, channels) matches golden"""
+    if golden.get("sample_rate") != sample_rate or golden.get("channels") != channels:
+        return ["%d Hz %d channels, golden is %s Hz %s channels" %
+                (sample_rate, channels, golden.get("sample_rate"), golden.get("channels"))]
+    if len(golden["rms"]) != channels or not isinstance(golden["rms"][0], list):
+        return ["golden has no per-channel fingerprint (run with --update)"]
+    problems = []
+    for ch in range(channels):
+        name = "" if channels == 1 else "ch%d " % ch
+        rms, centroid = fp["rms"][ch], fp["centroid"][ch]
+        golden_rms, golden_centroid = golden["rms"][ch], golden["centroid"][ch]
+        if len(rms) != len(golden_rms):
+            return ["length %d blocks, golden is %d" % (len(rms), len(golden_rms))]
+        for i, (a, b) in enumerate(zip(rms, golden_rms)):
+            if abs(a - b) > max(RMS_FLOOR, RMS_TOL * max(a, b)):
+                problems.append("%s%.1fs: rms %d, golden %d" % (name, i * BLOCK_TIME, a, b))
+        for i, (a, b) in enumerate(zip(centroid, golden_centroid)):
+            if golden_rms[i] < RMS_FLOOR * 4:
+                continue  # brightness of near-silence doesn't mean much
+            if abs(a - b) > max(CENTROID_FLOOR, CENTROID_TOL * max(a, b)):
+                problems.append("%s%.1fs: centroid %d Hz, golden %d Hz" % (name, i * BLOCK_TIME, a, b))
+    for (start, end, a), (_, _, b) in zip(fp.get("pitch", ()), golden.get("pitch", ())):
+        if abs(a - b) > PITCH_TOL * b:
+            problems.append("%.1f-%.1fs: pitch %.1f Hz, golden %.1f Hz" % (start, end, a, b))
+    if len(fp.get("pitch", ())) != len(golden.get("pitch", ())):
+        problems.append("%d pitch checks, golden has %d (run with --update)" %
+                        (len(fp.get("pitch", ())), len(golden.get("pitch", ()))))
+    return problems
+
+def find_variants(names):
+    paths = sorted(glob.glob(os.path.join(EXAMPLES_DIR, "*", "code*.py")))
+    variants = []
+    for p in paths:
+        example = os.path.basename(os.path.dirname(p))
+        if not names or example in names:
+            variants.append((example, os.path.basename(p)[:-3], p))
+    return variants
+
+def main():
+    parser = argparse.ArgumentParser(description="render every example & compare to goldens")
+    parser.add_argument("examples", nargs="*", help="example names to check (default: all)")
+    parser.add_argument("--update", action="store_true", help="save new golden fingerprints")
+    parser.add_argument("--wavs", help="directory to save rendered WAVs into")
+    args = parser.parse_args()
+
+    failed = 0
+    for (example, variant, path) in find_variants(args.examples):
+        duration, trace = TRACES.get(example, DEFAULT_TRACE)
+        run = HostRun(duration=duration, trace=trace)
+        name = "%s/%s" % (example, variant)
+        try:
+            audio = run.run(path)
+        except Exception as e:
+            print("%-36s ERROR %r" % (name, e))
+            failed += 1
+            continue
+        fp = fingerprint(audio, run.sample_rate, PITCH_CHECKS.get(example, ()))
+        golden_path = os.path.join(GOLDEN_DIR, "%s__%s.json" % (example, variant))
+        timing = "%5.2fs render %5.1fx realtime" % (run.render_time, duration / run.render_time)
+        if args.wavs:
+            os.makedirs(args.wavs, exist_ok=True)
+            write_wav(os.path.join(args.wavs, "%s__%s.wav" % (example, variant)), audio, run.sample_rate)
+        if args.update:
+            os.makedirs(GOLDEN_DIR, exist_ok=True)
+            with open(golden_path, "w") as f:
+                json.dump(dict(sample_rate=run.sample_rate, channels=run.channel_count,
+                               seconds=duration, block_time=BLOCK_TIME, **fp), f)
+                f.write("\n")
+            print("%-36s %s  saved" % (name, timing))
+            continue
+        if not os.path.exists(golden_path):
+            print("%-36s %s  NO GOLDEN (run with --update)" % (name, timing))
+            failed += 1
+            continue
+        with open(golden_path) as f:
+            problems = compare(fp, json.load(f), run.sample_rate, run.channel_count)
+        print("%-36s %s  %s" % (name, timing, "FAIL" if problems else "ok"))
+        for p in problems[:5]:
+            print("    ", p)
+        failed += bool(problems)
+    return 1 if failed else 0
+
+if __name__ == "__main__":
+    sys.exit(main())
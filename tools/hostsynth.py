@@ -0,0 +1,944 @@
+# hostsynth.py -- run the synthio examples on a desktop computer
+# part of https://github.com/todbot/circuitpython-synthio-tricks
+#
+# Pretends to be just enough of CircuitPython (synthio, audiomixer, the audio
+# outputs, board, ulab, adafruit_midi, neopixel, etc) to run the examples
+# under regular Python, so their sound can be rendered, tested, and timed.
+#
+# Time is virtual: time.sleep() moves the clock forward, and so does every
+# poll of the hardware (time.monotonic(), midi.receive(), knob.value, ...),
+# as a stand-in for how long a pass through the main loop takes.
+# Audio is rendered as the clock moves, 256 samples at a time like synthio,
+# so LFO values read by the example are as stale as they'd be on a real board.
+#
+# Use it like:
+#   run = HostRun(duration=4, trace=[(0.5, "midi", NoteOn(48, 100))])
+#   audio = run.run("examples/monosynth1/code.py")  # int16 array, (frames, channels)
+#   print(run.sample_rate, run.render_time)
+#   audio = run.run("examples/eighties_dystopia/code.py", overrides={"lpf_basef": 800})
+#
+# Needs numpy:  pip3 install numpy
+#
+
+import sys, os, io, ast, types, runpy, random, wave, contextlib, tracemalloc
+import gc as _real_gc
+import time as _real_time
+from collections import namedtuple
+import numpy as np
+
+LIB_DIR = os.path.join(os.path.dirname(os.path.abspath(__file__)), "..", "lib")
+
+SYNTHIO_BLOCK = 256  # synthio updates LFOs & envelopes every 256 samples
+MAX_POLYPHONY = 12   # CIRCUITPY_SYNTHIO_MAX_CHANNELS on RP2040
+HEAP_SIZE = 192 * 1024  # roughly what an RP2040 has free for Python
+
+_run = None  # the HostRun currently running, fake modules talk to it
+
+class RenderDone(BaseException):
+    """Raised inside the example when the virtual clock reaches the end,
+    a BaseException so the example's own try/excepts don't catch it"""
+    pass
+
+
+# --- synthio ---------------------------------------------------------------
+
+def midi_to_hz(midi_note):
+    return 440 * 2 ** ((midi_note - 69) / 12)
+
+def voct_to_hz(ctrl):
+    return midi_to_hz(60 + ctrl * 12)
+
+class EnvelopeState:
+    ATTACK = 1
+    DECAY = 2
+    SUSTAIN = 3
+    RELEASE = 4
+
+class Envelope(namedtuple("Envelope", "attack_time decay_time release_time attack_level sustain_level",
+                          defaults=(0.1, 0.05, 0.2, 1.0, 0.8))):
+    pass
+
+_instant_envelope = Envelope(attack_time=0, decay_time=0, release_time=0,
+                             attack_level=1, sustain_level=1)
+_square_wave = np.array((32767, -32767), dtype=np.int16)
+_triangle_wave = np.array((0, 32767, 0, -32767), dtype=np.int16)
+
+class _Block:
+    """ Something with a .value that synthio updates once per block (LFO, Math) """
+    _tick = -1
+    _value = 0.0
+
+    def _update(self, tick, dt):
+        if self._tick != tick:
+            self._tick = tick
+            self._value = self._compute(tick, dt)
+        return self._value
+
+    @property
+    def value(self):
+        return self._value
+
+def _val(x, tick, dt):
+    return x._update(tick, dt) if isinstance(x, _Block) else float(x)
+
+def _wave_array(w):
+    # waveforms can be ulab arrays, memoryviews, or anything else with int16 samples
+    if w is None:
+        return None
+    if isinstance(w, np.ndarray):
+        return w
+    if isinstance(w, memoryview):
+        return np.frombuffer(w.cast("B"), dtype=np.int16)
+    return np.asarray(w, dtype=np.int16)
+
+WAVEFORM_MAX_LEN = 16384  # synthio won't take a longer Note waveform
+
+def _check_waveform(w, name):
+    if w is not None and len(w) > WAVEFORM_MAX_LEN:
+        raise ValueError("%s length must be <= %d" % (name, WAVEFORM_MAX_LEN))
+    return w
+
+class LFO(_Block):
+    def __init__(self, waveform=None, *, rate=1, scale=1, offset=0, phase_offset=0,
+                 once=False, interpolate=True):
+        self.waveform = waveform
+        self.rate = rate
+        self.scale = scale
+        self.offset = offset
+        self.phase_offset = phase_offset
+        self.once = once
+        self.interpolate = interpolate
+        self._phase = 0.0
+
+    @property
+    def phase(self):
+        return self._phase
+
+    def retrigger(self):
+        self._phase = 0.0
+
+    def _compute(self, tick, dt):
+        rate = _val(self.rate, tick, dt)
+        scale = _val(self.scale, tick, dt)
+        offset = _val(self.offset, tick, dt)
+        p = self._phase + _val(self.phase_offset, tick, dt)
+        if not self.once:
+            p = p % 1
+        w = _wave_array(self.waveform)
+        w = _triangle_wave if w is None else w
+        n = len(w)
+        # like synthio, a once LFO goes from its first sample to its last and stays there
+        pos = min(max(p, 0), 1) * (n - 1 if self.once else n)
+        i = int(pos)
+        if self.interpolate:
+            frac = pos - i
+            j = min(i + 1, n - 1) if self.once else (i + 1) % n
+            v = w[i % n] * (1 - frac) + w[j] * frac
+        else:
+            v = w[i % n]
+        self._phase += rate * dt
+        self._phase = min(self._phase, 1.0) if self.once else self._phase % 1
+        return offset + scale * v / 32768
+
+class _Operation:
+    def __init__(self, name, fn):
+        self.name = name
+        self.fn = fn
+    def __repr__(self):
+        return "synthio.MathOperation." + self.name
+
+def _constrained_lerp(a, b, c):
+    c = min(max(c, 0), 1)
+    return a * (1 - c) + b * c
+
+class MathOperation:
+    SUM = _Operation("SUM", lambda a,b,c: a + b + c)
+    ADD_SUB = _Operation("ADD_SUB", lambda a,b,c: a + b - c)
+    PRODUCT = _Operation("PRODUCT", lambda a,b,c: a * b * c)
+    MUL_DIV = _Operation("MUL_DIV", lambda a,b,c: a * b / c if c else 0)
+    SCALE_OFFSET = _Operation("SCALE_OFFSET", lambda a,b,c: a * b + c)
+    OFFSET_SCALE = _Operation("OFFSET_SCALE", lambda a,b,c: (a + b) * c)
+    LERP = _Operation("LERP", lambda a,b,c: a * (1 - c) + b * c)
+    CONSTRAINED_LERP = _Operation("CONSTRAINED_LERP", _constrained_lerp)
+    DIV_ADD = _Operation("DIV_ADD", lambda a,b,c: a / b + c if b else c)
+    ADD_DIV = _Operation("ADD_DIV", lambda a,b,c: (a + b) / c if c else 0)
+    MID = _Operation("MID", lambda a,b,c: sorted((a, b, c))[1])
+    MAX = _Operation("MAX", lambda a,b,c: max(a, b, c))
+    MIN = _Operation("MIN", lambda a,b,c: min(a, b, c))
+    ABS = _Operation("ABS", lambda a,b,c: abs(a))
+
+class Math(_Block):
+    def __init__(self, operation, a, b=0.0, c=1.0):
+        self.operation = operation
+        self.a = a
+        self.b = b
+        self.c = c
+
+    def _compute(self, tick, dt):
+        return self.operation.fn(_val(self.a, tick, dt), _val(self.b, tick, dt), _val(self.c, tick, dt))
+
+class Biquad:
+    """ Filter coefficients, from the RBJ Audio EQ Cookbook like synthio uses """
+    def __init__(self, kind, frequency, Q, sample_rate):
+        self.kind = kind
+        self.frequency = frequency
+        self.Q = Q
+        w0 = 2 * np.pi * min(max(frequency, 1), sample_rate * 0.49) / sample_rate
+        cw, alpha = np.cos(w0), np.sin(w0) / (2 * max(Q, 0.01))
+        if kind == "lpf":
+            b = ((1 - cw) / 2, 1 - cw, (1 - cw) / 2)
+        elif kind == "hpf":
+            b = ((1 + cw) / 2, -(1 + cw), (1 + cw) / 2)
+        else:  # bpf, constant 0 dB peak gain
+            b = (alpha, 0, -alpha)
+        a0 = 1 + alpha
+        self.coeffs = (b[0]/a0, b[1]/a0, b[2]/a0, (-2 * cw)/a0, (1 - alpha)/a0)
+
+def _biquad(x, coeffs, state):
+    b0, b1, b2, a1, a2 = coeffs
+    x1, x2, y1, y2 = state
+    out = []
+    for xi in x.tolist():
+        yi = b0*xi + b1*x1 + b2*x2 - a1*y1 - a2*y2
+        x2, x1, y2, y1 = x1, xi, y1, yi
+        out.append(yi)
+    state[:] = (x1, x2, y1, y2)
+    return np.array(out)
+
+class Note:
+    def __init__(self, frequency, *, panning=0.0, waveform=None, waveform_loop_start=0,
+                 waveform_loop_end=None, envelope=None, amplitude=1.0, bend=0.0, filter=None,
+                 ring_frequency=0.0, ring_bend=0.0, ring_waveform=None):
+        self.frequency = frequency
+        self.panning = panning
+        self.waveform = waveform
+        self.waveform_loop_start = waveform_loop_start
+        self.waveform_loop_end = waveform_loop_end
+        self.envelope = envelope
+        self.amplitude = amplitude
+        self.bend = bend
+        self.filter = filter
+        self.ring_frequency = ring_frequency
+        self.ring_bend = ring_bend
+        self.ring_waveform = ring_waveform
+
+    waveform = property(lambda self: self._waveform,
+                        lambda self, w: setattr(self, "_waveform", _check_waveform(w, "waveform")))
+    ring_waveform = property(lambda self: self._ring_waveform,
+                             lambda self, w: setattr(self, "_ring_waveform", _check_waveform(w, "ring_waveform")))
+
+class _Voice:
+    """ A pressed Note and where it is in its waveform & envelope """
+    def __init__(self, note):
+        self.note = note
+        self.phase = 0.0
+        self.ring_phase = 0.0
+        self.state = EnvelopeState.ATTACK
+        self.level = 0.0
+        self.release_level = 0.0
+        self.filter_state = [0.0, 0.0, 0.0, 0.0]
+
+    def press(self):
+        self.state = EnvelopeState.ATTACK  # restarts from current level, like synthio
+
+    def release(self):
+        if self.state != EnvelopeState.RELEASE:
+            self.state = EnvelopeState.RELEASE
+            self.release_level = self.level
+
+    def step_envelope(self, env, dt):
+        """Move envelope one block along, return False when the voice is done"""
+        if self.state == EnvelopeState.ATTACK:
+            if env.attack_time <= 0:
+                self.level = env.attack_level
+            else:
+                self.level += env.attack_level * dt / env.attack_time
+            if self.level >= env.attack_level:
+                self.level = env.attack_level
+                self.state = EnvelopeState.DECAY
+        elif self.state == EnvelopeState.DECAY:
+            if env.decay_time <= 0:
+                self.level = env.sustain_level
+            else:
+                step = abs(env.attack_level - env.sustain_level) * dt / env.decay_time
+                if self.level > env.sustain_level:
+                    self.level = max(self.level - step, env.sustain_level)
+                else:
+                    self.level = min(self.level + step, env.sustain_level)
+            if self.level == env.sustain_level:
+                self.state = EnvelopeState.SUSTAIN
+        elif self.state == EnvelopeState.SUSTAIN:
+            self.level = env.sustain_level
+        else:
+            if env.release_time <= 0:
+                self.level = 0
+            else:
+                self.level -= self.release_level * dt / env.release_time
+            if self.level <= 0:
+                self.level = 0
+                return False
+        return True
+
+def _as_notes(notes):
+    if isinstance(notes, (Note, int)):
+        return (notes,)
+    return tuple(notes)
+
+class Synthesizer:
+    def __init__(self, *, sample_rate=11025, channel_count=1, waveform=None, envelope=None):
+        self.sample_rate = sample_rate
+        self.channel_count = channel_count
+        self.waveform = waveform
+        self.envelope = envelope
+        self.blocks = []
+        self.max_polyphony = MAX_POLYPHONY
+        self._voices = {}  # key = Note or midi note number, value = _Voice
+        self._tick = 0
+        self._leftover = np.zeros((0, channel_count))
+
+    def press(self, notes=()):
+        for n in _as_notes(notes):
+            if n in self._voices:
+                self._voices[n].press()
+            elif len(self._voices) < self.max_polyphony:
+                note = Note(midi_to_hz(n)) if isinstance(n, int) else n
+                self._voices[n] = _Voice(note)
+
+    def release(self, notes=()):
+        for n in _as_notes(notes):
+            if n in self._voices:
+                self._voices[n].release()
+
+    def release_then_press(self, release=(), press=()):
+        self.release(release)
+        self.press(press)
+
+    def change(self, release=(), press=(), retrigger=()):
+        self.release(release)
+        self.press(press)
+        self.press(retrigger)
+
+    def release_all(self):
+        self.release(tuple(self._voices))
+
+    def release_all_then_press(self, press=()):
+        self.release_all()
+        self.press(press)
+
+    @property
+    def pressed(self):
+        return tuple(n for n,v in self._voices.items() if v.state != EnvelopeState.RELEASE)
+
+    def note_info(self, note):
+        v = self._voices.get(note)
+        if v is None:
+            return (None, 0.0)
+        return (v.state, v.level)
+
+    def low_pass_filter(self, frequency, Q=0.7071067811865475):
+        return Biquad("lpf", frequency, Q, self.sample_rate)
+
+    def high_pass_filter(self, frequency, Q=0.7071067811865475):
+        return Biquad("hpf", frequency, Q, self.sample_rate)
+
+    def band_pass_filter(self, frequency, Q=0.7071067811865475):
+        return Biquad("bpf", frequency, Q, self.sample_rate)
+
+    def deinit(self):
+        self._voices.clear()
+
+    def _render_block(self):
+        self._tick += 1
+        tick, n, ch = self._tick, SYNTHIO_BLOCK, self.channel_count
+        dt = n / self.sample_rate
+        for b in self.blocks:
+            _val(b, tick, dt)
+        out = np.zeros((n, ch))
+        ramp = np.arange(n)
+        for key, v in list(self._voices.items()):
+            note = v.note
+            env = note.envelope or self.envelope or _instant_envelope
+            level0 = v.level
+            if not v.step_envelope(env, dt):
+                del self._voices[key]
+                continue
+            wave = _wave_array(note.waveform if note.waveform is not None else self.waveform)
+            wave = _square_wave if wave is None else wave
+            f = _val(note.frequency, tick, dt) * 2 ** _val(note.bend, tick, dt)
+            wlen = len(wave)
+            inc = f * wlen / self.sample_rate
+            samples = wave[((v.phase + inc * ramp).astype(np.int64)) % wlen].astype(float)
+            v.phase = (v.phase + inc * n) % wlen
+            if note.ring_frequency:
+                rwave = _wave_array(note.ring_waveform)
+                rwave = _square_wave if rwave is None else rwave
+                rf = _val(note.ring_frequency, tick, dt) * 2 ** _val(note.ring_bend, tick, dt)
+                rinc = rf * len(rwave) / self.sample_rate
+                samples *= rwave[((v.ring_phase + rinc * ramp).astype(np.int64)) % len(rwave)] / 32768
+                v.ring_phase = (v.ring_phase + rinc * n) % len(rwave)
+            samples *= np.linspace(level0, v.level, n) * _val(note.amplitude, tick, dt)
+            if note.filter is not None:
+                samples = _biquad(samples, note.filter.coeffs, v.filter_state)
+            if ch == 2:
+                pan = min(max(_val(note.panning, tick, dt), -1), 1)
+                out[:, 0] += samples * min(1, 1 - pan)
+                out[:, 1] += samples * min(1, 1 + pan)
+            else:
+                out[:, 0] += samples
+        return out
+
+    def _render(self, n):
+        bufs = [self._leftover]
+        have = len(self._leftover)
+        while have < n:
+            b = self._render_block()
+            bufs.append(b)
+            have += len(b)
+        buf = np.concatenate(bufs)
+        self._leftover = buf[n:]
+        return buf[:n]
+
+
+# --- audiomixer & audio outputs -------------------------------------------
+
+def _match_channels(buf, ch):
+    if buf.shape[1] == ch:
+        return buf
+    if ch == 2:
+        return np.repeat(buf, 2, axis=1)
+    return buf.mean(axis=1, keepdims=True)
+
+class MixerVoice:
+    def __init__(self):
+        self.level = 1.0
+        self._sample = None
+        self.loop = False
+
+    def play(self, sample, *, loop=False):
+        self._sample = sample
+        self.loop = loop
+
+    def stop(self):
+        self._sample = None
+
+    @property
+    def playing(self):
+        return self._sample is not None
+
+class Mixer:
+    def __init__(self, voice_count=2, buffer_size=1024, channel_count=2, bits_per_sample=16,
+                 samples_signed=True, sample_rate=8000):
+        self.sample_rate = sample_rate
+        self.channel_count = channel_count
+        self.buffer_size = buffer_size
+        self.bits_per_sample = bits_per_sample
+        self.voice = tuple(MixerVoice() for i in range(voice_count))
+
+    def play(self, sample, *, voice=0, loop=False):
+        self.voice[voice].play(sample, loop=loop)
+
+    def stop_voice(self, voice=0):
+        self.voice[voice].stop()
+
+    @property
+    def playing(self):
+        return any(v.playing for v in self.voice)
+
+    def deinit(self):
+        pass
+
+    def _render(self, n):
+        out = np.zeros((n, self.channel_count))
+        for v in self.voice:
+            if v._sample is not None:
+                out += _match_channels(v._sample._render(n), self.channel_count) * float(v.level)
+        return np.clip(out, -32768, 32767)
+
+class _AudioOut:
+    """ Stands in for PWMAudioOut, I2SOut, and AudioOut, records what it plays """
+    def __init__(self, *args, **kwargs):
+        self._source = None
+        self._frames = 0
+        self.paused = False
+        _run._outputs.append(self)
+
+    def play(self, sample, *, loop=False):
+        self._source = sample
+        _run._start_recording(self, sample)
+        self._frames = int(_run.clock * sample.sample_rate)
+
+    def stop(self):
+        self._source = None
+
+    def pause(self):
+        self.paused = True
+
+    def resume(self):
+        self.paused = False
+
+    @property
+    def playing(self):
+        return self._source is not None
+
+    def deinit(self):
+        self._source = None
+
+    def _render_until(self, t):
+        src = self._source
+        if src is None:
+            return
+        target = int(t * src.sample_rate)
+        while self._frames + SYNTHIO_BLOCK <= target:
+            buf = src._render(SYNTHIO_BLOCK)
+            if self.paused:
+                buf = buf * 0
+            _run._record(self, buf)
+            self._frames += SYNTHIO_BLOCK
+
+
+# --- MIDI -------------------------------------------------------------------
+
+class MIDIMessage:
+    channel = 0  # 0-15, like adafruit_midi
+
+class NoteOn(MIDIMessage):
+    def __init__(self, note, velocity=127, *, channel=None):
+        self.note, self.velocity = note, velocity
+        self.channel = channel or 0
+
+class NoteOff(MIDIMessage):
+    def __init__(self, note, velocity=0, *, channel=None):
+        self.note, self.velocity = note, velocity
+        self.channel = channel or 0
+
+class ControlChange(MIDIMessage):
+    def __init__(self, control, value, *, channel=None):
+        self.control, self.value = control, value
+        self.channel = channel or 0
+
+class ProgramChange(MIDIMessage):
+    def __init__(self, patch, *, channel=None):
+        self.patch = patch
+        self.channel = channel or 0
+
+class PitchBend(MIDIMessage):
+    def __init__(self, pitch_bend, *, channel=None):
+        self.pitch_bend = pitch_bend  # 0-16383, 8192 is center
+        self.channel = channel or 0
+
+class SystemMessage(MIDIMessage):
+    channel = None  # like adafruit_midi, system messages have no channel
+
+class TimingClock(SystemMessage):
+    pass
+
+class Start(SystemMessage):
+    pass
+
+class Stop(SystemMessage):
+    pass
+
+class Continue(SystemMessage):
+    pass
+
+def _midi_bytes(msg):
+    # the bytes a message is sent as, for code that reads raw bytes from a port
+    ch = msg.channel
+    if isinstance(msg, NoteOn):
+        return bytes((0x90 | ch, msg.note, msg.velocity))
+    if isinstance(msg, NoteOff):
+        return bytes((0x80 | ch, msg.note, msg.velocity))
+    if isinstance(msg, ControlChange):
+        return bytes((0xB0 | ch, msg.control, msg.value))
+    if isinstance(msg, ProgramChange):
+        return bytes((0xC0 | ch, msg.patch))
+    if isinstance(msg, PitchBend):
+        return bytes((0xE0 | ch, msg.pitch_bend & 0x7f, msg.pitch_bend >> 7))
+    return bytes(({TimingClock: 0xF8, Start: 0xFA, Continue: 0xFB, Stop: 0xFC}[type(msg)],))
+
+class MIDI:
+    def __init__(self, midi_in=None, midi_out=None, *, in_channel=None, out_channel=0,
+                 in_buf_size=30, debug=False):
+        self.in_channel = in_channel
+        self.out_channel = out_channel
+        self.midi_in = midi_in
+
+    def receive(self):
+        _run.poll()
+        if self.midi_in is None:
+            return None
+        msg = _run._next_input("midi")
+        if msg is None:
+            return None
+        ch = self.in_channel
+        if ch is None or ch == msg.channel or isinstance(ch, tuple) and msg.channel in ch \
+           or not isinstance(msg, (NoteOn, NoteOff, ControlChange, ProgramChange, PitchBend)):
+            return msg
+        return None
+
+    def send(self, msg, channel=None):
+        _run.midi_sent.append(msg)
+
+
+# --- other hardware ---------------------------------------------------------
+
+class Pin:
+    def __init__(self, name):
+        self.name = name
+    def __repr__(self):
+        return "board." + self.name
+
+class _Board(types.ModuleType):
+    def __getattr__(self, name):
+        if name.startswith("__"):
+            raise AttributeError(name)
+        return Pin(name)
+
+class Direction:
+    INPUT = 0
+    OUTPUT = 1
+
+class Pull:
+    UP = 1
+    DOWN = 2
+
+class DriveMode:
+    PUSH_PULL = 0
+    OPEN_DRAIN = 1
+
+class DigitalInOut:
+    def __init__(self, pin):
+        self.pin = pin
+        self.direction = Direction.INPUT
+        self.pull = None
+        self.value = False
+    def switch_to_output(self, value=False, drive_mode=DriveMode.PUSH_PULL):
+        self.direction, self.value = Direction.OUTPUT, value
+    def switch_to_input(self, pull=None):
+        self.direction, self.pull = Direction.INPUT, pull
+    def deinit(self):
+        pass
+
+class AnalogIn:
+    reference_voltage = 3.3
+    def __init__(self, pin):
+        self.pin = pin
+    @property
+    def value(self):
+        _run.poll()
+        return _run._knob(self.pin.name)
+    def deinit(self):
+        pass
+
+class Event:
+    def __init__(self, key_number=0, pressed=True, timestamp=None):
+        self.key_number = key_number
+        self.pressed = pressed
+        self.released = not pressed
+        self.timestamp = timestamp
+
+class EventQueue:
+    overflowed = False
+    def get(self):
+        _run.poll()
+        key = _run._next_input("key")
+        if key is None:
+            return None
+        return Event(key[0], key[1], int(_run.clock * 1000))
+    def get_into(self, event):
+        e = self.get()
+        if e is None:
+            return False
+        event.key_number, event.pressed, event.released = e.key_number, e.pressed, e.released
+        return True
+    def clear(self):
+        pass
+    def __len__(self):
+        return 0
+
+class Keys:
+    def __init__(self, pins, *, value_when_pressed, pull=True, interval=0.02, max_events=64):
+        self.key_count = len(pins)
+        self.events = EventQueue()
+    def reset(self):
+        pass
+    def deinit(self):
+        pass
+
+class NeoPixel:
+    def __init__(self, pin, n, *, bpp=3, brightness=1.0, auto_write=True, pixel_order=None):
+        self.n = n
+        self.brightness = brightness
+        self.auto_write = auto_write
+        self._pixels = [(0, 0, 0)] * n
+        self.writes = 0  # how many times we'd have pushed data out to the LEDs
+    def __len__(self):
+        return self.n
+    def __getitem__(self, i):
+        return self._pixels[i]
+    def __setitem__(self, i, color):
+        self._pixels[i] = color
+        if self.auto_write:
+            self.show()
+    def fill(self, color):
+        self._pixels = [color] * self.n
+        if self.auto_write:
+            self.show()
+    def show(self):
+        self.writes += 1
+    def deinit(self):
+        pass
+
+def colorwheel(pos):
+    pos = int(pos) % 256
+    if pos < 85:
+        return ((255 - pos * 3) << 16) | ((pos * 3) << 8)
+    if pos < 170:
+        pos -= 85
+        return ((255 - pos * 3) << 8) | (pos * 3)
+    pos -= 170
+    return ((pos * 3) << 16) | (255 - pos * 3)
+
+class UART:
+    def __init__(self, tx=None, rx=None, *, baudrate=9600, timeout=1, **kwargs):
+        self.baudrate = baudrate
+        self.in_waiting = 0
+    def read(self, nbytes=None):
+        return None
+    def write(self, buf):
+        return len(buf)
+    def deinit(self):
+        pass
+
+class _PortIn:
+    """ usb_midi input port, gives the trace's "midi" events as raw bytes """
+    def readinto(self, buf, nbytes=None):
+        _run.poll()
+        nbytes = len(buf) if nbytes is None else nbytes
+        n = 0
+        q = _run._queues.get("midi")
+        while q and q[0][0] <= _run.clock:
+            b = _midi_bytes(q[0][1])
+            if n + len(b) > nbytes:
+                break
+            buf[n:n+len(b)] = b
+            n += len(b)
+            q.pop(0)
+        return n or None
+
+    def read(self, nbytes=None):
+        buf = bytearray(nbytes or 64)
+        n = self.readinto(buf)
+        return bytes(buf[:n]) if n else None
+
+class _PortOut:
+    def write(self, buf, n=None):
+        return len(buf)
+
+
+# --- putting it all together -----------------------------------------------
+
+def _module(name, **attrs):
+    m = types.ModuleType(name)
+    m.__dict__.update(attrs)
+    return m
+
+def _fake_time():
+    def monotonic():
+        _run.poll()
+        return _run.clock
+    def monotonic_ns():
+        _run.poll()
+        return int(_run.clock * 1_000_000_000)
+    def sleep(secs):
+        _run.advance(max(secs, 0))
+    m = _module("time", monotonic=monotonic, monotonic_ns=monotonic_ns, sleep=sleep,
+                time=lambda: int(_run.clock))
+    m.__getattr__ = lambda name: getattr(_real_time, name)  # anything else, use the real one
+    return m
+
+def _fake_gc():
+    # CPython allocates differently than CircuitPython, and tracemalloc only sees
+    # memory still held (not short-lived temporaries), so this only finds growth & leaks
+    def mem_alloc():
+        if not tracemalloc.is_tracing():
+            tracemalloc.start()
+        return tracemalloc.get_traced_memory()[0]
+    def mem_free():
+        return max(HEAP_SIZE - mem_alloc(), 0)
+    return _module("gc", mem_alloc=mem_alloc, mem_free=mem_free, collect=_real_gc.collect,
+                   enable=_real_gc.enable, disable=_real_gc.disable, isenabled=_real_gc.isenabled,
+                   threshold=lambda amount=None: -1)
+
+def fake_modules():
+    """Make the stand-in CircuitPython modules, keyed by import name"""
+    mods = {}
+    mods["time"] = _fake_time()
+    mods["gc"] = _fake_gc()
+    mods["board"] = _Board("board")
+    mods["microcontroller"] = _module("microcontroller", Pin=Pin)
+    mods["digitalio"] = _module("digitalio", DigitalInOut=DigitalInOut, Direction=Direction,
+                                Pull=Pull, DriveMode=DriveMode)
+    mods["analogio"] = _module("analogio", AnalogIn=AnalogIn)
+    mods["keypad"] = _module("keypad", Keys=Keys, KeyMatrix=Keys, ShiftRegisterKeys=Keys,
+                             Event=Event, EventQueue=EventQueue)
+    mods["neopixel"] = _module("neopixel", NeoPixel=NeoPixel, GRB="GRB", RGB="RGB")
+    mods["rainbowio"] = _module("rainbowio", colorwheel=colorwheel)
+    mods["busio"] = _module("busio", UART=UART)
+    mods["usb_midi"] = _module("usb_midi", ports=(_PortIn(), _PortOut()))
+    mods["audiopwmio"] = _module("audiopwmio", PWMAudioOut=_AudioOut)
+    mods["audiobusio"] = _module("audiobusio", I2SOut=_AudioOut)
+    mods["audioio"] = _module("audioio", AudioOut=_AudioOut)
+    mods["audiomixer"] = _module("audiomixer", Mixer=Mixer, MixerVoice=MixerVoice)
+    mods["synthio"] = _module("synthio", Synthesizer=Synthesizer, Note=Note, LFO=LFO,
+                              Math=Math, MathOperation=MathOperation, Envelope=Envelope,
+                              EnvelopeState=EnvelopeState, Biquad=Biquad,
+                              midi_to_hz=midi_to_hz, voct_to_hz=voct_to_hz)
+    mods["ulab"] = _module("ulab", numpy=np)
+    mods["ulab.numpy"] = np
+    mods["adafruit_wave"] = _module("adafruit_wave", open=lambda f, mode="rb": wave.open(f, mode))
+    midi_msgs = {"note_on": NoteOn, "note_off": NoteOff, "control_change": ControlChange,
+                 "program_change": ProgramChange, "pitch_bend": PitchBend,
+                 "timing_clock": TimingClock, "start": Start, "stop": Stop,
+                 "midi_continue": Continue}
+    mods["adafruit_midi"] = _module("adafruit_midi", MIDI=MIDI, MIDIMessage=MIDIMessage)
+    for subname, cls in midi_msgs.items():
+        sub = _module("adafruit_midi." + subname, **{cls.__name__: cls})
+        mods["adafruit_midi." + subname] = sub
+        setattr(mods["adafruit_midi"], subname, sub)
+    return mods
+
+def override_settings(path, overrides):
+    """Compile the example at path with the first top-level `name = ...` for each
+    name in overrides replaced by `name = value`, so its settings can be swept"""
+    with open(path) as f:
+        tree = ast.parse(f.read(), filename=path)
+    todo = dict(overrides)
+    for stmt in tree.body:
+        if not (isinstance(stmt, ast.Assign) and len(stmt.targets) == 1
+                and isinstance(stmt.targets[0], ast.Name)):
+            continue
+        name = stmt.targets[0].id
+        if name in todo:
+            stmt.value = ast.copy_location(ast.parse(repr(todo.pop(name)), mode="eval").body, stmt.value)
+    if todo:
+        raise ValueError("no top-level setting named %s in %s" % (", ".join(sorted(todo)), path))
+    return compile(ast.fix_missing_locations(tree), path, "exec")
+
+class HostRun:
+    """ Run one example for 'duration' seconds of virtual time, feeding it 'trace',
+    a list of (time, kind, data) inputs where kind & data are one of:
+      "midi", a NoteOn/NoteOff/ControlChange/etc message
+      "knob", (pin_name, value 0-65535)   e.g. (1.0, "knob", ("A0", 32000))
+      "key", (key_number, pressed)        e.g. (2.0, "key", (0, True))
+    """
+    def __init__(self, duration=4.0, trace=(), poll_time=0.0005, seed=0, quiet=True):
+        self.duration = duration
+        self.trace = sorted(trace, key=lambda ev: ev[0])
+        self.poll_time = poll_time  # how much time each hardware poll takes
+        self.seed = seed
+        self.quiet = quiet
+        self.clock = 0.0
+        self.sample_rate = None
+        self.channel_count = None
+        self.render_time = 0  # wall-clock seconds it took to run
+        self.stdout = ""
+        self.midi_sent = []
+        self.modules = {}
+
+    def poll(self):
+        self.advance(self.poll_time)
+
+    def advance(self, dt):
+        self.clock += dt
+        for out in self._outputs:
+            out._render_until(min(self.clock, self.duration))
+        if self.clock >= self.duration:
+            raise RenderDone()
+
+    def _start_recording(self, out, source):
+        if self._recording is None:
+            self._recording = out
+            self.sample_rate = source.sample_rate
+            self.channel_count = source.channel_count
+            lead = int(self.clock * source.sample_rate)  # silence before audio started
+            self._bufs.append(np.zeros((lead, source.channel_count)))
+
+    def _record(self, out, buf):
+        if out is self._recording:
+            self._bufs.append(buf)
+
+    def _next_input(self, kind):
+        q = self._queues.get(kind)
+        if q and q[0][0] <= self.clock:
+            return q.pop(0)[1]
+        return None
+
+    def _knob(self, pin_name):
+        q = self._queues.get("knob", [])
+        while q and q[0][0] <= self.clock:
+            name, val = q.pop(0)[1]
+            self._knobs[name] = val
+        return self._knobs.get(pin_name, 32768)
+
+    def run(self, path, init_globals=None, overrides=None):
+        """Run the example at path, return its audio as int16 array of (frames, channels).
+        overrides is a dict of top-level settings to change, see override_settings()"""
+        global _run
+        path = os.path.abspath(path)
+        example_dir = os.path.dirname(path)
+        self.clock = 0.0
+        self._outputs = []
+        self._recording = None
+        self._bufs = []
+        self._knobs = {}
+        self._queues = {}
+        for (t, kind, data) in self.trace:
+            self._queues.setdefault(kind, []).append((t, data))
+        self.modules = fake_modules()
+        saved_modules = dict(sys.modules)
+        saved_path = list(sys.path)
+        saved_cwd = os.getcwd()
+        stdout = io.StringIO()
+        _run = self
+        sys.modules.update(self.modules)
+        sys.path[:0] = [example_dir, LIB_DIR]
+        os.chdir(example_dir)
+        random.seed(self.seed)
+        t0 = _real_time.perf_counter()
+        try:
+            with contextlib.redirect_stdout(stdout if self.quiet else sys.stdout):
+                try:
+                    if overrides:
+                        code = override_settings(path, overrides)
+                        exec(code, dict(init_globals or {}, __name__="__main__", __file__=path))
+                    else:
+                        runpy.run_path(path, init_globals=init_globals, run_name="__main__")
+                    while True:  # example finished early, let audio play out
+                        self.advance(0.1)
+                except RenderDone:
+                    pass
+        finally:
+            self.render_time = _real_time.perf_counter() - t0
+            if tracemalloc.is_tracing():  # the example used gc.mem_alloc()
+                tracemalloc.stop()
+            os.chdir(saved_cwd)
+            sys.path[:] = saved_path
+            for name in list(sys.modules):  # forget the fakes & anything the example imported
+                if name not in saved_modules:
+                    del sys.modules[name]
+            sys.modules.update(saved_modules)
+            _run = None
+        self.stdout = stdout.getvalue()
+        if self._recording is None:
+            raise ValueError("example never played any audio: " + path)
+        audio = np.concatenate(self._bufs)[:int(self.duration * self.sample_rate)]
+        return np.clip(audio, -32768, 32767).astype(np.int16)
+
+def write_wav(filename, audio, sample_rate):
+    """Save an int16 (frames, channels) array as a WAV file"""
+    with wave.open(filename, "wb") as w:
+        w.setnchannels(audio.shape[1])
+        w.setsampwidth(2)
+        w.setframerate(sample_rate)
+        w.writeframes(audio.astype("<i2").tobytes())
@@ -0,0 +1,89 @@
+#!/usr/bin/env python3
+# latency_render.py -- measure note-on to sound latency of an example, from its audio
+# part of https://github.com/todbot/circuitpython-synthio-tricks
+#
+# Plays an example a row of short notes with hostsynth.py, then looks for the
+# first sample of each note in the rendered audio (an onset detector, like a
+# loopback cable from the audio out to a scope), and reports how late each one
+# was compared to when its note-on was sent.  Note-ons are sent a little off
+# the synth's 256-sample block grid, so the spread shows the block rounding too.
+#
+# The host renders audio as its virtual clock moves, with no mixer buffers,
+# so this is the Python & synth part of the latency.  On a board, add the
+# mixer's 1 to 2 buffer times (lib/latency.py works it out, and times each stage).
+# If the example has a `measure_latency` setting, it's turned on, and its own
+# stage report is printed too.
+#
+# Use it like:
+#   python3 tools/latency_render.py                  # monosynth1
+#   python3 tools/latency_render.py wavetable_midisynth --notes 20 --gap 0.4
+#
+
+import sys, os, argparse
+import numpy as np
+from hostsynth import HostRun, NoteOn, NoteOff
+from golden_render import EXAMPLES_DIR
+
+def note_trace(num_notes, start, gap, note=48):
+    """num_notes short notes, gap seconds apart, a little off the block grid,
+    released early so each one has died away before the next"""
+    trace = []
+    for i in range(num_notes):
+        t = start + i * gap + (i * 0.0037) % 0.011
+        trace.append((t, "midi", NoteOn(note + (i * 5) % 12, 100)))
+        trace.append((t + gap / 10, "midi", NoteOff(note + (i * 5) % 12, 0)))
+    return trace
+
+def find_onsets(audio, sample_rate, times, threshold=16, lookahead=0.2):
+    """For each time in times, the time of the first sample of a new sound after it, or None:
+    the first sample louder than threshold and twice the loudest of the 10 ms before"""
+    mono = np.abs(audio.astype(float)).max(axis=1)
+    onsets = []
+    for t in times:
+        i = int(t * sample_rate)
+        before = mono[max(i - sample_rate // 100, 0):i]
+        floor = max(threshold, 2 * before.max()) if len(before) else threshold
+        after = mono[i:i + int(lookahead * sample_rate)]
+        loud = np.nonzero(after > floor)[0]
+        onsets.append((i + loud[0]) / sample_rate if len(loud) else None)
+    return onsets
+
+def main():
+    parser = argparse.ArgumentParser(description="measure note-on latency from rendered audio")
+    parser.add_argument("example", nargs="?", default="monosynth1", help="example name (default: monosynth1)")
+    parser.add_argument("--variant", default="code", help="which code*.py to run (default: code)")
+    parser.add_argument("--notes", type=int, default=12, help="how many notes to play")
+    parser.add_argument("--gap", type=float, default=1.0, help="seconds between notes, long enough for releases")
+    parser.add_argument("--threshold", type=int, default=16, help="sample level that counts as sound")
+    parser.add_argument("--start", type=float, default=0.5, help="when the first note is sent")
+    args = parser.parse_args()
+
+    path = os.path.join(EXAMPLES_DIR, args.example, args.variant + ".py")
+    trace = note_trace(args.notes, args.start, args.gap)
+    run = HostRun(duration=args.start + args.notes * args.gap + 0.5, trace=trace)
+    try:
+        audio = run.run(path, overrides={"measure_latency": True})
+    except ValueError as e:
+        if "measure_latency" not in str(e):
+            raise
+        audio = run.run(path)
+    times = [t for (t, kind, msg) in trace if isinstance(msg, NoteOn)]
+    onsets = find_onsets(audio, run.sample_rate, times, args.threshold)
+    ms = []
+    for t, onset in zip(times, onsets):
+        if onset is None:
+            print("note at %.4fs: no onset found" % t)
+        else:
+            ms.append((onset - t) * 1000)
+            print("note at %.4fs: sound at %.4fs, %6.2f ms" % (t, onset, ms[-1]))
+    if ms:
+        print("note-on to sound: min %.2f  median %.2f  max %.2f ms  (%d of %d notes, synth block is %.2f ms)" %
+              (min(ms), float(np.median(ms)), max(ms), len(ms), len(times), 256 * 1000 / run.sample_rate))
+    report = [line for line in run.stdout.splitlines() if line.startswith("latency:")]
+    if report:
+        last = max(i for (i, line) in enumerate(report) if "stage" in line)
+        print("\n".join(report[last:]))  # the example's latest report
+    return 0 if len(ms) == len(times) else 1
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,164 @@
+#!/usr/bin/env python3
+# lib_checks.py -- check the edge cases of the libraries in lib/ that don't make sound
+# part of https://github.com/todbot/circuitpython-synthio-tricks
+#
+# golden_render.py catches libraries that change how the examples sound, but
+# bookkeeping bugs (a note stuck in NoteState after a stray note-off, say) only
+# show up with the right odd sequence of input.  Each check here plays one of
+# those sequences into a library on the host and says if it came out wrong.
+#
+# Use it like:
+#   python3 tools/lib_checks.py            # run all the checks
+#   python3 tools/lib_checks.py notestate  # just the ones with "notestate" in their name
+#
+
+import sys, os, time, tempfile, traceback
+from hostsynth import fake_modules
+
+TOOLS_DIR = os.path.dirname(os.path.abspath(__file__))
+sys.path.insert(0, os.path.join(TOOLS_DIR, "..", "lib"))
+sys.modules.update({name: mod for (name, mod) in fake_modules().items() if name != "time"})
+
+from notestate import NoteState
+from inputtrace import InputRecorder, InputReplayer
+from presets import PresetBank
+
+def check_notestate_stray_noteoff_under_pedal():
+    # a note-off for a note that never sounded mustn't leave it sustained
+    notes = NoteState(size=4)
+    notes.sustain(True)
+    assert notes.release(60) is True
+    assert not notes.is_sounding(60)
+    assert notes.sustain(False) == 0
+
+def check_notestate_dropped_note_released_under_pedal():
+    # a note dropped to make room, let go with the pedal down, is gone for good
+    notes = NoteState(size=4)
+    notes.sustain(True)
+    for n in (60, 61, 62, 63):
+        notes.press(n)
+    assert notes.press(64) == 60
+    notes.release(60)
+    assert not notes.is_sounding(60)
+    assert notes.press(60) == 61  # full, so the oldest goes, no IndexError
+    assert len(notes) == 4
+
+def check_notestate_second_noteoff_under_pedal():
+    # a repeated note-off for a note the pedal holds mustn't let it go, or leave it sounding after
+    notes = NoteState(size=4)
+    notes.press(60)
+    notes.sustain(True)
+    assert notes.release(60) is False
+    assert notes.release(60) is False
+    assert notes.is_sounding(60) and len(notes) == 1
+    assert notes.sustain(False) == 1 and notes.ended[0] == 60
+    assert not notes.is_sounding(60) and len(notes) == 0
+
+def check_notestate_order_after_removals():
+    # notes let go from the middle keep the others in the order played
+    notes = NoteState(size=8)
+    for n in (60, 62, 64, 65, 67):
+        notes.press(n)
+    notes.release(64)
+    notes.release(67)
+    assert notes.current() == 65
+    notes.press(62)  # again, so it's the newest
+    notes.release(62)
+    assert notes.current() == 65
+    notes.release(65)
+    assert notes.current() == 60 and len(notes) == 1
+
+def check_notestate_full_repress_of_sustained_note():
+    # pressing a sustained note again when full moves it to the top, dropping nothing
+    notes = NoteState(size=4)
+    for n in (60, 61, 62, 63):
+        notes.press(n)
+    notes.sustain(True)
+    notes.release(60)
+    assert notes.is_sustained(60)
+    assert notes.press(60) is None
+    assert notes.current() == 60 and len(notes) == 4
+    assert not notes.is_sustained(60)
+
+def check_notestate_pedal_up_ends_only_sustained():
+    notes = NoteState(size=4)
+    notes.press(60)
+    notes.press(64)
+    notes.sustain(True)
+    notes.release(60)
+    notes.release(67)  # stray
+    assert notes.sustain(False) == 1 and notes.ended[0] == 60
+    assert notes.current() == 64 and len(notes) == 1
+
+def check_notestate_priority():
+    notes = NoteState(size=4, priority="low")
+    for n in (64, 60, 67):
+        notes.press(n)
+    assert notes.current() == 60
+    notes.set_priority("high")
+    assert notes.current() == 67
+    notes.set_priority("last")
+    notes.release(67)
+    assert notes.current() == 60
+
+def check_inputtrace_port_bytes_round_trip():
+    # raw MIDI read through a recording port comes back byte for byte, however it was split up
+    reads = [bytes([0xFA]), bytes([0x90, 48, 100, 0xF8, 55, 100, 0xF8]), None, bytes([0xF8, 0xFC])]
+    class Port:
+        def readinto(self, buf):
+            b = reads.pop(0)
+            if b is None:
+                return None
+            buf[:len(b)] = b
+            return len(b)
+    rec = InputRecorder(size=16)
+    port = rec.port(Port())
+    buf = bytearray(8)
+    sent = b""
+    while reads:
+        n = port.readinto(buf)
+        sent += bytes(buf[:n]) if n else b""
+    with tempfile.TemporaryDirectory() as d:
+        filename = os.path.join(d, "trace.bin")
+        rec.save(filename)
+        play = InputReplayer(filename)
+    time.sleep(0.01)  # so every record is due
+    port = play.port()
+    got = b""
+    while (n := port.readinto(buf)):
+        got += bytes(buf[:n])
+    assert got == sent and play.midi() is None and play.key() is None
+
+def check_presets_recall_unchanged_floats():
+    # float fields go through float32 in the file, recalling what was just saved changes nothing
+    params = {"filter_freq": 2000.1, "filter_res": 0.7, "arp_id": 3}
+    rebuilt = []
+    with tempfile.TemporaryDirectory() as d:
+        bank = PresetBank(os.path.join(d, "presets.bin"), (("filter_freq","f"), ("filter_res","f"), ("arp_id","B")))
+        bank.watch(("filter_freq","filter_res"), lambda p: rebuilt.append("filter"))
+        bank.watch(("arp_id",), lambda p: rebuilt.append("arp"))
+        bank.save(2, params)
+        assert bank.recall(2, params) == 0 and not rebuilt
+        assert params["filter_freq"] == 2000.1  # left as it was, not the float32 value
+        params["arp_id"] = 4
+        assert bank.recall(2, params) == 1 and rebuilt == ["arp"] and params["arp_id"] == 3
+
+CHECKS = [(name, f) for (name, f) in sorted(globals().items()) if name.startswith("check_")]
+
+def main():
+    names = sys.argv[1:]
+    failed = 0
+    for name, check in CHECKS:
+        if names and not any(n in name for n in names):
+            continue
+        try:
+            check()
+            print("%-56s ok" % name[6:])
+        except Exception:
+            print("%-56s FAIL" % name[6:])
+            traceback.print_exc(limit=-1)
+            failed += 1
+    return 1 if failed else 0
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,113 @@
+#!/usr/bin/env python3
+# sweep_render.py -- render an example at every combination of some settings, in parallel
+# part of https://github.com/todbot/circuitpython-synthio-tricks
+#
+# Tuning a patch on the board means listening to one setting at a time.
+# This renders an example with hostsynth.py once for every combination of the
+# setting values you give it, spread over all your CPU cores, and saves a WAV
+# of each plus a CSV with the loudness, brightness (spectral centroid),
+# number of clipped samples, and render time of every combination.
+#
+# Settings are the example's top-level `name = value` lines (see
+# hostsynth.override_settings()), values are Python literals separated by commas.
+# Each render gets the same input trace golden_render.py uses for that example.
+#
+# Use it like:
+#   python3 tools/sweep_render.py eighties_dystopia lpf_basef=300,500,800 lpf_resonance=0.7,1.5,3
+#   python3 tools/sweep_render.py monosynth1 filter_freq_hi=2000,4500 --out /tmp/sweep --seconds 3
+#   python3 tools/sweep_render.py eighties_dystopia num_voices=3,5,8 --variant code_picoadk -j 4
+#
+
+import sys, os, ast, csv, itertools, argparse
+from concurrent.futures import ProcessPoolExecutor, as_completed
+import numpy as np
+from hostsynth import HostRun, write_wav, override_settings
+from golden_render import EXAMPLES_DIR, TRACES, DEFAULT_TRACE
+
+def parse_param(arg):
+    """'name=1,2,3' to ('name', [1, 2, 3]), values that aren't literals stay strings"""
+    name, sep, values = arg.partition("=")
+    if not sep or not name.isidentifier():
+        raise argparse.ArgumentTypeError("expected name=value,value,... not %r" % arg)
+    out = []
+    for v in values.split(","):
+        try:
+            out.append(ast.literal_eval(v))
+        except (ValueError, SyntaxError):
+            out.append(v)
+    return name, out
+
+def measure(audio, sample_rate):
+    """Loudness (RMS dBFS), spectral centroid (Hz), and clipped sample count of int16 audio"""
+    mono = audio.astype(float).mean(axis=1)
+    rms = np.sqrt((mono ** 2).mean()) if len(mono) else 0
+    loudness = 20 * np.log10(max(rms, 1) / 32768)
+    spec = np.abs(np.fft.rfft(mono))
+    freqs = np.fft.rfftfreq(len(mono), 1 / sample_rate)
+    centroid = (spec * freqs).sum() / max(spec.sum(), 1e-9)
+    clipped = int(np.count_nonzero((audio >= 32767) | (audio <= -32768)))
+    return loudness, centroid, clipped
+
+def render_one(job):
+    """Render one combination, in a worker process. Returns a dict for the CSV"""
+    index, example, path, seconds, settings, wav_path = job
+    duration, trace = TRACES.get(example, DEFAULT_TRACE)
+    run = HostRun(duration=seconds or duration, trace=trace)
+    row = dict(index=index, **settings)
+    try:
+        audio = run.run(path, overrides=settings)
+    except Exception as e:
+        row.update(error=repr(e), render_s="%.2f" % run.render_time)
+        return row
+    loudness, centroid, clipped = measure(audio, run.sample_rate)
+    write_wav(wav_path, audio, run.sample_rate)
+    row.update(wav=os.path.basename(wav_path), rms_dbfs="%.1f" % loudness,
+               centroid_hz="%d" % centroid, clipped=clipped, render_s="%.2f" % run.render_time)
+    return row
+
+def main():
+    parser = argparse.ArgumentParser(description="render an example over a grid of settings")
+    parser.add_argument("example", help="example name, like eighties_dystopia")
+    parser.add_argument("params", nargs="+", type=parse_param, help="name=value,value,...")
+    parser.add_argument("--variant", default="code", help="which code*.py to run (default: code)")
+    parser.add_argument("--out", default="sweep", help="directory for WAVs & results.csv (default: sweep)")
+    parser.add_argument("--seconds", type=float, help="render length (default: the golden trace's)")
+    parser.add_argument("-j", "--jobs", type=int, default=os.cpu_count(), help="processes to use")
+    args = parser.parse_args()
+
+    path = os.path.join(EXAMPLES_DIR, args.example, args.variant + ".py")
+    if not os.path.exists(path):
+        parser.error("no such example: " + path)
+    os.makedirs(args.out, exist_ok=True)
+    names = [name for (name, values) in args.params]
+    combos = list(itertools.product(*[values for (name, values) in args.params]))
+    try:
+        override_settings(path, dict(zip(names, combos[0])))  # check the names before starting
+    except ValueError as e:
+        parser.error(str(e))
+    jobs = []
+    for i, combo in enumerate(combos):
+        wav_path = os.path.join(args.out, "%s_%04d.wav" % (args.example, i))
+        jobs.append((i, args.example, path, args.seconds, dict(zip(names, combo)), wav_path))
+    print("rendering %d combinations of %s on %d processes" % (len(jobs), ", ".join(names), args.jobs))
+
+    rows = []
+    with ProcessPoolExecutor(max_workers=args.jobs) as pool:
+        for future in as_completed([pool.submit(render_one, job) for job in jobs]):
+            row = future.result()
+            rows.append(row)
+            print("%4d/%d  %s" % (len(rows), len(jobs),
+                  "  ".join("%s=%s" % (k, row[k]) for k in names + ["rms_dbfs", "centroid_hz", "clipped", "error"]
+                            if k in row)))
+    rows.sort(key=lambda row: row["index"])
+    csv_path = os.path.join(args.out, "results.csv")
+    with open(csv_path, "w", newline="") as f:
+        fields = ["index"] + names + ["wav", "rms_dbfs", "centroid_hz", "clipped", "render_s", "error"]
+        writer = csv.DictWriter(f, fieldnames=fields)
+        writer.writeheader()
+        writer.writerows(rows)
+    print("wrote", csv_path)
+    return 1 if any("error" in row for row in rows) else 0
+
+if __name__ == "__main__":
+    sys.exit(main())
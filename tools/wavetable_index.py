@@ -0,0 +1,132 @@
+#!/usr/bin/env python3
+# wavetable_index.py -- index a directory of wavetable WAVs, so a board can switch tables by number
+# part of https://github.com/todbot/circuitpython-synthio-tricks
+#
+# Opening a WAV with adafruit_wave on the board means parsing and checking its
+# header every time.  This scans a directory of wavetable WAVs once, on your
+# computer, and writes a small index file next to them.  On the board,
+# wavetable.WavetableIndex reads one entry from it and loads the table's samples
+# straight from their offset, so switching tables by number is just a seek & read.
+#
+# Each file is mmap'd rather than read, so scanning thousands of tables is quick.
+# Wave length comes from a Serum-style "clm " chunk if there is one, or --wave-len.
+#
+# Index layout (little-endian, must match lib/wavetable.py):
+#   header: magic "WTIX", version (1 byte), table count (2 bytes)
+#   one 42-byte entry per table: name (24 bytes), data offset (4), file size (4),
+#     wave_len (2), num_waves (2), bits per sample (1), channels (1), loudness offset (4)
+#   then each table's loudness: the RMS of every wave, 16-bit scale (2 bytes per wave)
+#
+# Use it like:
+#   python3 tools/wavetable_index.py examples/wavetable_midisynth/wav     # writes wav/WAVES.IDX
+#   python3 tools/wavetable_index.py ~/waveeditonline --out /Volumes/CIRCUITPY/wav/WAVES.IDX
+#
+
+import sys, os, re, mmap, struct, argparse
+import numpy as np
+
+INDEX_MAGIC = b"WTIX"
+INDEX_HEADER_FMT = "<4sBH"
+INDEX_ENTRY_FMT = "<24sIIHHBBI"
+INDEX_NAME_LEN = 24
+
+def parse_wav(mm):
+    """Find the format & sample data of a WAV in mm,
+    returns (bits, channels, data offset, data length, wave_len from a "clm " chunk or None)"""
+    if mm[0:4] != b"RIFF" or mm[8:12] != b"WAVE":
+        raise ValueError("not a WAV file")
+    fmt = data = None
+    wave_len = None
+    pos = 12
+    while pos + 8 <= len(mm):
+        chunk_id, size = struct.unpack_from("<4sI", mm, pos)
+        if chunk_id == b"fmt ":
+            fmt = struct.unpack_from("<HHIIHH", mm, pos + 8)
+        elif chunk_id == b"data":
+            data = (pos + 8, min(size, len(mm) - pos - 8))
+        elif chunk_id == b"clm ":  # Serum wavetables say "<!>2048 ..."
+            m = re.match(rb"<!>(\d+)", mm[pos + 8:pos + 8 + size])
+            if m:
+                wave_len = int(m.group(1))
+        pos += 8 + size + (size & 1)
+    if fmt is None or data is None:
+        raise ValueError("no fmt or data chunk")
+    audio_format, channels, sample_rate, byte_rate, block_align, bits = fmt
+    if audio_format not in (1, 0xFFFE) or bits not in (8, 16, 24):
+        raise ValueError("unsupported format %d, %d bits" % (audio_format, bits))
+    return bits, channels, data[0], data[1], wave_len
+
+def wave_loudness(mm, bits, channels, offset, wave_len, num_waves):
+    """RMS of every wave (all channels mixed), scaled as if 16-bit"""
+    count = wave_len * num_waves * channels
+    if bits == 16:
+        samples = np.frombuffer(mm, dtype="<i2", count=count, offset=offset).astype(float)
+    elif bits == 8:  # unsigned
+        samples = (np.frombuffer(mm, dtype=np.uint8, count=count, offset=offset).astype(float) - 128) * 256
+    else:  # 24-bit, keep the top two bytes
+        raw = np.frombuffer(mm, dtype=np.uint8, count=count * 3, offset=offset).reshape(-1, 3)
+        samples = raw[:, 1].astype(float) + raw[:, 2].astype(np.int8) * 256.0
+    waves = samples.reshape(num_waves, wave_len, channels).mean(axis=2)
+    return np.sqrt((waves ** 2).mean(axis=1)).round().astype("<u2")
+
+def scan(directory, default_wave_len=256):
+    """Index every WAV in directory, returns a list of (entry tuple, loudness array)"""
+    tables = []
+    for name in sorted(os.listdir(directory)):
+        if not name.lower().endswith(".wav"):
+            continue
+        if len(name.encode()) > INDEX_NAME_LEN:
+            print("skipping %s: name longer than %d bytes" % (name, INDEX_NAME_LEN))
+            continue
+        path = os.path.join(directory, name)
+        with open(path, "rb") as f:
+            size = os.fstat(f.fileno()).st_size
+            if size == 0:
+                continue
+            with mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ) as mm:
+                try:
+                    bits, channels, offset, length, wave_len = parse_wav(mm)
+                except (ValueError, struct.error) as e:
+                    print("skipping %s: %s" % (name, e))
+                    continue
+                wave_len = wave_len or default_wave_len
+                num_waves = length // (wave_len * channels * bits // 8)
+                if num_waves == 0:
+                    print("skipping %s: shorter than one %d sample wave" % (name, wave_len))
+                    continue
+                loudness = wave_loudness(mm, bits, channels, offset, wave_len, num_waves)
+        tables.append(((name.encode(), offset, size, wave_len, num_waves, bits, channels), loudness))
+    return tables
+
+def write_index(filename, tables):
+    entry_size = struct.calcsize(INDEX_ENTRY_FMT)
+    loud_offset = struct.calcsize(INDEX_HEADER_FMT) + entry_size * len(tables)
+    with open(filename, "wb") as f:
+        f.write(struct.pack(INDEX_HEADER_FMT, INDEX_MAGIC, 1, len(tables)))
+        for (entry, loudness) in tables:
+            f.write(struct.pack(INDEX_ENTRY_FMT, *entry, loud_offset))
+            loud_offset += loudness.nbytes
+        for (entry, loudness) in tables:
+            f.write(loudness.tobytes())
+
+def main():
+    parser = argparse.ArgumentParser(description="index a directory of wavetable WAVs")
+    parser.add_argument("directory", help="directory of wavetable WAV files")
+    parser.add_argument("--out", help="index file to write (default: WAVES.IDX in directory)")
+    parser.add_argument("--wave-len", type=int, default=256,
+                        help="samples per wave when the WAV doesn't say (default: 256)")
+    args = parser.parse_args()
+
+    tables = scan(args.directory, args.wave_len)
+    if len(tables) > 65535:
+        parser.error("too many tables for one index: %d" % len(tables))
+    out = args.out or os.path.join(args.directory, "WAVES.IDX")
+    write_index(out, tables)
+    for i, ((name, offset, size, wave_len, num_waves, bits, channels), loudness) in enumerate(tables):
+        print("%4d  %-24s %3d x %4d  %2d-bit %s  rms %5d-%5d" % (i, name.decode(), num_waves, wave_len,
+              bits, "stereo" if channels == 2 else "mono  ", loudness.min(), loudness.max()))
+    print("wrote %d tables to %s" % (len(tables), out))
+    return 0
+
+if __name__ == "__main__":
+    sys.exit(main())